@@ -1,6 +1,21 @@
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from .models import CartItem, Equipment, EquipmentType, Passport, Site, Workshop
+from .models import (
+    CartItem,
+    Equipment,
+    EquipmentType,
+    OrderLine,
+    OrderRequest,
+    Passport,
+    PassportUpload,
+    RequestProfile,
+    Site,
+    Workshop,
+)
 
 
 @admin.register(Site)
@@ -51,9 +66,16 @@ class EquipmentAdmin(admin.ModelAdmin):
 
 @admin.register(Passport)
 class PassportAdmin(admin.ModelAdmin):
-    list_display = ("equipment", "description", "uploaded_at")
-    search_fields = ("equipment__name", "description")
+    list_display = ("equipment", "description", "size", "uploaded_at")
+    search_fields = ("equipment__name", "description", "sha256")
     list_filter = ("uploaded_at",)
+    readonly_fields = ("sha256", "size")
+
+
+@admin.register(PassportUpload)
+class PassportUploadAdmin(admin.ModelAdmin):
+    list_display = ("filename", "equipment", "user", "received", "size", "updated_at")
+    search_fields = ("filename", "equipment__name", "user__username")
 
 
 @admin.register(CartItem)
@@ -62,3 +84,69 @@ class CartItemAdmin(admin.ModelAdmin):
     list_filter = ("user",)
     search_fields = ("user__username", "equipment__name")
     raw_id_fields = ("user", "equipment")
+
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    fields = ("equipment", "name", "inventory_number", "quantity")
+    readonly_fields = fields
+
+
+@admin.register(OrderRequest)
+class OrderRequestAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "user", "email", "created_at")
+    search_fields = ("name", "email", "lines__inventory_number")
+    list_filter = ("created_at",)
+    inlines = (OrderLineInline,)
+    exclude = ("items",)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "method", "path", "status", "duration_ms", "user", "download")
+    list_filter = ("created_at", "profiler")
+    search_fields = ("path", "user__username")
+    fields = ("created_at", "user", "method", "path", "status", "duration_ms", "profiler",
+              "download", "summary_text")
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="catalog_requestprofile_download",
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        # Файл отдаётся через админку: раздача медиа не проверяет права
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile) or not profile.file:
+            raise Http404
+        try:
+            source = profile.file.open("rb")
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(
+            source,
+            as_attachment=not profile.file.name.endswith(".html"),
+            filename=profile.file.name.rsplit("/", 1)[-1],
+        )
+
+    @admin.display(description="Файл")
+    def download(self, obj):
+        url = reverse("admin:catalog_requestprofile_download", args=[obj.pk])
+        label = "Открыть" if obj.file.name.endswith(".html") else "Скачать .prof"
+        return format_html('<a href="{}">{}</a>', url, label)
+
+    @admin.display(description="Сводка")
+    def summary_text(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.summary)
@@ -1,12 +1,44 @@
 from __future__ import annotations
 
+from copy import copy
+from io import BytesIO
+from typing import Any
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, serializers, viewsets
+from rest_framework import filters, mixins, permissions, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
-from .models import CartItem, Equipment, EquipmentType, Passport, Site, Workshop
+from . import cart, conditional, export, facets, reference, response_cache, uploads
+from .attributes import (
+    attribute_pairs,
+    filter_by_attributes,
+    filter_by_ranges,
+    range_conditions,
+)
+from .models import (
+    CartItem,
+    Equipment,
+    EquipmentType,
+    OrderLine,
+    OrderRequest,
+    Passport,
+    PassportUpload,
+    Site,
+    Workshop,
+)
+from .orders import EmptyCart, place_order
+from .pagination import EquipmentPagination, OrderLinePagination
+from .roles import can_add_equipment
+from .search import search_equipment
+from .suggest import suggest
+from .tree import descendants_of, type_tree
 
 
 class IsAdminOrSellerOwner(permissions.BasePermission):
@@ -21,9 +53,7 @@ class IsAdminOrSellerOwner(permissions.BasePermission):
         user = request.user
         if not user.is_authenticated:
             return False
-        if user.is_staff or user.is_superuser:
-            return True
-        return user.groups.filter(name="seller").exists()
+        return can_add_equipment(user)
 
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
@@ -37,11 +67,28 @@ class IsAdminOrSellerOwner(permissions.BasePermission):
         return False
 
 
+class EquipmentSearchFilter(filters.SearchFilter):
+    """Параметр ``search`` через полнотекстовый индекс, с сортировкой по релевантности."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        return search_equipment(queryset, query)
+
+
 class EquipmentTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = EquipmentType
         fields = ["id", "name", "parent", "description", "default_attributes"]
 
+    def validate(self, attrs):
+        # Проверки модели: схема характеристик и цикл в дереве — с циклом
+        # перестройка замыкания дала бы дубли строк
+        instance = copy(self.instance) if self.instance is not None else EquipmentType()
+        for name, value in attrs.items():
+            setattr(instance, name, value)
+        instance.clean()
+        return attrs
+
 
 class SiteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -58,26 +105,128 @@ class WorkshopSerializer(serializers.ModelSerializer):
 class PassportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Passport
-        fields = ["id", "equipment", "description", "file", "uploaded_at"]
-        read_only_fields = ["uploaded_at"]
+        fields = ["id", "equipment", "description", "file", "sha256", "size", "uploaded_at"]
+        read_only_fields = ["sha256", "size", "uploaded_at"]
+
+
+class SparseFieldsMixin:
+    """Оставляет в выводе только поля из ``fields`` (параметр конструктора)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class ReferenceField(serializers.PrimaryKeyRelatedField):
+    """id справочника, проверяемый по снимку ``catalog.reference`` без запроса к БД.
+
+    Если id в снимке нет, запись ищется в БД (``reference.get``).
+
+    Возвращает экземпляр модели с полями из снимка; остальные поля отложены и
+    подгрузятся, только если к ним обратятся.
+    """
+
+    def __init__(self, collection: str, **kwargs):
+        self.collection = collection
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        ref = reference.get(self.collection, pk)
+        if ref is None:
+            self.fail("does_not_exist", pk_value=data)
+        names = [name for name in ref.__slots__ if not name.startswith("_")]
+        model = self.get_queryset().model
+        return model.from_db(self.get_queryset().db, names, [getattr(ref, name) for name in names])
+
+
+class ReferenceNameField(serializers.ReadOnlyField):
+    """Название связанного справочника по его id из снимка — без JOIN."""
+
+    def __init__(self, collection: str, **kwargs):
+        self.collection = collection
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if value is None:
+            return None
+        # Снимок берётся один раз на ответ: контекст общий у всех строк списка
+        snapshot = self.context.get("reference")
+        if snapshot is None:
+            snapshot = self.context["reference"] = reference.snapshot()
+        ref = getattr(snapshot, self.collection).get(value)
+        if ref is None:
+            # Запись новее снимка (другой процесс, кэш в памяти процесса)
+            ref = reference.get(self.collection, value)
+        return ref.name if ref is not None else None
+
+
+class EquipmentListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Плоская строка списка: id связей и их названия вместо вложенных объектов.
+
+    ``expand`` подменяет id связи вложенным объектом (и добавляет ``passports``).
+    """
+
+    EXPANDABLE = {
+        "equipment_type": lambda: EquipmentTypeSerializer(read_only=True),
+        "site": lambda: SiteSerializer(read_only=True),
+        "workshop": lambda: WorkshopSerializer(read_only=True),
+        "passports": lambda: PassportSerializer(many=True, read_only=True),
+    }
+
+    equipment_type_name = ReferenceNameField("types", source="equipment_type_id")
+    site_name = ReferenceNameField("sites", source="site_id")
+    workshop_name = ReferenceNameField("workshops", source="workshop_id")
+
+    class Meta:
+        model = Equipment
+        fields = [
+            "id",
+            "name",
+            "inventory_number",
+            "equipment_type",
+            "equipment_type_name",
+            "site",
+            "site_name",
+            "workshop",
+            "workshop_name",
+            "attributes",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.EXPANDABLE[name]()
+
+
+class EquipmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
     equipment_type = EquipmentTypeSerializer(read_only=True)
-    equipment_type_id = serializers.PrimaryKeyRelatedField(
+    equipment_type_id = ReferenceField(
+        "types",
         source="equipment_type",
         queryset=EquipmentType.objects.all(),
         write_only=True,
     )
     site = SiteSerializer(read_only=True)
-    site_id = serializers.PrimaryKeyRelatedField(
+    site_id = ReferenceField(
+        "sites",
         source="site",
         queryset=Site.objects.all(),
         write_only=True,
     )
     workshop = WorkshopSerializer(read_only=True)
-    workshop_id = serializers.PrimaryKeyRelatedField(
+    workshop_id = ReferenceField(
+        "workshops",
         source="workshop",
         queryset=Workshop.objects.all(),
         write_only=True,
@@ -120,6 +269,10 @@ class EquipmentTypeViewSet(viewsets.ModelViewSet):
     search_fields = ["name", "description"]
     ordering_fields = ["name"]
 
+    @action(detail=False, methods=["get"])
+    def tree(self, request):
+        return Response(type_tree())
+
 
 class SiteViewSet(viewsets.ModelViewSet):
     queryset = Site.objects.all()
@@ -140,51 +293,251 @@ class WorkshopViewSet(viewsets.ModelViewSet):
 
 
 class EquipmentViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Equipment.objects.all()
-        .select_related("equipment_type", "site", "workshop")
-        .prefetch_related("passports")
-    )
+    """Оборудование.
+
+    Список отдаётся плоским (``EquipmentListSerializer``), карточка — с
+    вложенными объектами. ``?fields=id,name`` оставляет только перечисленные
+    поля, ``?expand=site,passports`` (только для списка) разворачивает связи;
+    ``select_related``/``prefetch_related`` и набор столбцов подстраиваются
+    под запрошенное.
+    """
+
+    queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
     permission_classes = [IsAdminOrSellerOwner]
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        EquipmentSearchFilter,
         filters.OrderingFilter,
     ]
     search_fields = ["name", "description", "inventory_number", "equipment_type__name"]
     ordering_fields = ["name", "inventory_number", "updated_at"]
     filterset_fields = ["equipment_type", "site", "workshop"]
+    pagination_class = EquipmentPagination
+
+    relations = ("equipment_type", "site", "workshop")
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return EquipmentListSerializer
+        return super().get_serializer_class()
+
+    def query_list(self, param: str, allowed) -> list[str] | None:
+        raw = self.request.query_params.get(param)
+        if raw is None:
+            return None
+        names = [name.strip() for name in raw.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise serializers.ValidationError(
+                {param: f"Неизвестные поля: {', '.join(unknown)}"}
+            )
+        return names
+
+    def sparse_fields(self) -> tuple[list[str] | None, list[str]]:
+        """Вернуть (поля или None — все, развёрнутые связи) для list/retrieve."""
+        if hasattr(self, "_sparse_fields"):
+            return self._sparse_fields
+        expand = []
+        if self.action == "list":
+            expand = self.query_list("expand", EquipmentListSerializer.EXPANDABLE) or []
+            available = [*EquipmentListSerializer.Meta.fields, "passports"]
+        else:
+            available = EquipmentSerializer.Meta.fields
+        fields = self.query_list("fields", available)
+        if fields is not None:
+            # Развёрнутая связь попадает в вывод, даже если её нет в fields
+            fields = list(dict.fromkeys([*fields, *expand]))
+        self._sparse_fields = fields, expand
+        return self._sparse_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ("list", "retrieve"):
+            fields, expand = self.sparse_fields()
+            kwargs.setdefault("fields", fields)
+            if self.action == "list":
+                kwargs.setdefault("expand", expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            return self.prune_list_queryset(queryset)
+        if self.action == "export":
+            return queryset
+        fields, _ = self.sparse_fields() if self.action == "retrieve" else (None, [])
+        wanted = set(fields) if fields is not None else None
+        related = [name for name in self.relations if wanted is None or name in wanted]
+        if related:
+            queryset = queryset.select_related(*related)
+        if wanted is None or "passports" in wanted:
+            queryset = queryset.prefetch_related("passports")
+        return queryset
+
+    def prune_list_queryset(self, queryset):
+        """JOIN и prefetch только для запрошенных связей, столбцы — только нужные."""
+        fields, expand = self.sparse_fields()
+        wanted = set(fields if fields is not None else EquipmentListSerializer.Meta.fields)
+        wanted |= set(expand)
+        # Поля сортировки нужны курсору пагинации
+        columns = {"id", *self.ordering_fields}
+        related = []
+        for name in wanted:
+            if name in self.relations:
+                columns.add(name)
+                if name in expand:
+                    related.append(name)
+            elif name.endswith("_name") and name[: -len("_name")] in self.relations:
+                # Название берётся из снимка справочников: нужен только id связи
+                columns.add(name[: -len("_name")])
+            elif name != "passports":
+                columns.add(name)
+        if related:
+            queryset = queryset.select_related(*set(related))
+        if "passports" in expand:
+            queryset = queryset.prefetch_related("passports")
+        return queryset.only(*columns)
+
+    conditional_vary = ("Accept", "Cookie", "Authorization")
+
+    def conditional_validators(self, request, last_modified, *parts) -> dict:
+        return conditional.validators(
+            request, last_modified, request.accepted_renderer.format, request.user.pk, *parts
+        )
+
+    def list(self, request, *args, **kwargs):
+        if response_cache.is_cacheable(request):
+            # В кэше и валидаторы: совпавший ETag даёт 304 без единого запроса к БД
+            key = response_cache.request_key(
+                "api-equipment", request, request.build_absolute_uri("/"),
+                request.accepted_renderer.format,
+            )
+            validators, data = response_cache.get_or_build(key, lambda: self.list_payload(request))
+            response = conditional.not_modified(request, **validators) or Response(data)
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            validators = self.list_validators(request)
+            response = conditional.not_modified(request, **validators)
+            if response is None:
+                response = Response(self.list_data(queryset))
+        conditional.apply_headers(request, response, vary=self.conditional_vary, **validators)
+        return response
+
+    def list_validators(self, request) -> dict:
+        return conditional.list_validators(
+            request, request.accepted_renderer.format, request.user.pk
+        )
+
+    def list_data(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data).data
+        return self.get_serializer(queryset, many=True).data
+
+    def list_payload(self, request) -> tuple[dict, Any]:
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.list_validators(request), self.list_data(queryset)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        updated_at = (
+            Equipment.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        )
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        validators = self.conditional_validators(request, updated_at)
+        response = conditional.not_modified(request, **validators)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        conditional.apply_headers(request, response, vary=self.conditional_vary, **validators)
+        return response
 
     def filter_queryset(self, queryset):
         queryset = super().filter_queryset(queryset)
         request = self.request
         eq_type = request.query_params.get("equipment_type")
+        eq_type_root = request.query_params.get("equipment_type__descendants_of")
         site = request.query_params.get("site")
         workshop = request.query_params.get("workshop")
-        attr_key = request.query_params.get("attribute_key")
-        attr_val = request.query_params.get("attribute_value")
         if eq_type:
             queryset = queryset.filter(equipment_type_id=eq_type)
+        if eq_type_root:
+            if not eq_type_root.isdigit():
+                raise serializers.ValidationError(
+                    {"equipment_type__descendants_of": "Ожидается id типа."}
+                )
+            queryset = queryset.filter(equipment_type_id__in=descendants_of(int(eq_type_root)))
         if site:
             queryset = queryset.filter(Q(site__id=site) | Q(site__name__icontains=site))
         if workshop:
             queryset = queryset.filter(
                 Q(workshop__id=workshop) | Q(workshop__name__icontains=workshop)
             )
-        if attr_key and attr_val:
-            queryset = queryset.filter(attributes__contains={attr_key: attr_val})
+        queryset = filter_by_attributes(queryset, attribute_pairs(request.query_params))
+        try:
+            conditions = range_conditions(request.query_params, reference.number_keys)
+        except ValidationError as exc:
+            raise serializers.ValidationError({"attr": exc.messages})
+        queryset = filter_by_ranges(queryset, conditions)
         return queryset
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """Подсказки для строки поиска: ``?q=<префикс>&limit=10``."""
+        limit = request.query_params.get("limit")
+        if limit is not None and not limit.isdigit():
+            raise serializers.ValidationError({"limit": "Ожидается число."})
+        return Response(suggest(request.query_params.get("q", ""), int(limit or 0) or None))
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """Счётчики по типам, площадкам, цехам и характеристикам для фильтров списка."""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(facets.cached_facet_counts("api", request.query_params, queryset))
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Потоковая выгрузка с теми же фильтрами, что у списка: ``?export_format=csv|ndjson``."""
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in export.STREAMS:
+            raise serializers.ValidationError(
+                {"export_format": f"Допустимо: {', '.join(export.STREAMS)}"}
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export.STREAMS[export_format](queryset),
+            content_type=export.CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="equipment.{export_format}"'
+        return response
+
     @action(detail=True, methods=["get"])
     def passports(self, request, pk=None):
         equipment = self.get_object()
         serializer = PassportSerializer(equipment.passports.all(), many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=["get"], pagination_class=OrderLinePagination)
+    def orders(self, request, pk=None):
+        """Позиции заявок с этим оборудованием — персоналу и владельцу карточки."""
+        equipment = self.get_object()
+        user = request.user
+        if not (user.is_staff or user.is_superuser or equipment.created_by_id == user.pk):
+            raise PermissionDenied()
+        lines = (
+            OrderLine.objects.filter(equipment=equipment)
+            .select_related("order").order_by("-order__created_at", "pk")
+        )
+        page = self.paginate_queryset(lines)
+        serializer = EquipmentOrderLineSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class PassportViewSet(viewsets.ModelViewSet):
     queryset = Passport.objects.select_related("equipment")
@@ -195,6 +548,130 @@ class PassportViewSet(viewsets.ModelViewSet):
     ordering_fields = ["uploaded_at"]
 
 
+class PassportUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PassportUpload
+        fields = [
+            "id", "equipment", "filename", "description", "size", "received",
+            "created_at", "updated_at",
+        ]
+        read_only_fields = ["received", "created_at", "updated_at"]
+
+    def validate_size(self, value):
+        limit = getattr(settings, "CATALOG_PASSPORT_MAX_SIZE", 2 * 1024 ** 3)
+        if value < 1 or value > limit:
+            raise serializers.ValidationError(f"Размер файла должен быть от 1 до {limit} байт.")
+        return value
+
+
+class PassportUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Загрузка паспорта по частям с докачкой.
+
+    ``POST`` открывает сессию (имя, размер, оборудование); части шлются
+    ``PUT {id}/chunk/`` сырым телом с заголовком ``Upload-Offset``; текущее
+    смещение отдаёт ``GET {id}/``. ``POST {id}/complete/`` (можно передать
+    ``sha256`` для сверки) создаёт ``Passport``.
+    """
+
+    serializer_class = PassportUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return PassportUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        upload_id = instance.pk
+        instance.delete()
+        uploads.discard(upload_id)
+
+    def locked_upload(self) -> PassportUpload:
+        # get_object проверяет доступ, повторная выборка блокирует строку до конца транзакции
+        upload = self.get_object()
+        return PassportUpload.objects.select_for_update().get(pk=upload.pk)
+
+    @action(detail=True, methods=["put"])
+    def chunk(self, request, pk=None):
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({"Upload-Offset": "Ожидается смещение в байтах."})
+        upload = self.get_object()
+        with uploads.open_part(upload.pk) as target:
+            if target is None:
+                return Response(
+                    {"detail": "Часть уже загружается другим запросом.",
+                     "received": upload.received},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Upload-Offset": str(upload.received)},
+                )
+            # Строка блокируется только на сверку смещения и на итоговое
+            # обновление, не на время приёма тела: тело пишется под блокировкой файла
+            with transaction.atomic():
+                upload = self.locked_upload()
+                try:
+                    uploads.check_offset(upload, offset)
+                except uploads.OffsetMismatch:
+                    upload.save(update_fields=["received", "updated_at"])
+                    return Response(
+                        {"detail": "Неверное смещение.", "received": upload.received},
+                        status=status.HTTP_409_CONFLICT,
+                        headers={"Upload-Offset": str(upload.received)},
+                    )
+            try:
+                received = uploads.write_chunk(target, upload, offset, request.stream or BytesIO())
+            except ValueError as exc:
+                raise serializers.ValidationError({"detail": str(exc)})
+            with transaction.atomic():
+                upload = self.locked_upload()
+                upload.received = received
+                upload.save(update_fields=["received", "updated_at"])
+        return Response(
+            self.get_serializer(upload).data, headers={"Upload-Offset": str(upload.received)}
+        )
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        with transaction.atomic():
+            upload = self.locked_upload()
+            if not upload.is_complete:
+                return Response(
+                    {"detail": "Файл загружен не полностью.", "received": upload.received},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            digest = uploads.finish_digest(upload)
+            expected = (request.data.get("sha256") or "").lower()
+            if expected and expected != digest:
+                upload.received = 0
+                upload.save(update_fields=["received", "updated_at"])
+                uploads.discard(upload.pk)
+                # Ответ, а не исключение: сброс сессии должен закоммититься
+                return Response(
+                    {"sha256": ["Контрольная сумма не совпала, загрузите файл заново."]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with open(uploads.temp_path(upload.pk), "rb") as source:
+                name = uploads.store_content(source, upload.filename, digest)
+            passport = Passport.objects.create(
+                equipment=upload.equipment,
+                description=upload.description,
+                file=name,
+                sha256=digest,
+                size=upload.size,
+            )
+            upload_id = upload.pk
+            upload.delete()
+            transaction.on_commit(lambda: uploads.discard(upload_id))
+        return Response(PassportSerializer(passport).data, status=status.HTTP_201_CREATED)
+
+
 class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
@@ -206,6 +683,57 @@ class CartItemSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class CartChangeSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=[cart.ADD, cart.SET, cart.REMOVE], default=cart.ADD)
+    equipment = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+    def validate(self, attrs):
+        if attrs["op"] == cart.ADD and attrs["quantity"] == 0:
+            raise serializers.ValidationError({"quantity": "Добавить можно не меньше одной штуки."})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    items = CartChangeSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        limit = getattr(settings, "CATALOG_CART_BATCH_LIMIT", 1000)
+        if len(items) > limit:
+            raise serializers.ValidationError(f"Не больше {limit} позиций за запрос.")
+        wanted = {item["equipment"] for item in items if item["op"] != cart.REMOVE}
+        found = set(Equipment.objects.filter(pk__in=wanted).values_list("pk", flat=True))
+        if wanted - found:
+            raise serializers.ValidationError(
+                f"Оборудование не найдено: {', '.join(map(str, sorted(wanted - found)))}."
+            )
+        return items
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ["id", "equipment", "name", "inventory_number", "quantity"]
+
+
+class EquipmentOrderLineSerializer(OrderLineSerializer):
+    order = serializers.IntegerField(source="order_id")
+    ordered_at = serializers.DateTimeField(source="order.created_at")
+    customer = serializers.CharField(source="order.name")
+
+    class Meta(OrderLineSerializer.Meta):
+        fields = [*OrderLineSerializer.Meta.fields, "order", "ordered_at", "customer"]
+
+
+class OrderRequestSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = OrderRequest
+        fields = ["id", "name", "email", "phone", "comment", "created_at", "lines"]
+        read_only_fields = ["created_at", "lines"]
+
+
 class CartItemViewSet(viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -215,3 +743,38 @@ class CartItemViewSet(viewsets.ModelViewSet):
             "equipment", "equipment__site", "equipment__workshop"
         )
 
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """Добавить/изменить/удалить много позиций одной транзакцией.
+
+        Тело: ``{"items": [{"op": "add"|"set"|"remove", "equipment": id,
+        "quantity": n}, ...]}``; операции над одной позицией применяются по порядку.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = cart.fold_changes(
+            (item["op"], item["equipment"], item["quantity"])
+            for item in serializer.validated_data["items"]
+        )
+        counts = cart.apply_changes(request.user.pk, changes)
+        items = self.get_serializer(self.get_queryset(), many=True).data
+        return Response({"applied": counts, "items": items})
+
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        """Оформить корзину; заголовок ``Idempotency-Key`` делает повтор безопасным."""
+        serializer = OrderRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order, created = place_order(
+                request.user,
+                serializer.validated_data,
+                request.headers.get("Idempotency-Key", ""),
+            )
+        except EmptyCart:
+            raise serializers.ValidationError({"detail": "Корзина пуста."})
+        return Response(
+            OrderRequestSerializer(order).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
@@ -4,6 +4,7 @@ from .api import (
     CartItemViewSet,
     EquipmentTypeViewSet,
     EquipmentViewSet,
+    PassportUploadViewSet,
     PassportViewSet,
     SiteViewSet,
     WorkshopViewSet,
@@ -15,6 +16,7 @@ router.register(r"sites", SiteViewSet, basename="site")
 router.register(r"workshops", WorkshopViewSet, basename="workshop")
 router.register(r"equipment", EquipmentViewSet, basename="equipment")
 router.register(r"passports", PassportViewSet, basename="passport")
+router.register(r"passport-uploads", PassportUploadViewSet, basename="passport-upload")
 router.register(r"cart", CartItemViewSet, basename="cart")
 
 urlpatterns = router.urls
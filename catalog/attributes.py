@@ -0,0 +1,264 @@
+"""Индекс и схема характеристик оборудования.
+
+``Equipment.attributes`` остаётся источником истины, а таблица
+``EquipmentAttribute`` хранит по строке на пару ключ/значение, чтобы фильтры
+шли по индексу ``(key, value_text)`` / ``(key, value_number)``, а не по JSON.
+
+``EquipmentType.default_attributes`` — список характеристик типа. Элемент —
+либо имя (строковая характеристика), либо словарь::
+
+    {"name": "power", "type": "number", "unit": "кВт"}
+    {"name": "material", "type": "enum", "choices": ["сталь", "чугун"]}
+
+Значения характеристик типа ``number`` приводятся к числу и попадают в
+``value_number``, по которому работают фильтры ``attr[power__gte]=55``.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Callable, Iterable, Iterator
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.translation import gettext_lazy as _
+
+DEFAULT_BATCH_SIZE = 1000
+
+TYPE_STRING = "string"
+TYPE_NUMBER = "number"
+TYPE_ENUM = "enum"
+ATTRIBUTE_TYPES = (TYPE_STRING, TYPE_NUMBER, TYPE_ENUM)
+
+RANGE_LOOKUPS = ("exact", "gt", "gte", "lt", "lte")
+_RANGE_PARAM_RE = re.compile(r"^attr\[(?P<key>[^\]]+?)(?:__(?P<lookup>[a-z]+))?\]$")
+_NUMBER_RE = re.compile(r"^\s*([-+]?\d+(?:[.,]\d+)?)")
+
+
+def parse_schema(default_attributes: Any) -> dict[str, dict[str, Any]]:
+    """Привести ``default_attributes`` к словарю ``имя -> описание``."""
+    if not default_attributes:
+        return {}
+    if not isinstance(default_attributes, list):
+        raise ValidationError(_("Характеристики типа должны быть списком"))
+    schema: dict[str, dict[str, Any]] = {}
+    for entry in default_attributes:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        if not isinstance(entry, dict) or not entry.get("name"):
+            raise ValidationError(_("У каждой характеристики должно быть имя"))
+        spec = dict(entry)
+        spec.setdefault("type", TYPE_STRING)
+        if spec["type"] not in ATTRIBUTE_TYPES:
+            raise ValidationError(
+                _("Неизвестный тип характеристики «%(name)s»: %(type)s"),
+                params={"name": spec["name"], "type": spec["type"]},
+            )
+        if spec["type"] == TYPE_ENUM and not isinstance(spec.get("choices"), list):
+            raise ValidationError(
+                _("Для характеристики «%(name)s» нужен список choices"),
+                params={"name": spec["name"]},
+            )
+        schema[str(spec["name"])] = spec
+    return schema
+
+
+def safe_schema(default_attributes: Any) -> dict[str, dict[str, Any]]:
+    try:
+        return parse_schema(default_attributes)
+    except ValidationError:
+        return {}
+
+
+def coerce_number(value: Any) -> float | None:
+    """Число из значения характеристики: 55, "55", "55,5", "55 кВт"."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER_RE.match(value)
+        if match:
+            return float(match.group(1).replace(",", "."))
+    return None
+
+
+def validate_attributes(attributes: dict[str, Any], schema: dict[str, dict[str, Any]]) -> None:
+    errors = []
+    for name, spec in schema.items():
+        value = attributes.get(name)
+        if value in (None, ""):
+            continue
+        if spec["type"] == TYPE_NUMBER and coerce_number(value) is None:
+            errors.append(
+                ValidationError(
+                    _("«%(name)s» должно быть числом"), params={"name": name}
+                )
+            )
+        elif spec["type"] == TYPE_ENUM and value not in spec["choices"]:
+            errors.append(
+                ValidationError(
+                    _("«%(name)s»: недопустимое значение %(value)s"),
+                    params={"name": name, "value": value},
+                )
+            )
+    if errors:
+        raise ValidationError({"attributes": errors})
+
+
+def normalize_value(value: Any, spec: dict[str, Any] | None = None) -> tuple[str, float | None]:
+    """Вернуть (value_text, value_number) для значения из JSON."""
+    if spec and spec["type"] == TYPE_NUMBER:
+        number = coerce_number(value)
+        if number is not None:
+            return (value if isinstance(value, str) else _number_text(number)), number
+    if isinstance(value, bool):
+        return ("true" if value else "false"), None
+    if isinstance(value, (int, float)):
+        return _number_text(float(value)), float(value)
+    if isinstance(value, str):
+        return value, None
+    return json.dumps(value, ensure_ascii=False, sort_keys=True), None
+
+
+def _number_text(number: float) -> str:
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def attribute_rows(attribute_model, equipment_id: int, attributes: Any,
+                   schema: dict[str, dict[str, Any]] | None = None) -> Iterator:
+    if not isinstance(attributes, dict):
+        return
+    schema = schema or {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        value_text, value_number = normalize_value(value, schema.get(key))
+        yield attribute_model(
+            equipment_id=equipment_id,
+            key=str(key),
+            value_text=value_text,
+            value_number=value_number,
+        )
+
+
+def sync_attributes(equipment: Iterable, attribute_model=None, type_model=None) -> None:
+    """Пересобрать строки индекса для переданного оборудования."""
+    if attribute_model is None:
+        from .models import EquipmentAttribute as attribute_model
+    if type_model is None:
+        from .models import EquipmentType as type_model
+    equipment = list(equipment)
+    if not equipment:
+        return
+    type_ids = {item.equipment_type_id for item in equipment}
+    schemas = {
+        pk: safe_schema(default_attributes)
+        for pk, default_attributes in type_model.objects.filter(pk__in=type_ids)
+        .values_list("pk", "default_attributes")
+    }
+    rows = [
+        row
+        for item in equipment
+        for row in attribute_rows(
+            attribute_model, item.pk, item.attributes, schemas.get(item.equipment_type_id)
+        )
+    ]
+    with transaction.atomic():
+        attribute_model.objects.filter(equipment_id__in=[item.pk for item in equipment]).delete()
+        attribute_model.objects.bulk_create(rows, batch_size=DEFAULT_BATCH_SIZE)
+
+
+def rebuild_attributes(queryset=None, attribute_model=None, type_model=None,
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       progress: Callable[[int], None] | None = None) -> int:
+    """Заполнить индекс характеристик пачками (по умолчанию — для всего оборудования)."""
+    if queryset is None:
+        from .models import Equipment
+
+        queryset = Equipment.objects.all()
+    total = 0
+    batch = []
+    queryset = queryset.order_by("pk").only("pk", "equipment_type_id", "attributes")
+    for item in queryset.iterator(chunk_size=batch_size):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            sync_attributes(batch, attribute_model, type_model)
+            total += len(batch)
+            batch = []
+            if progress:
+                progress(total)
+    if batch:
+        sync_attributes(batch, attribute_model, type_model)
+        total += len(batch)
+        if progress:
+            progress(total)
+    return total
+
+
+def attribute_pairs(params) -> list[tuple[str, str]]:
+    """Пары ``attribute_key``/``attribute_value`` из QueryDict (параметры могут повторяться)."""
+    keys = [key.strip() for key in params.getlist("attribute_key")]
+    values = [value.strip() for value in params.getlist("attribute_value")]
+    return [(key, value) for key, value in zip(keys, values) if key and value]
+
+
+def filter_by_attributes(queryset: QuerySet, pairs: Iterable[tuple[str, str]]) -> QuerySet:
+    # Отдельный filter() на каждую пару даёт отдельный JOIN, т.е. условие "И"
+    for key, value in pairs:
+        queryset = queryset.filter(
+            attribute_values__key=key, attribute_values__value_text=value
+        )
+    return queryset
+
+
+def range_conditions(params, number_keys: Callable[[], Iterable[str]] = tuple
+                     ) -> dict[str, dict[str, Any]]:
+    """Условия вида ``attr[power__gte]=55`` из QueryDict, сгруппированные по ключу.
+
+    ``attr[key]=...`` сравнивает текст значения, а для ключей из ``number_keys()``
+    (числовые по схеме типа) — число: "55 кВт" и "55,0" находятся по ``attr[power]=55``.
+    ``number_keys`` вызывается, только если в запросе есть такое условие.
+    """
+    numeric: set[str] | None = None
+    conditions: dict[str, dict[str, Any]] = {}
+    for param in params:
+        match = _RANGE_PARAM_RE.match(param)
+        if not match:
+            continue
+        key, lookup = match.group("key"), match.group("lookup") or "exact"
+        if lookup not in RANGE_LOOKUPS:
+            raise ValidationError(
+                _("Неизвестное условие %(lookup)s для «%(key)s»"),
+                params={"lookup": lookup, "key": key},
+            )
+        for raw in params.getlist(param):
+            raw = raw.strip()
+            if not raw:
+                continue
+            if lookup == "exact":
+                if numeric is None:
+                    numeric = set(number_keys())
+                if key not in numeric:
+                    conditions.setdefault(key, {})["value_text"] = raw
+                    continue
+            number = coerce_number(raw)
+            if number is None:
+                raise ValidationError(
+                    _("Значение для «%(key)s» должно быть числом"), params={"key": key}
+                )
+            conditions.setdefault(key, {})[f"value_number__{lookup}"] = number
+    return conditions
+
+
+def filter_by_ranges(queryset: QuerySet, conditions: dict[str, dict[str, Any]]) -> QuerySet:
+    # Все условия по одному ключу — в одном filter(), т.е. одним JOIN и одним
+    # диапазоном по индексу (key, value_number)
+    for key, lookups in conditions.items():
+        queryset = queryset.filter(
+            attribute_values__key=key,
+            **{f"attribute_values__{lookup}": value for lookup, value in lookups.items()},
+        )
+    return queryset
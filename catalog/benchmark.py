@@ -0,0 +1,325 @@
+"""Нагрузочный прогон основных страниц и API каталога.
+
+Сценарии (список, карточка, поиск, API, подсказки, фасеты, оформление
+заявки) выполняются параллельно в ``concurrency`` потоках. По умолчанию
+запросы идут через ``django.test.Client`` в этом же процессе — тогда для
+каждого запроса известно и число SQL-запросов. С ``base_url`` нагружается
+запущенный сервер по HTTP; число запросов к БД тогда не измеряется.
+
+Итог — p50/p95/p99 времени ответа, среднее число SQL-запросов, доля ошибок
+и пропускная способность по каждому сценарию. Результат сохраняется в JSON
+вместе с коммитом, чтобы сравнивать прогоны между изменениями.
+"""
+
+from __future__ import annotations
+
+import base64
+import itertools
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.settings import api_settings
+
+from .models import Equipment
+from .seeding import USER_PREFIX
+
+SEARCH_WORDS = ["насос", "компрессор", "двигатель", "Grundfos", "сталь", "SEED-0000"]
+
+
+@dataclass
+class Sample:
+    elapsed: float
+    status: int
+    queries: int | None
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_queries: float | None
+    throughput: float
+
+
+@dataclass
+class BenchmarkReport:
+    started_at: str
+    commit: str
+    concurrency: int
+    mode: str
+    scenarios: list[ScenarioResult] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Процентиль по ближайшему рангу; для пустого списка — 0."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def client_host() -> str:
+    """Хост из ALLOWED_HOSTS: тестовый ``testserver`` вне тестов не разрешён."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+class Transport:
+    """Выполняет запрос и возвращает (статус, число SQL-запросов или None)."""
+
+    mode = ""
+
+    def login(self, username: str) -> None:
+        raise NotImplementedError
+
+    def request(self, method: str, path: str, data: dict | None = None,
+                headers: dict[str, str] | None = None) -> tuple[int, int | None]:
+        raise NotImplementedError
+
+
+class ClientTransport(Transport):
+    mode = "client"
+
+    def __init__(self) -> None:
+        self.client = Client(HTTP_HOST=client_host())
+
+    def login(self, username: str) -> None:
+        self.client.force_login(get_user_model().objects.get(username=username))
+
+    def request(self, method, path, data=None, headers=None):
+        with CaptureQueriesContext(connection) as queries:
+            if method == "GET":
+                response = self.client.get(path, data, headers=headers)
+            else:
+                response = self.client.post(
+                    path, json.dumps(data or {}), content_type="application/json",
+                    headers=headers,
+                )
+        return response.status_code, len(queries)
+
+
+class HTTPTransport(Transport):
+    mode = "http"
+
+    def __init__(self, base_url: str, password: str = "") -> None:
+        self.base_url = base_url.rstrip("/")
+        self.password = password
+        self.auth = ""
+
+    def login(self, username: str) -> None:
+        # Basic-авторизация проверяет пароль на каждом запросе: сценарии с
+        # входом по HTTP медленнее на время хеширования пароля
+        token = base64.b64encode(f"{username}:{self.password}".encode()).decode()
+        self.auth = f"Basic {token}"
+
+    def request(self, method, path, data=None, headers=None):
+        url = self.base_url + path
+        body = None
+        headers = {"Accept": "application/json", **(headers or {})}
+        if method == "GET" and data:
+            url += "?" + urllib.parse.urlencode(data)
+        elif method != "GET":
+            body = json.dumps(data or {}).encode()
+            headers["Content-Type"] = "application/json"
+        if self.auth:
+            headers["Authorization"] = self.auth
+        req = urllib.request.Request(url, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as exc:
+            return exc.code, None
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[Transport, random.Random], tuple[int, int | None]]
+    needs_login: bool = False
+
+
+def default_scenarios(equipment_ids: list[int], inventory_numbers: list[str],
+                      pages: int = 5) -> list[Scenario]:
+    """Сценарии по умолчанию; ``pages`` — сколько первых страниц списков листать."""
+    def detail(transport, rng):
+        return transport.request("GET", f"/equipment/{rng.choice(equipment_ids)}/")
+
+    def checkout(transport, rng):
+        transport.request("POST", "/api/cart/batch/", {"items": [
+            {"equipment": rng.choice(equipment_ids), "quantity": 1},
+        ]})
+        return transport.request(
+            "POST", "/api/cart/checkout/",
+            {"name": "Бенчмарк", "email": "bench@example.com"},
+            headers={"Idempotency-Key": uuid.uuid4().hex},
+        )
+
+    return [
+        Scenario("list", lambda t, rng: t.request("GET", "/", {"page": rng.randint(1, pages)})),
+        Scenario("detail", detail),
+        Scenario("search", lambda t, rng: t.request(
+            "GET", "/", {"query": rng.choice(SEARCH_WORDS)}
+        )),
+        Scenario("api_list", lambda t, rng: t.request(
+            "GET", "/api/equipment/", {"page": rng.randint(1, pages)}
+        )),
+        Scenario("api_detail", lambda t, rng: t.request(
+            "GET", f"/api/equipment/{rng.choice(equipment_ids)}/"
+        )),
+        Scenario("suggest", lambda t, rng: t.request(
+            "GET", "/api/equipment/suggest/", {"q": rng.choice(inventory_numbers)[:8]}
+        )),
+        Scenario("facets", lambda t, rng: t.request("GET", "/api/equipment/facets/")),
+        Scenario("checkout", checkout, needs_login=True),
+    ]
+
+
+class BenchmarkRunner:
+    def __init__(self, requests: int = 200, concurrency: int = 8, base_url: str = "",
+                 scenarios: list[str] | None = None, seed: int = 1,
+                 password: str = "") -> None:
+        self.requests = requests
+        self.concurrency = max(1, concurrency)
+        self.base_url = base_url
+        self.only = set(scenarios or [])
+        self.seed = seed
+        self.password = password
+        self._local = threading.local()
+        self._logins = itertools.count()
+        self._logins_lock = threading.Lock()
+
+    def username(self) -> str:
+        """Покупатель потока: у каждого свой, чтобы потоки не делили корзину."""
+        if not hasattr(self._local, "username"):
+            with self._logins_lock:
+                index = next(self._logins)
+            self._local.username = self.usernames[index % len(self.usernames)]
+        return self._local.username
+
+    def transport(self, scenario: Scenario) -> Transport:
+        # У каждого потока свой клиент (и своя сессия) на сценарий
+        transports = self._local.__dict__.setdefault("transports", {})
+        if scenario.name not in transports:
+            transport: Transport = (
+                HTTPTransport(self.base_url, self.password) if self.base_url else ClientTransport()
+            )
+            if scenario.needs_login:
+                transport.login(self.username())
+            transports[scenario.name] = transport
+        return transports[scenario.name]
+
+    def scenarios(self) -> list[Scenario]:
+        rows = list(Equipment.objects.order_by("?").values_list("pk", "inventory_number")[:500])
+        if not rows:
+            raise ValueError("Каталог пуст: сначала manage.py seed_catalog")
+        self.usernames = list(
+            get_user_model().objects.filter(username__startswith=USER_PREFIX)
+            .order_by("pk").values_list("username", flat=True)[:100]
+        )
+        # Страницы берутся из первых пяти, но не дальше последней страницы API
+        pages = max(1, min(5, Equipment.objects.count() // api_settings.PAGE_SIZE))
+        scenarios = default_scenarios(
+            [pk for pk, _ in rows], [number for _, number in rows], pages
+        )
+        # По HTTP покупатели входят паролем из вывода seed_catalog
+        if not self.usernames or (self.base_url and not self.password):
+            scenarios = [scenario for scenario in scenarios if not scenario.needs_login]
+        if self.only:
+            scenarios = [scenario for scenario in scenarios if scenario.name in self.only]
+        return scenarios
+
+    def measure(self, scenario: Scenario, index: int) -> Sample:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        started = time.perf_counter()
+        try:
+            status, queries = scenario.run(self.transport(scenario), rng)
+        except Exception:
+            status, queries = 0, None
+        return Sample(time.perf_counter() - started, status, queries)
+
+    def run_scenario(self, scenario: Scenario) -> ScenarioResult:
+        started = time.perf_counter()
+        if self.concurrency == 1:
+            samples = [self.measure(scenario, index) for index in range(self.requests)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                samples = list(pool.map(
+                    lambda index: self.measure(scenario, index), range(self.requests)
+                ))
+        wall = time.perf_counter() - started
+        timings = [sample.elapsed * 1000 for sample in samples]
+        counted = [sample.queries for sample in samples if sample.queries is not None]
+        return ScenarioResult(
+            name=scenario.name,
+            requests=len(samples),
+            errors=sum(1 for sample in samples if not 200 <= sample.status < 400),
+            p50_ms=round(percentile(timings, 50), 2),
+            p95_ms=round(percentile(timings, 95), 2),
+            p99_ms=round(percentile(timings, 99), 2),
+            mean_queries=round(sum(counted) / len(counted), 2) if counted else None,
+            throughput=round(len(samples) / wall, 1) if wall else 0.0,
+        )
+
+    def run(self, progress: Callable[[ScenarioResult], None] | None = None) -> BenchmarkReport:
+        report = BenchmarkReport(
+            started_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            commit=current_commit(),
+            concurrency=self.concurrency,
+            mode="http" if self.base_url else "client",
+        )
+        for scenario in self.scenarios():
+            result = self.run_scenario(scenario)
+            report.scenarios.append(result)
+            if progress:
+                progress(result)
+        return report
+
+
+def save_report(report: BenchmarkReport, directory: Path) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = report.started_at.replace(":", "").replace("-", "")
+    path = directory / f"{stamp}-{report.commit or 'nogit'}.json"
+    path.write_text(json.dumps(report.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def load_report(path: Path) -> dict[str, dict[str, Any]]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {row["name"]: row for row in data["scenarios"]}
@@ -0,0 +1,171 @@
+"""Корзина: счётчик позиций для значка в навигации и запись позиций.
+
+Счётчик хранится в кэше по пользователю и сбрасывается сигналами при
+добавлении/удалении ``CartItem`` и при оформлении заявки. Сброс виден только
+процессу, где он произошёл (кэш по умолчанию — LocMem), поэтому запись живёт
+недолго: ``CATALOG_CART_COUNT_TIMEOUT``, по умолчанию минута.
+
+Добавление — один оператор ``INSERT ... ON CONFLICT (user_id, equipment_id)
+DO UPDATE``: количество прибавляется в самой БД, поэтому параллельные
+нажатия «В корзину» не теряют друг друга. Такой ``INSERT`` не шлёт сигналов,
+счётчик сбрасывается явно.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+ADD, SET, REMOVE = "add", "set", "remove"
+# Строк в одном INSERT: 4 параметра на строку держат запрос в лимитах SQLite
+UPSERT_BATCH_SIZE = 200
+
+
+def _cache_key(user_id: int) -> str:
+    return f"catalog:cart_count:{user_id}"
+
+
+def cart_count(user_id: int) -> int:
+    key = _cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        from .models import CartItem
+
+        count = CartItem.objects.filter(user_id=user_id).count()
+        cache.set(key, count, getattr(settings, "CATALOG_CART_COUNT_TIMEOUT", 60))
+    return count
+
+
+def invalidate_cart_count(user_id: int) -> None:
+    cache.delete(_cache_key(user_id))
+
+
+def _supports_upsert() -> bool:
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def _upsert_sql(rows: int, select_existing: bool, replace: bool) -> str:
+    from .models import CartItem, Equipment
+
+    qn = connection.ops.quote_name
+    table = qn(CartItem._meta.db_table)
+    quantity = qn("quantity")
+    new_quantity = f"excluded.{quantity}"
+    if not replace:
+        new_quantity = f"{table}.{quantity} + {new_quantity}"
+    columns = ", ".join(qn(name) for name in ("user_id", "equipment_id", "quantity", "added_at"))
+    if select_existing:
+        # Вставка только если оборудование есть: без отдельного SELECT для 404
+        source = (
+            f"SELECT %s, {qn('id')}, %s, %s FROM {qn(Equipment._meta.db_table)} "
+            f"WHERE {qn('id')} = %s"
+        )
+    else:
+        source = "VALUES " + ", ".join(["(%s, %s, %s, %s)"] * rows)
+    return (
+        f"INSERT INTO {table} ({columns}) {source} "
+        f"ON CONFLICT ({qn('user_id')}, {qn('equipment_id')}) "
+        f"DO UPDATE SET {quantity} = {new_quantity}"
+    )
+
+
+def _fallback_upsert(user_id: int, quantities: dict[int, int], replace: bool) -> None:
+    from .models import CartItem
+
+    for equipment_id, quantity in quantities.items():
+        value = quantity if replace else F("quantity") + quantity
+        if not CartItem.objects.filter(user_id=user_id, equipment_id=equipment_id).update(
+            quantity=value
+        ):
+            CartItem.objects.create(user_id=user_id, equipment_id=equipment_id, quantity=quantity)
+
+
+def add_item(user_id: int, equipment_id: int, quantity: int = 1) -> bool:
+    """Прибавить ``quantity`` к позиции (или создать её); ``False`` — оборудования нет."""
+    from .models import Equipment
+
+    if _supports_upsert():
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _upsert_sql(1, select_existing=True, replace=False),
+                [user_id, quantity, now, equipment_id],
+            )
+            added = cursor.rowcount > 0
+    else:
+        with transaction.atomic():
+            added = Equipment.objects.filter(pk=equipment_id).exists()
+            if added:
+                _fallback_upsert(user_id, {equipment_id: quantity}, replace=False)
+    if added:
+        transaction.on_commit(lambda: invalidate_cart_count(user_id))
+    return added
+
+
+def upsert_items(user_id: int, quantities: dict[int, int], replace: bool = False) -> None:
+    """Записать много позиций пачками ``INSERT ... ON CONFLICT``.
+
+    ``replace=False`` прибавляет количество к существующим позициям,
+    ``True`` — заменяет его. Существование оборудования проверяет вызывающий.
+    """
+    items = list(quantities.items())
+    if not items:
+        return
+    if not _supports_upsert():
+        _fallback_upsert(user_id, quantities, replace)
+    else:
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), UPSERT_BATCH_SIZE):
+                chunk = items[start:start + UPSERT_BATCH_SIZE]
+                params = []
+                for equipment_id, quantity in chunk:
+                    params.extend([user_id, equipment_id, quantity, now])
+                cursor.execute(_upsert_sql(len(chunk), select_existing=False, replace=replace),
+                               params)
+    transaction.on_commit(lambda: invalidate_cart_count(user_id))
+
+
+def fold_changes(changes: Iterable[tuple[str, int, int]]) -> dict[int, tuple[str, int]]:
+    """Свести последовательность (операция, оборудование, количество) к итогу по позиции.
+
+    Порядок важен: ``add`` после ``set`` даёт ``set`` суммы, ``add`` после
+    ``remove`` — ``set``; ``set`` с нулём равносилен ``remove``.
+    """
+    result: dict[int, tuple[str, int]] = {}
+    for op, equipment_id, quantity in changes:
+        previous = result.get(equipment_id)
+        if op == ADD and previous is not None:
+            previous_op, previous_quantity = previous
+            if previous_op == REMOVE:
+                result[equipment_id] = (SET, quantity)
+            else:
+                result[equipment_id] = (previous_op, previous_quantity + quantity)
+        elif op == SET and quantity == 0:
+            result[equipment_id] = (REMOVE, 0)
+        else:
+            result[equipment_id] = (op, quantity)
+    return result
+
+
+def apply_changes(user_id: int, changes: dict[int, tuple[str, int]]) -> dict[str, int]:
+    """Применить итог ``fold_changes`` одной транзакцией; вернуть число позиций по операциям."""
+    from .models import CartItem
+
+    grouped: dict[str, dict[int, int]] = {ADD: {}, SET: {}, REMOVE: {}}
+    for equipment_id, (op, quantity) in changes.items():
+        grouped[op][equipment_id] = quantity
+    with transaction.atomic():
+        upsert_items(user_id, grouped[ADD])
+        upsert_items(user_id, grouped[SET], replace=True)
+        removed = 0
+        if grouped[REMOVE]:
+            removed, _ = CartItem.objects.filter(
+                user_id=user_id, equipment_id__in=list(grouped[REMOVE])
+            ).delete()
+    return {ADD: len(grouped[ADD]), SET: len(grouped[SET]), REMOVE: removed}
@@ -0,0 +1,91 @@
+"""Условные GET (ETag / Last-Modified) для карточки и списка оборудования.
+
+Валидаторы считаются до загрузки объектов: для карточки — по ``updated_at``
+записи, для списка — без запросов к БД, по поколению каталога
+(``versions.CATALOG``), нормализованной строке запроса и номеру интервала
+``CATALOG_LIST_ETAG_TTL``: с кэшем в памяти процесса (LocMem) поколение,
+увеличенное в другом процессе, не видно, и интервал ограничивает, как долго
+такой процесс отвечает 304 на изменившийся список. В ETag входит версия
+справочников (названия типов, площадок и цехов видны в ответе) и, для HTML,
+всё, что зависит от пользователя. Если валидаторы совпали, отдаётся 304 без сериализации и
+рендеринга.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import versions
+from .response_cache import normalized_query
+
+
+def make_etag(*parts: Any) -> str:
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def list_validators(request: HttpRequest, *parts: Any) -> dict:
+    """Валидаторы списка: поколение каталога и нормализованная строка запроса.
+
+    Агрегат по отфильтрованной выборке на каждый запрос не нужен: поколение
+    растёт при любом изменении оборудования, паспортов и справочников.
+    ``Last-Modified`` у списка нет.
+    """
+    ttl = getattr(settings, "CATALOG_LIST_ETAG_TTL", 60)
+    return {
+        "etag": make_etag(
+            versions.get_version(versions.CATALOG),
+            int(time.time() // ttl),
+            versions.get_version(versions.REFERENCE),
+            request.path,
+            normalized_query(request.GET),
+            *parts,
+        ),
+        "last_modified": None,
+    }
+
+
+def validators(request: HttpRequest, last_modified: datetime | None, *parts: Any) -> dict:
+    return {
+        "etag": make_etag(
+            versions.get_version(versions.REFERENCE),
+            last_modified.isoformat() if last_modified else "",
+            request.get_full_path(),
+            *parts,
+        ),
+        "last_modified": last_modified,
+    }
+
+
+def not_modified(request: HttpRequest, etag: str,
+                 last_modified: datetime | None) -> HttpResponseBase | None:
+    """Ответ 304, если у клиента актуальная копия; иначе ``None``."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def apply_headers(request: HttpRequest, response: HttpResponseBase, etag: str,
+                  last_modified: datetime | None, vary: tuple[str, ...] = ("Cookie",)) -> None:
+    """Проставить валидаторы и правила кэширования (в том числе на ответ 304)."""
+    if response.status_code not in (200, 304):
+        return
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    # Кэш может хранить копию, но обязан перепроверять её; личные ответы — только браузер
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, vary)
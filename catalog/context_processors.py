@@ -1,24 +1,22 @@
 from __future__ import annotations
 
+from typing import Any
+
 from django.contrib.auth.models import AnonymousUser
 from django.http import HttpRequest
+from django.utils.functional import SimpleLazyObject
 
-from .models import CartItem
+from .cart import cart_count
+from .roles import can_add_equipment
 
 
-def catalog_context(request: HttpRequest) -> dict[str, int]:
+def catalog_context(request: HttpRequest) -> dict[str, Any]:
     user = request.user
     if isinstance(user, AnonymousUser) or not user.is_authenticated:
         return {"cart_count": 0, "can_add_equipment": False}
-    cart_count = (
-        CartItem.objects.filter(user=user)
-        .only("id")  # lightweight query
-        .count()
-    )
-    can_add = (
-        user.is_superuser
-        or user.is_staff
-        or user.groups.filter(name="seller").exists()
-    )
-    return {"cart_count": cart_count, "can_add_equipment": can_add}
-
+    # Считается только если шаблон действительно обратится к cart_count
+    user_id = user.pk
+    return {
+        "cart_count": SimpleLazyObject(lambda: cart_count(user_id)),
+        "can_add_equipment": can_add_equipment(user),
+    }
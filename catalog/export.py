@@ -0,0 +1,80 @@
+"""Потоковая выгрузка каталога в CSV/NDJSON.
+
+Строки читаются из БД пачками (``iterator``; на PostgreSQL — серверным
+курсором) и сразу уходят клиенту, поэтому память не зависит от объёма выборки.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+from typing import Any, Iterator
+
+from django.db.models import QuerySet
+
+CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    ("id", "pk"),
+    ("inventory_number", "inventory_number"),
+    ("name", "name"),
+    ("equipment_type_id", "equipment_type_id"),
+    ("equipment_type", "equipment_type__name"),
+    ("site_id", "site_id"),
+    ("site", "site__name"),
+    ("workshop_id", "workshop_id"),
+    ("workshop", "workshop__name"),
+    ("description", "description"),
+    ("attributes", "attributes"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+]
+COLUMNS = [column for column, _ in EXPORT_FIELDS]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def export_rows(queryset: QuerySet) -> Iterator[tuple]:
+    queryset = queryset.select_related(None).prefetch_related(None)
+    yield from queryset.values_list(*[lookup for _, lookup in EXPORT_FIELDS]).iterator(
+        chunk_size=CHUNK_SIZE
+    )
+
+
+def _plain(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(queryset: QuerySet) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    # BOM, чтобы Excel открыл UTF-8 без вопросов
+    yield "\ufeff" + writer.writerow(COLUMNS)
+    attributes_index = COLUMNS.index("attributes")
+    for row in export_rows(queryset):
+        row = [_plain(value) for value in row]
+        row[attributes_index] = json.dumps(row[attributes_index] or {}, ensure_ascii=False)
+        yield writer.writerow(row)
+
+
+def stream_ndjson(queryset: QuerySet) -> Iterator[str]:
+    for row in export_rows(queryset):
+        record = {column: _plain(value) for column, value in zip(COLUMNS, row)}
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+STREAMS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+}
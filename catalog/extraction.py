@@ -0,0 +1,198 @@
+"""Извлечение текста из файлов паспортов для поискового индекса.
+
+Разбор файлов идёт в пуле процессов (он нагружает CPU и не должен держать
+запрос загрузки): после коммита сохранённого ``Passport`` его файл уходит в
+пул, результат сжимается zlib и записывается в ``PassportText`` по SHA-256
+содержимого — одинаковые файлы разбираются один раз. Затем оборудование
+переиндексируется, и слова из паспорта находит обычный поиск.
+
+PDF разбирается через ``pypdf``, если он установлен; без него — встроенным
+разбором текстовых операторов (хватает для номеров деталей и латиницы в
+простых PDF). Текстовые файлы читаются как есть.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = {".txt", ".csv", ".md", ".log"}
+# Потолок текста одного файла: дальше идут приложения и таблицы, искать по ним незачем
+MAX_TEXT_LENGTH = 2_000_000
+
+_STREAM_RE = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.DOTALL)
+_TEXT_OP_RE = re.compile(rb"\[(.*?)\]\s*TJ|\((.*?)(?<!\\)\)\s*(?:Tj|'|\")", re.DOTALL)
+_STRING_RE = re.compile(rb"\((.*?)(?<!\\)\)", re.DOTALL)
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"", b"f": b"",
+            b"(": b"(", b")": b")", b"\\": b"\\"}
+
+_executor: ProcessPoolExecutor | None = None
+_dispatcher: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress(data: bytes | memoryview | None) -> str:
+    return zlib.decompress(bytes(data)).decode("utf-8") if data else ""
+
+
+def _unescape(raw: bytes) -> bytes:
+    return re.sub(rb"\\([nrtbf()\\]|[0-7]{1,3})",
+                  lambda m: _ESCAPES.get(m.group(1)) or bytes([int(m.group(1), 8) & 0xFF]),
+                  raw)
+
+
+def _pdf_text_fallback(data: bytes) -> str:
+    parts = []
+    for match in _STREAM_RE.finditer(data):
+        stream = match.group(1)
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        for array, single in _TEXT_OP_RE.findall(stream):
+            chunks = _STRING_RE.findall(array) if array else [single]
+            parts.append(b"".join(_unescape(chunk) for chunk in chunks).decode("latin-1"))
+    return "\n".join(parts)
+
+
+def _pdf_text(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        with open(path, "rb") as source:
+            return _pdf_text_fallback(source.read())
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_text(path: str, filename: str) -> str:
+    """Текст файла по пути; выполняется в процессе пула, к БД не обращается."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".pdf":
+        text = _pdf_text(path)
+    elif ext in TEXT_EXTENSIONS:
+        with open(path, "rb") as source:
+            raw = source.read(MAX_TEXT_LENGTH * 4)
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode("cp1251", errors="replace")
+    else:
+        return ""
+    return " ".join(text.split())[:MAX_TEXT_LENGTH]
+
+
+def local_copy(field_file) -> tuple[str, bool]:
+    """Путь к файлу на диске; для удалённых хранилищ — временная копия."""
+    try:
+        return field_file.path, False
+    except NotImplementedError:
+        suffix = os.path.splitext(field_file.name)[1]
+        with field_file.open("rb") as source, tempfile.NamedTemporaryFile(
+            suffix=suffix, delete=False
+        ) as target:
+            shutil.copyfileobj(source, target)
+        return target.name, True
+
+
+def pending_passports(force: bool = False):
+    from .models import Passport, PassportText
+
+    queryset = Passport.objects.exclude(file="").order_by("pk")
+    if not force:
+        queryset = queryset.exclude(
+            sha256__in=PassportText.objects.values("sha256")
+        )
+    return queryset
+
+
+def ensure_digest(passport) -> str:
+    """SHA-256 паспорта; для файлов, загруженных до контентной адресации, считается тут."""
+    if not passport.sha256:
+        from .models import Passport
+        from .uploads import hash_stream
+
+        with passport.file.open("rb") as source:
+            passport.sha256, passport.size = hash_stream(source)
+        Passport.objects.filter(pk=passport.pk).update(sha256=passport.sha256, size=passport.size)
+    return passport.sha256
+
+
+def store_text(passport, text: str) -> None:
+    """Сохранить текст и переиндексировать оборудование всех паспортов с этим файлом."""
+    from . import search, versions
+    from .models import Passport, PassportText
+
+    digest = ensure_digest(passport)
+    PassportText.objects.update_or_create(
+        sha256=digest, defaults={"content": compress(text), "length": len(text)}
+    )
+    search.index_equipment(
+        Passport.objects.filter(sha256=digest).values_list("equipment_id", flat=True).distinct()
+    )
+    versions.bump_version(versions.CATALOG)
+
+
+def process_passport(passport, extract=extract_text) -> str | None:
+    """Извлечь и сохранить текст одного паспорта; ``None`` — файл не разобран."""
+    path, temporary = local_copy(passport.file)
+    try:
+        text = extract(path, passport.file.name)
+    except Exception:
+        logger.exception("Не удалось извлечь текст паспорта %s", passport.pk)
+        return None
+    finally:
+        if temporary:
+            os.remove(path)
+    store_text(passport, text)
+    return text
+
+
+def _pools() -> tuple[ProcessPoolExecutor, ThreadPoolExecutor]:
+    global _executor, _dispatcher
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "CATALOG_EXTRACTION_WORKERS", 2)
+            )
+            # Потоки-диспетчеры читают БД, ждут процесс и пишут результат
+            _dispatcher = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CATALOG_EXTRACTION_WORKERS", 2),
+                thread_name_prefix="passport-text",
+            )
+    return _executor, _dispatcher
+
+
+def _run_in_worker(passport_id: int) -> None:
+    from .models import Passport
+
+    processes, _ = _pools()
+    try:
+        passport = Passport.objects.filter(pk=passport_id).first()
+        if passport is not None and passport.file:
+            process_passport(
+                passport,
+                extract=lambda path, name: processes.submit(extract_text, path, name).result(),
+            )
+    finally:
+        connections.close_all()
+
+
+def schedule_extraction(passport_id: int) -> None:
+    """Поставить извлечение текста в очередь после коммита текущей транзакции."""
+    transaction.on_commit(lambda: _pools()[1].submit(_run_in_worker, passport_id))
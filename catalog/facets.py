@@ -0,0 +1,141 @@
+"""Счётчики фильтров каталога (фасеты).
+
+Для текущего набора фильтров считается, сколько оборудования приходится на
+каждый тип, площадку и цех, и самые частые значения характеристик. Запросов
+всегда четыре — по одному ``GROUP BY`` на измерение; выборка оборудования
+подставляется подзапросом ``pk IN (...)``, поэтому JOIN-ы фильтров не
+раздувают счётчики.
+
+Результат кэшируется по фильтрам (параметры страницы, сортировки и вида
+ответа в ключ не входят) вместе с поколением каталога ``versions.CATALOG``,
+так что любое изменение оборудования или справочников его сбрасывает. У
+страницы и API ключи раздельные (``namespace``): одинаковые параметры там
+значат разное — например, ``site`` в HTML — часть названия, в API — ещё и id.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+from django.conf import settings
+from django.db.models import Count, F, QuerySet, Window
+from django.db.models.functions import RowNumber
+
+from . import response_cache
+
+# Параметры, которые меняют вид ответа, но не набор оборудования
+IGNORED_PARAMS = {
+    "page", "page_size", "cursor", "pagination", "ordering", "fields", "expand", "format",
+}
+
+
+def attribute_value_limit() -> int:
+    return getattr(settings, "CATALOG_FACET_ATTRIBUTE_VALUES", 10)
+
+
+def cache_key(namespace: str, params) -> str:
+    params = params.copy()
+    for param in IGNORED_PARAMS:
+        params.pop(param, None)
+    raw = response_cache.normalized_query(params)
+    return f"catalog:facets:{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def _grouped(base: QuerySet, field: str, **columns: str) -> list[dict[str, Any]]:
+    """Счётчики по внешнему ключу ``field``; ``columns`` — имя в ответе -> путь поля."""
+    rows = (
+        base.values(f"{field}_id", *columns.values())
+        .annotate(count=Count("pk"))
+        .order_by("-count", f"{field}__name")
+    )
+    return [
+        {"id": row[f"{field}_id"], **{name: row[path] for name, path in columns.items()},
+         "count": row["count"]}
+        for row in rows
+    ]
+
+
+def facet_counts(queryset: QuerySet) -> dict[str, Any]:
+    """Счётчики по отфильтрованному ``queryset`` оборудования."""
+    from .models import Equipment, EquipmentAttribute
+
+    ids = queryset.order_by().values("pk")
+    base = Equipment.objects.filter(pk__in=ids).order_by()
+    attributes: dict[str, list[dict[str, Any]]] = {}
+    values = (
+        EquipmentAttribute.objects.filter(equipment_id__in=ids)
+        .exclude(value_text="")
+        .values("key", "value_text")
+        .annotate(count=Count("equipment_id"))
+        .annotate(
+            rank=Window(
+                RowNumber(), partition_by=F("key"),
+                order_by=[F("count").desc(), F("value_text").asc()],
+            )
+        )
+        .filter(rank__lte=attribute_value_limit())
+        .order_by("key", "rank")
+    )
+    for row in values:
+        attributes.setdefault(row["key"], []).append(
+            {"value": row["value_text"], "count": row["count"]}
+        )
+    return {
+        "equipment_type": _grouped(base, "equipment_type", name="equipment_type__name"),
+        "site": _grouped(base, "site", name="site__name"),
+        "workshop": _grouped(base, "workshop", name="workshop__name",
+                             site="workshop__site__name"),
+        "attributes": [{"key": key, "values": items} for key, items in attributes.items()],
+    }
+
+
+def cached_facet_counts(namespace: str, params, queryset: QuerySet) -> dict[str, Any]:
+    """``facet_counts`` через кэш ответов, привязанный к поколению каталога.
+
+    ``namespace`` — чьи это параметры (``html`` или ``api``).
+    """
+    return response_cache.get_or_build(
+        cache_key(namespace, params),
+        lambda: facet_counts(queryset),
+        ttl=getattr(settings, "CATALOG_FACET_CACHE_TIMEOUT", 300),
+    )
+
+
+def with_queries(facets: dict[str, Any], params) -> dict[str, Any]:
+    """Копия фасетов, где у каждого значения есть ``query`` — строка запроса с этим фильтром."""
+    def query(**values: Any) -> str:
+        updated = params.copy()
+        for param in ("page", "cursor"):
+            updated.pop(param, None)
+        for name, value in values.items():
+            if value is None:
+                updated.pop(name, None)
+            else:
+                updated[name] = value
+        return updated.urlencode()
+
+    return {
+        "equipment_type": [
+            {**row, "query": query(equipment_type=row["id"])} for row in facets["equipment_type"]
+        ],
+        "site": [{**row, "query": query(site=row["name"])} for row in facets["site"]],
+        # Цех — по id: одноимённые цеха есть на разных площадках
+        "workshop": [
+            {**row, "query": query(workshop_id=row["id"], workshop=None)}
+            for row in facets["workshop"]
+        ],
+        "attributes": [
+            {
+                "key": group["key"],
+                "values": [
+                    {
+                        **row,
+                        "query": query(attribute_key=group["key"], attribute_value=row["value"]),
+                    }
+                    for row in group["values"]
+                ],
+            }
+            for group in facets["attributes"]
+        ],
+    }
@@ -1,8 +1,10 @@
+import uuid
 from typing import Any, Dict
 
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
+from . import reference
 from .models import Equipment, EquipmentType, OrderRequest, Passport, Site, Workshop
 
 
@@ -44,10 +46,11 @@ class EquipmentForm(BootstrapFormMixin, forms.ModelForm):
             self.instance.equipment_type if self.instance.pk else None
         )
         if isinstance(equipment_type, int):
-            equipment_type = EquipmentType.objects.filter(pk=equipment_type).first()
-        if equipment_type and equipment_type.default_attributes:
-            for attr_name in equipment_type.default_attributes:
-                self.fields["attributes"].initial.setdefault(attr_name, "")
+            equipment_type = reference.snapshot().types.get(equipment_type)
+        if equipment_type and equipment_type.attribute_schema:
+            self.fields["attributes"].initial = {
+                attr_name: "" for attr_name in equipment_type.attribute_schema
+            }
 
     def clean_attributes(self) -> dict[str, Any]:
         attrs = self.cleaned_data.get("attributes") or {}
@@ -58,19 +61,43 @@ class EquipmentForm(BootstrapFormMixin, forms.ModelForm):
 
 class EquipmentSearchForm(BootstrapFormMixin, forms.Form):
     query = forms.CharField(label=_("Поиск"), required=False)
-    equipment_type = forms.ModelChoiceField(
-        queryset=EquipmentType.objects.all(), required=False, label=_("Тип")
+    # Типы — из снимка справочников: список на каждой странице без запроса к БД
+    equipment_type = forms.TypedChoiceField(
+        choices=lambda: [("", "---------"), *reference.snapshot().type_choices()],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        label=_("Тип"),
     )
+    include_subtypes = forms.BooleanField(label=_("Включая подтипы"), required=False)
     site = forms.CharField(label=_("Площадка"), required=False)
     workshop = forms.CharField(label=_("Цех"), required=False)
+    # Ссылки фасетов выбирают цех по id: названия цехов на площадках повторяются
+    workshop_id = forms.IntegerField(required=False, min_value=1, widget=forms.HiddenInput)
     attribute_key = forms.CharField(label=_("Характеристика"), required=False)
     attribute_value = forms.CharField(label=_("Значение"), required=False)
+    attribute_min = forms.DecimalField(label=_("От"), required=False)
+    attribute_max = forms.DecimalField(label=_("До"), required=False)
 
     def __init__(self, *args: Any, **kwargs: Dict[str, Any]) -> None:
         super().__init__(*args, **kwargs)
         self._apply_bootstrap()
         for field in ("equipment_type",):
             self.fields[field].widget.attrs["class"] = "form-select"
+        self.fields["include_subtypes"].widget.attrs["class"] = "form-check-input"
+
+    def range_conditions(self) -> dict[str, dict[str, Any]]:
+        """Диапазон «от/до» для выбранной характеристики, как в ``attributes.range_conditions``."""
+        data = self.cleaned_data
+        key = (data.get("attribute_key") or "").strip()
+        if not key:
+            return {}
+        lookups = {}
+        if data.get("attribute_min") is not None:
+            lookups["value_number__gte"] = float(data["attribute_min"])
+        if data.get("attribute_max") is not None:
+            lookups["value_number__lte"] = float(data["attribute_max"])
+        return {key: lookups} if lookups else {}
 
 
 class PassportForm(BootstrapFormMixin, forms.ModelForm):
@@ -116,12 +143,19 @@ class WorkshopForm(BootstrapFormMixin, forms.ModelForm):
 
 
 class CheckoutForm(BootstrapFormMixin, forms.ModelForm):
+    # Новый ключ на каждый показ формы: повторная отправка той же формы не создаст вторую заявку
+    idempotency_key = forms.CharField(
+        max_length=64, required=False, widget=forms.HiddenInput
+    )
+
     class Meta:
         model = OrderRequest
         fields = ["name", "email", "phone", "comment"]
 
     def __init__(self, *args: Any, **kwargs: Dict[str, Any]) -> None:
         super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault("idempotency_key", uuid.uuid4().hex)
         self._apply_bootstrap()
         self.fields["comment"].widget.attrs.setdefault("rows", 3)
         self.fields["name"].label = "Имя / организация"
@@ -0,0 +1,71 @@
+"""Кэш HTML-фрагментов: карточки оборудования в списке.
+
+Ключ карточки — ``pk``, ``updated_at`` записи и версия справочников (в
+карточке видны названия типа, площадки и цеха), поэтому при изменении
+одной записи перерисовывается только её карточка, а старые фрагменты
+вытесняются по таймауту. Все карточки страницы читаются одним
+``get_many``. Счётчики попаданий и промахов лежат в кэше рядом с
+фрагментами; их показывает ``manage.py fragment_cache_stats``.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import versions
+
+CARD_TEMPLATE = "partials/equipment_card.html"
+
+
+def _stats_key(name: str, counter: str) -> str:
+    return f"catalog:fragment:{name}:{counter}"
+
+
+def card_key(equipment, reference_version: int) -> str:
+    stamp = equipment.updated_at.timestamp() if equipment.updated_at else ""
+    return f"catalog:fragment:card:{equipment.pk}:{stamp}:{reference_version}"
+
+
+def _count(name: str, counter: str, delta: int) -> None:
+    if not delta:
+        return
+    key = _stats_key(name, counter)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def stats(name: str = "card") -> dict[str, int]:
+    hits = cache.get(_stats_key(name, "hits"), 0)
+    misses = cache.get(_stats_key(name, "misses"), 0)
+    return {"hits": hits, "misses": misses}
+
+
+def reset_stats(name: str = "card") -> None:
+    cache.delete_many([_stats_key(name, "hits"), _stats_key(name, "misses")])
+
+
+def render_cards(equipment_list: Iterable) -> str:
+    """HTML карточек по порядку: из кэша, недостающие — рендерятся и сохраняются."""
+    equipment_list = list(equipment_list)
+    reference_version = versions.get_version(versions.REFERENCE)
+    keys = [card_key(equipment, reference_version) for equipment in equipment_list]
+    cached = cache.get_many(keys)
+
+    rendered = {}
+    for key, equipment in zip(keys, equipment_list):
+        if key not in cached:
+            rendered[key] = render_to_string(CARD_TEMPLATE, {"equipment": equipment})
+    if rendered:
+        cache.set_many(
+            rendered, getattr(settings, "CATALOG_FRAGMENT_CACHE_TIMEOUT", 24 * 60 * 60)
+        )
+    _count("card", "hits", len(keys) - len(rendered))
+    _count("card", "misses", len(rendered))
+    return "".join(cached.get(key) or rendered[key] for key in keys)
@@ -0,0 +1,126 @@
+"""Миниатюры для ``Equipment.image``.
+
+После загрузки фото (по коммиту транзакции) пул потоков строит уменьшенные
+копии фиксированных ширин в JPEG и WebP рядом с оригиналом:
+``equipment/thumbs/<имя>_<расширение>_<ширина>.<jpg|webp>``. Готовые ширины записываются в
+``Equipment.image_thumbnails``, по ним шаблоны строят ``srcset``.
+"""
+
+from __future__ import annotations
+
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "jpeg": ("jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("webp", {"quality": 80, "method": 4}),
+}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_widths() -> tuple[int, ...]:
+    return tuple(getattr(settings, "CATALOG_THUMBNAIL_WIDTHS", (320, 640, 1024)))
+
+
+def thumbnail_name(name: str, width: int, fmt: str) -> str:
+    directory, filename = posixpath.split(name)
+    stem, extension = posixpath.splitext(filename)
+    # Расширение оригинала остаётся в имени: у pump.jpg и pump.png разные миниатюры
+    if extension:
+        stem = f"{stem}_{extension[1:]}"
+    return posixpath.join(directory, "thumbs", f"{stem}_{width}.{FORMATS[fmt][0]}")
+
+
+def generate_thumbnails(name: str, storage=default_storage, force: bool = False) -> list[int]:
+    """Построить миниатюры для файла ``name``; вернуть список готовых ширин."""
+    with storage.open(name, "rb") as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    widths = []
+    for width in sorted(thumbnail_widths()):
+        # Не увеличиваем: ширины больше оригинала пропускаются
+        if width >= image.width and widths:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        for fmt, (_, options) in FORMATS.items():
+            target = thumbnail_name(name, width, fmt)
+            if storage.exists(target):
+                if not force:
+                    continue
+                storage.delete(target)
+            buffer = BytesIO()
+            resized.save(buffer, format=fmt.upper(), **options)
+            storage.save(target, ContentFile(buffer.getvalue()))
+        widths.append(width)
+    return widths
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CATALOG_THUMBNAIL_WORKERS", 2),
+                thread_name_prefix="thumbnails",
+            )
+    return _executor
+
+
+def build_thumbnails(name: str, force: bool = False) -> list[int]:
+    """Как ``generate_thumbnails``, но ошибки файла логируются, а не пробрасываются."""
+    try:
+        return generate_thumbnails(name, force=force)
+    except Exception:
+        logger.exception("Не удалось построить миниатюры для %s", name)
+        return []
+
+
+def store_thumbnails(equipment_id: int, name: str, widths: list[int]) -> None:
+    from .models import Equipment
+
+    # Если фото успели заменить, результат относится к старому файлу
+    if Equipment.objects.filter(pk=equipment_id, image=name).update(
+        image_thumbnails=widths, updated_at=timezone.now()
+    ):
+        versions.bump_version(versions.CATALOG)
+
+
+def process_equipment_image(equipment_id: int, name: str, force: bool = False) -> list[int]:
+    widths = build_thumbnails(name, force=force)
+    if widths:
+        store_thumbnails(equipment_id, name, widths)
+    return widths
+
+
+def schedule_thumbnails(equipment_id: int, name: str) -> None:
+    """Поставить построение миниатюр в пул после коммита текущей транзакции."""
+    transaction.on_commit(lambda: _pool().submit(_run_in_worker, equipment_id, name))
+
+
+def _run_in_worker(equipment_id: int, name: str) -> None:
+    # У потока пула свои соединения с БД — закрываем их после задачи
+    try:
+        process_equipment_image(equipment_id, name)
+    finally:
+        connections.close_all()
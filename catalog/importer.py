@@ -0,0 +1,216 @@
+"""Потоковый импорт оборудования из CSV/JSONL (выгрузки ERP).
+
+Файл читается построчно, строки копятся пачками по ``batch_size``. Площадки,
+цеха и типы разрешаются по имени через словари, загруженные один раз. Для
+каждой пачки одним запросом выбираются существующие записи по
+``inventory_number``; строки с тем же ``content_hash`` пропускаются, новые
+пишутся ``bulk_create``, изменённые — ``bulk_update``.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import attributes, search, versions
+from .models import Equipment, EquipmentType, Site, Workshop, content_hash
+
+DEFAULT_BATCH_SIZE = 1000
+UPDATE_FIELDS = [
+    "name",
+    "equipment_type",
+    "site",
+    "workshop",
+    "description",
+    "attributes",
+    "content_hash",
+    "updated_at",
+]
+
+
+@dataclass
+class ImportStats:
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class Rejection:
+    line: int
+    inventory_number: str
+    reason: str
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Отдавать (номер строки, словарь) без чтения файла целиком."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_num, {"__error__": f"Некорректный JSON: {exc.msg}"}
+                continue
+            yield line_num, row if isinstance(row, dict) else {"__error__": "Ожидается объект"}
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+
+class EquipmentImporter:
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False,
+                 progress: Callable[[ImportStats], None] | None = None) -> None:
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.stats = ImportStats()
+        self.sites = dict(Site.objects.values_list("name", "pk"))
+        self.workshops = {
+            (site_id, name): pk
+            for pk, site_id, name in Workshop.objects.values_list("pk", "site_id", "name")
+        }
+        self.workshop_names = {name for _, name in self.workshops}
+        self.types: dict[str, int] = {}
+        self.schemas: dict[int, dict[str, dict[str, Any]]] = {}
+        for pk, name, default_attributes in EquipmentType.objects.values_list(
+            "pk", "name", "default_attributes"
+        ):
+            # При одинаковых именах в дереве берётся первый тип
+            self.types.setdefault(name, pk)
+            self.schemas[pk] = attributes.safe_schema(default_attributes)
+
+    def run(self, rows: Iterable[tuple[int, dict[str, Any]]]) -> Iterator[Rejection]:
+        """Импортировать строки; отдаёт отклонённые по мере обработки."""
+        batch: dict[str, dict[str, Any]] = {}
+        for line, row in rows:
+            self.stats.processed += 1
+            try:
+                values = self.prepare(row)
+            except ValidationError as exc:
+                self.stats.rejected += 1
+                yield Rejection(
+                    line, str(row.get("inventory_number") or ""), "; ".join(exc.messages)
+                )
+                continue
+            # Повтор номера внутри пачки: побеждает последняя строка
+            batch[values["inventory_number"]] = values
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = {}
+        if batch:
+            self.write(batch)
+
+    def prepare(self, row: dict[str, Any]) -> dict[str, Any]:
+        if "__error__" in row:
+            raise ValidationError(row["__error__"])
+
+        def text(key: str, required: bool = True, max_length: int = 255) -> str:
+            value = str(row.get(key) or "").strip()
+            if required and not value:
+                raise ValidationError(f"Не заполнено поле {key}")
+            if max_length and len(value) > max_length:
+                raise ValidationError(f"Поле {key} длиннее {max_length} символов")
+            return value
+
+        inventory_number = text("inventory_number", max_length=100)
+        name = text("name")
+        type_name, site_name, workshop_name = text("equipment_type"), text("site"), text("workshop")
+
+        equipment_type_id = self.types.get(type_name)
+        if equipment_type_id is None:
+            raise ValidationError(f"Неизвестный тип: {type_name}")
+        site_id = self.sites.get(site_name)
+        if site_id is None:
+            raise ValidationError(f"Неизвестная площадка: {site_name}")
+        workshop_id = self.workshops.get((site_id, workshop_name))
+        if workshop_id is None:
+            # То же правило, что в Equipment.clean, но по словарю, а не запросом на строку
+            if workshop_name in self.workshop_names:
+                raise ValidationError("Цех должен принадлежать выбранной площадке")
+            raise ValidationError(f"Неизвестный цех: {workshop_name}")
+
+        attrs = row.get("attributes") or {}
+        if isinstance(attrs, str):
+            try:
+                attrs = json.loads(attrs)
+            except json.JSONDecodeError:
+                raise ValidationError("Характеристики должны быть JSON-объектом")
+        if not isinstance(attrs, dict):
+            raise ValidationError("Характеристики должны быть словарём")
+        attributes.validate_attributes(attrs, self.schemas.get(equipment_type_id, {}))
+
+        values = {
+            "inventory_number": inventory_number,
+            "name": name,
+            "equipment_type_id": equipment_type_id,
+            "site_id": site_id,
+            "workshop_id": workshop_id,
+            "description": text("description", required=False, max_length=0),
+            "attributes": attrs,
+        }
+        values["content_hash"] = content_hash(
+            **{key: value for key, value in values.items() if key != "inventory_number"}
+        )
+        return values
+
+    def write(self, batch: dict[str, dict[str, Any]]) -> None:
+        existing = {
+            inventory_number: (pk, digest)
+            for inventory_number, pk, digest in Equipment.objects.filter(
+                inventory_number__in=list(batch)
+            ).values_list("inventory_number", "pk", "content_hash")
+        }
+        to_create, to_update = [], []
+        now = timezone.now()
+        for inventory_number, values in batch.items():
+            pk, digest = existing.get(inventory_number, (None, None))
+            if pk is None:
+                to_create.append(Equipment(**values))
+            elif digest == values["content_hash"]:
+                self.stats.unchanged += 1
+            else:
+                to_update.append(Equipment(pk=pk, updated_at=now, **values))
+
+        if not self.dry_run and (to_create or to_update):
+            with transaction.atomic():
+                # Upsert на случай, если номер появился после выборки выше
+                Equipment.objects.bulk_create(
+                    to_create,
+                    update_conflicts=True,
+                    unique_fields=["inventory_number"],
+                    update_fields=UPDATE_FIELDS,
+                )
+                Equipment.objects.bulk_update(to_update, UPDATE_FIELDS)
+                # bulk-операции не шлют сигналы: индексы обновляем явно
+                written = to_create + to_update
+                search.index_equipment(item.pk for item in written)
+                attributes.sync_attributes(written)
+                versions.bump_version(versions.CATALOG)
+        self.stats.created += len(to_create)
+        self.stats.updated += len(to_update)
+        if self.progress:
+            self.progress(self.stats)
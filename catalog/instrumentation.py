@@ -0,0 +1,100 @@
+"""Учёт SQL-запросов и фаз обработки запроса.
+
+``QueryRecorder`` подключается к соединениям через
+``connection.execute_wrapper``: считает запросы и время в БД, раскладывает их
+по фазам (``view``, ``render``/``serialize``) и группирует по «форме» SQL —
+тексту без литералов и с раскрытыми списками ``IN`` (``fingerprint``). Форма,
+повторённая много раз за запрос, — признак N+1.
+
+``query_budget`` — то же самое для тестов: падает, если код выполнил больше
+запросов, чем разрешено, или повторил одну форму SQL.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"$])-?\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Форма запроса: литералы заменены на ``%s``, списки ``IN`` свёрнуты."""
+    sql = _STRING_RE.sub("%s", sql)
+    sql = _NUMBER_RE.sub("%s", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def nplusone_threshold() -> int:
+    return getattr(settings, "CATALOG_INSTRUMENTATION_NPLUSONE", 5)
+
+
+@dataclass
+class QueryRecorder:
+    """Обёртка для ``execute_wrapper``; один экземпляр — на один запрос."""
+
+    phase: str = "view"
+    count: int = 0
+    duration: float = 0.0
+    phases: Counter = field(default_factory=Counter)
+    shapes: Counter = field(default_factory=Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+            self.phases[self.phase] += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        """Формы SQL, выполненные не меньше ``threshold`` раз, — кандидаты в N+1."""
+        threshold = nplusone_threshold() if threshold is None else threshold
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= threshold]
+
+    @contextmanager
+    def installed(self) -> Iterator[QueryRecorder]:
+        """Подключить к каждому соединению текущего потока."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+@contextmanager
+def query_budget(queries: int, repeats: int | None = 2) -> Iterator[QueryRecorder]:
+    """Не больше ``queries`` запросов и не больше ``repeats`` одинаковых форм SQL.
+
+    ``repeats=None`` отключает проверку повторов. Используется в тестах как
+    бюджет для вьюхи::
+
+        with query_budget(6):
+            self.client.get(url)
+    """
+    with QueryRecorder().installed() as recorder:
+        yield recorder
+    problems = []
+    if recorder.count > queries:
+        problems.append(f"выполнено {recorder.count} SQL-запросов при бюджете {queries}")
+    if repeats is not None:
+        problems.extend(
+            f"форма повторена {count} раз (N+1?): {shape}"
+            for shape, count in recorder.repeated(repeats + 1)
+        )
+    if problems:
+        shapes = "\n".join(f"  {count} × {shape}" for shape, count in recorder.shapes.most_common())
+        raise AssertionError("\n".join(problems) + "\nЗапросы:\n" + shapes)
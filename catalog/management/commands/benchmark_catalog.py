@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.benchmark import BenchmarkRunner, load_report, save_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает список, карточку, поиск, API и оформление заявки; печатает "
+        "p50/p95/p99, SQL-запросов на запрос и пропускную способность"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+        parser.add_argument("--concurrency", type=int, default=8, help="Параллельных потоков")
+        parser.add_argument(
+            "--base-url",
+            default="",
+            help="Нагружать запущенный сервер по HTTP (по умолчанию — в этом процессе)",
+        )
+        parser.add_argument(
+            "--password",
+            default="",
+            help="Пароль покупателей из вывода seed_catalog; без него по HTTP оформление "
+                 "не проверяется",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            help="Только этот сценарий (можно повторять)",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=str(Path(settings.BASE_DIR) / "benchmarks"),
+            help="Куда сохранить JSON с результатами",
+        )
+        parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+        parser.add_argument("--no-save", action="store_true")
+
+    def handle(self, *args, **options):
+        baseline = load_report(Path(options["compare"])) if options["compare"] else {}
+        runner = BenchmarkRunner(
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            base_url=options["base_url"],
+            scenarios=options["scenarios"],
+            password=options["password"],
+        )
+        self.stdout.write(
+            f"{'сценарий':<12}{'запросов':>9}{'ошибок':>8}{'p50, мс':>10}{'p95, мс':>10}"
+            f"{'p99, мс':>10}{'SQL':>7}{'rps':>9}"
+        )
+        try:
+            report = runner.run(progress=lambda result: self.row(result, baseline))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not options["no_save"]:
+            path = save_report(report, Path(options["output_dir"]))
+            self.stdout.write(self.style.SUCCESS(f"Результаты: {path}"))
+
+    def row(self, result, baseline) -> None:
+        queries = "—" if result.mean_queries is None else f"{result.mean_queries:g}"
+        line = (
+            f"{result.name:<12}{result.requests:>9}{result.errors:>8}{result.p50_ms:>10.1f}"
+            f"{result.p95_ms:>10.1f}{result.p99_ms:>10.1f}{queries:>7}{result.throughput:>9.1f}"
+        )
+        previous = baseline.get(result.name)
+        if previous and previous["p95_ms"]:
+            change = (result.p95_ms - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"  p95 {change:+.0f}% к {previous['p95_ms']:.1f} мс"
+        self.stdout.write(line)
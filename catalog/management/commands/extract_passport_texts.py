@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from catalog import extraction
+
+
+class Command(BaseCommand):
+    help = "Извлекает текст из файлов паспортов для поиска"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Разобрать заново и уже обработанные файлы",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Сколько процессов разбирают файлы",
+        )
+
+    def handle(self, *args, **options):
+        seen, passports = set(), []
+        for passport in extraction.pending_passports(force=options["force"]).iterator():
+            # Одинаковые файлы разбираются один раз
+            key = passport.sha256 or f"file:{passport.file.name}"
+            if key not in seen:
+                seen.add(key)
+                passports.append(passport)
+
+        workers = max(1, options["workers"])
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(passports), workers * 4):
+                batch = passports[start: start + workers * 4]
+                copies = [extraction.local_copy(passport.file) for passport in batch]
+                futures = [
+                    pool.submit(extraction.extract_text, path, passport.file.name)
+                    for passport, (path, _) in zip(batch, copies)
+                ]
+                # Запись в БД — из основного процесса
+                for passport, (path, temporary), future in zip(batch, copies, futures):
+                    try:
+                        text = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f"{passport.file.name}: {exc}")
+                        continue
+                    finally:
+                        if temporary:
+                            os.remove(path)
+                    extraction.store_text(passport, text)
+                    done += 1
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"{passport.file.name}: {len(text)} символов")
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано паспортов: {done}, с ошибками: {failed}")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog import fragments
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кэша карточек оборудования"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Обнулить счётчики после вывода",
+        )
+
+    def handle(self, *args, **options):
+        counters = fragments.stats()
+        total = counters["hits"] + counters["misses"]
+        ratio = counters["hits"] / total * 100 if total else 0.0
+        self.stdout.write(
+            f"Карточки: попаданий {counters['hits']}, промахов {counters['misses']}, "
+            f"доля попаданий {ratio:.1f}%"
+        )
+        if options["reset"]:
+            fragments.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
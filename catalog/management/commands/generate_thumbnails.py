@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from catalog import images
+from catalog.models import Equipment
+
+
+class Command(BaseCommand):
+    help = "Строит недостающие миниатюры фото оборудования"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Перестроить миниатюры для всех фото, включая готовые",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Сколько фото обрабатывать параллельно",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Equipment.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            queryset = queryset.filter(image_thumbnails=[])
+        pending = list(queryset.order_by("pk").values_list("pk", "image"))
+
+        done = failed = 0
+        # Потоки только режут картинки; запись в БД идёт из основного потока
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            results = pool.map(
+                lambda name: images.build_thumbnails(name, force=options["force"]),
+                [name for _, name in pending],
+            )
+            for (pk, name), widths in zip(pending, results):
+                if widths:
+                    images.store_thumbnails(pk, name, widths)
+                    done += 1
+                else:
+                    failed += 1
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{name}: {widths or 'ошибка'}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Миниатюры построены: {done}, с ошибками: {failed}")
+        )
@@ -0,0 +1,80 @@
+import csv
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import DEFAULT_BATCH_SIZE, EquipmentImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковый импорт оборудования из CSV/JSONL с upsert по инвентарному номеру. "
+        "Колонки: inventory_number, name, equipment_type, site, workshop, description, attributes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу или '-' для stdin")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Формат файла (по умолчанию — по расширению)",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--rejects",
+            help="Записать отклонённые строки в CSV-файл (строка, номер, причина)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Проверить файл без записи в базу",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        if path != "-" and not Path(path).exists():
+            raise CommandError(f"Файл не найден: {path}")
+
+        importer = EquipmentImporter(
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            progress=self.report if options["verbosity"] > 1 else None,
+        )
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+        rejects_file = (
+            open(options["rejects"], "w", encoding="utf-8", newline="")
+            if options["rejects"]
+            else None
+        )
+        rejects_writer = csv.writer(rejects_file) if rejects_file else None
+        if rejects_writer:
+            rejects_writer.writerow(["line", "inventory_number", "reason"])
+        reported = 0
+        try:
+            for rejection in importer.run(read_rows(stream, fmt)):
+                if rejects_writer:
+                    rejects_writer.writerow(
+                        [rejection.line, rejection.inventory_number, rejection.reason]
+                    )
+                elif reported < 20:
+                    self.stderr.write(
+                        f"Строка {rejection.line} ({rejection.inventory_number}): "
+                        f"{rejection.reason}"
+                    )
+                    reported += 1
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects_file:
+                rejects_file.close()
+        self.report(importer.stats, final=True)
+
+    def report(self, stats, final: bool = False) -> None:
+        line = (
+            f"Обработано: {stats.processed}, создано: {stats.created}, "
+            f"обновлено: {stats.updated}, без изменений: {stats.unchanged}, "
+            f"отклонено: {stats.rejected}; {stats.rate:.0f} строк/с за {stats.elapsed:.1f} с"
+        )
+        self.stdout.write(self.style.SUCCESS(line) if final else line)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import uploads
+from catalog.models import PassportUpload
+
+
+class Command(BaseCommand):
+    help = "Удаляет брошенные загрузки паспортов вместе с временными файлами"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="Сколько часов без новых частей считать загрузку брошенной",
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(hours=options["hours"])
+        stale = list(
+            PassportUpload.objects.filter(updated_at__lt=threshold).values_list("pk", flat=True)
+        )
+        PassportUpload.objects.filter(pk__in=stale).delete()
+        for upload_id in stale:
+            uploads.discard(upload_id)
+        self.stdout.write(self.style.SUCCESS(f"Удалено загрузок: {len(stale)}"))
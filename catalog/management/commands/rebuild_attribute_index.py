@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from catalog import attributes, versions
+
+
+class Command(BaseCommand):
+    help = "Заполняет индекс характеристик оборудования из Equipment.attributes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=attributes.DEFAULT_BATCH_SIZE,
+            help="Сколько записей обрабатывать за один проход",
+        )
+
+    def handle(self, *args, **options):
+        def progress(total: int) -> None:
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Обработано: {total}")
+
+        total = attributes.rebuild_attributes(
+            batch_size=options["batch_size"], progress=progress
+        )
+        versions.bump_version(versions.CATALOG)
+        self.stdout.write(self.style.SUCCESS(f"Индекс характеристик заполнен, записей: {total}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog import search, versions
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс оборудования с нуля"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=search.DEFAULT_BATCH_SIZE,
+            help="Сколько записей индексировать за один проход",
+        )
+
+    def handle(self, *args, **options):
+        def progress(total: int) -> None:
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Проиндексировано: {total}")
+
+        total = search.rebuild_index(batch_size=options["batch_size"], progress=progress)
+        versions.bump_version(versions.CATALOG)
+        self.stdout.write(self.style.SUCCESS(f"Индекс перестроен, записей: {total}"))
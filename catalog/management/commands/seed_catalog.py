@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.seeding import USER_PREFIX, CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует синтетический каталог для замеров: площадки, цеха, дерево типов, "
+        "оборудование с характеристиками, паспорта и корзины"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sites", type=int, default=5)
+        parser.add_argument("--workshops", type=int, default=4, help="Цехов на площадку")
+        parser.add_argument("--type-depth", type=int, default=3, help="Глубина дерева типов")
+        parser.add_argument("--type-branching", type=int, default=3, help="Подтипов у типа")
+        parser.add_argument("--equipment", type=int, default=10_000)
+        parser.add_argument(
+            "--passport-ratio", type=float, default=0.3, help="Доля оборудования с паспортом"
+        )
+        parser.add_argument("--users", type=int, default=20, help="Покупателей с корзинами")
+        parser.add_argument("--cart-items", type=int, default=10, help="Позиций в корзине")
+        parser.add_argument(
+            "--password", default="", help="Пароль покупателей (по умолчанию — случайный)"
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42, help="Зерно генератора")
+        parser.add_argument(
+            "--no-index",
+            action="store_true",
+            help="Не заполнять поисковый индекс (потом: rebuild_search_index)",
+        )
+
+    def handle(self, *args, **options):
+        if options["type_branching"] > 12:
+            raise CommandError("Не больше 12 подтипов у типа")
+        seeder = CatalogSeeder(
+            sites=options["sites"],
+            workshops_per_site=options["workshops"],
+            type_depth=options["type_depth"],
+            type_branching=options["type_branching"],
+            equipment=options["equipment"],
+            passport_ratio=options["passport_ratio"],
+            users=options["users"],
+            cart_items=options["cart_items"],
+            batch_size=options["batch_size"],
+            index=not options["no_index"],
+            seed=options["seed"],
+            password=options["password"],
+            progress=self.report if options["verbosity"] > 1 else None,
+        )
+        stats = seeder.run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Площадок: {stats.sites}, цехов: {stats.workshops}, типов: {stats.types}, "
+            f"оборудования: {stats.equipment}, паспортов: {stats.passports}, "
+            f"покупателей: {stats.users}, позиций корзин: {stats.cart_items}; "
+            f"{stats.elapsed:.1f} с"
+        ))
+        if stats.users:
+            self.stdout.write(f"Пароль покупателей {USER_PREFIX}N: {seeder.password}")
+
+    def report(self, stats) -> None:
+        rate = stats.equipment / stats.elapsed if stats.elapsed else 0.0
+        self.stdout.write(f"Оборудование: {stats.equipment} ({rate:.0f} строк/с)")
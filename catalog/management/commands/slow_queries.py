@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import slow_queries
+
+
+class Command(BaseCommand):
+    help = "Выводит самые дорогие формы SQL и их планы из сводки медленных запросов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--order",
+            default="total_ms",
+            help=f"Сортировка: {', '.join(slow_queries.ORDERINGS)}",
+        )
+        parser.add_argument("--plans", action="store_true", help="Печатать EXPLAIN")
+        parser.add_argument("--json", action="store_true", help="Вывести JSON")
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Очистить сводку после вывода",
+        )
+
+    def handle(self, *args, **options):
+        # Своё, накопленное этим процессом, тоже попадает в сводку
+        slow_queries.collector.flush(force=True)
+        try:
+            rows = slow_queries.report(options["order"], options["limit"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+        else:
+            self.write_table(rows, options["plans"])
+
+        if options["reset"]:
+            slow_queries.collector.reset()
+            self.stdout.write(self.style.SUCCESS("Сводка очищена"))
+
+    def write_table(self, rows, plans: bool) -> None:
+        if not rows:
+            self.stdout.write("Сводка пуста (включена ли CATALOG_SLOW_QUERY_LOG?)")
+        for row in rows:
+            self.stdout.write(
+                f"{row['total_ms']:10.1f} мс  {row['count']:7d} ×  "
+                f"ср. {row['mean_ms']:7.2f}  макс. {row['max_ms']:8.1f}  {row['fingerprint']}"
+            )
+            if plans and row.get("plan"):
+                for line in row["plan"].splitlines():
+                    self.stdout.write(f"{'':14}{line}")
@@ -0,0 +1,152 @@
+"""Замер запроса: SQL, фазы обработки, заголовок ``Server-Timing``; профиль по флагу.
+
+Включается настройкой ``CATALOG_INSTRUMENTATION``. Для каждого запроса
+считаются число SQL-запросов и время в БД, время вьюхи и время рендеринга
+(шаблон — ``render``, ответ DRF — ``serialize``). Итог пишется одной строкой в
+лог ``catalog.middleware`` для каждого запроса; повторы одной формы SQL (N+1)
+логируются с уровнем WARNING. Заголовок ``Server-Timing`` (виден во вкладке
+Network браузера) получают только сотрудники и любой запрос при ``DEBUG``:
+время в БД и число запросов раскрывают устройство сервиса.
+
+``RequestProfilerMiddleware`` снимает профиль запроса сотрудника по флагу
+(см. ``catalog.profiling``).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import reverse
+from rest_framework.response import Response
+
+from . import profiling
+from .instrumentation import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTiming:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.recorder = QueryRecorder(phase="request")
+        self.view_started: float | None = None
+        self.view_finished: float | None = None
+        self.render_finished: float | None = None
+        self.render_phase = "render"
+
+    def enter_view(self) -> None:
+        self.view_started = time.perf_counter()
+        self.recorder.phase = "view"
+
+    def enter_render(self, phase: str) -> None:
+        self.view_finished = time.perf_counter()
+        self.render_phase = self.recorder.phase = phase
+
+    def leave_render(self) -> None:
+        self.render_finished = time.perf_counter()
+        self.recorder.phase = "response"
+
+    def metrics(self) -> dict[str, float]:
+        """Длительности фаз в миллисекундах."""
+        finished = time.perf_counter()
+        result = {"total": finished - self.started, "db": self.recorder.duration}
+        if self.view_started is not None:
+            result["view"] = (self.view_finished or finished) - self.view_started
+        if self.view_finished is not None:
+            result[self.render_phase] = (self.render_finished or finished) - self.view_finished
+        return {name: round(value * 1000, 2) for name, value in result.items()}
+
+
+class RequestTimingMiddleware:
+    """Ставится первым в ``MIDDLEWARE``, чтобы ``total`` охватывал всю обработку."""
+
+    def __init__(self, get_response) -> None:
+        if not getattr(settings, "CATALOG_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request._catalog_timing = RequestTiming()
+        with timing.recorder.installed():
+            response = self.get_response(request)
+        metrics = timing.metrics()
+        if self.exposes_timing(request):
+            self.add_header(response, timing, metrics)
+        self.log(request, response, timing, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._catalog_timing.enter_view()
+
+    def process_template_response(self, request, response):
+        timing = request._catalog_timing
+        timing.enter_render("serialize" if isinstance(response, Response) else "render")
+        response.add_post_render_callback(lambda rendered: timing.leave_render())
+        return response
+
+    def exposes_timing(self, request) -> bool:
+        if settings.DEBUG:
+            return True
+        user = getattr(request, "user", None)
+        return bool(user is not None and user.is_staff)
+
+    def add_header(self, response, timing: RequestTiming, metrics: dict[str, float]) -> None:
+        entries = []
+        for name, value in metrics.items():
+            entry = f"{name};dur={value}"
+            if name == "db":
+                entry += f';desc="{timing.recorder.count} queries"'
+            entries.append(entry)
+        existing = response.get("Server-Timing")
+        response["Server-Timing"] = ", ".join(([existing] if existing else []) + entries)
+
+    def log(self, request, response, timing: RequestTiming, metrics: dict[str, float]) -> None:
+        recorder = timing.recorder
+        repeated = recorder.repeated()
+        data = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": recorder.count,
+            **{f"{name}_ms": value for name, value in metrics.items()},
+            "phase_queries": dict(recorder.phases),
+            "nplusone": [{"count": count, "sql": shape} for shape, count in repeated],
+        }
+        message = " ".join(
+            f"{key}={value}" for key, value in data.items()
+            if key not in ("phase_queries", "nplusone")
+        )
+        if repeated:
+            shape, count = repeated[0]
+            logger.warning("%s nplusone=%d: %d × %s", message, len(repeated), count, shape,
+                           extra={"timing": data})
+        else:
+            logger.info(message, extra={"timing": data})
+
+
+class RequestProfilerMiddleware:
+    """Ставится после ``AuthenticationMiddleware``: флаг действует только для сотрудников.
+
+    Сотрудник, вошедший через Basic-аутентификацию API, распознаётся классами
+    аутентификации DRF (``profiling.api_user``).
+    """
+
+    def __init__(self, get_response) -> None:
+        if not getattr(settings, "CATALOG_PROFILER_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = profiling.requested(request)
+        if user is None:
+            return self.get_response(request)
+        response, profile = profiling.profile_request(request, self.get_response, user)
+        if profile is not None:
+            response["X-Profile-Id"] = str(profile.pk)
+            response["X-Profile-URL"] = reverse(
+                "admin:catalog_requestprofile_change", args=[profile.pk]
+            )
+        return response
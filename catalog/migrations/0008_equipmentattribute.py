@@ -0,0 +1,77 @@
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def normalize_value(value):
+    if isinstance(value, bool):
+        return ("true" if value else "false"), None
+    if isinstance(value, (int, float)):
+        number = float(value)
+        text = str(int(number)) if number.is_integer() else str(number)
+        return text, number
+    if isinstance(value, str):
+        return value, None
+    return json.dumps(value, ensure_ascii=False, sort_keys=True), None
+
+
+def backfill_attributes(apps, schema_editor):
+    # Логика индекса на момент этой миграции: код catalog.attributes с тех пор менялся
+    Equipment = apps.get_model("catalog", "Equipment")
+    EquipmentAttribute = apps.get_model("catalog", "EquipmentAttribute")
+    rows = []
+    for item in Equipment.objects.order_by("pk").only("pk", "attributes").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        if not isinstance(item.attributes, dict):
+            continue
+        for key, value in item.attributes.items():
+            if value is None:
+                continue
+            value_text, value_number = normalize_value(value)
+            rows.append(EquipmentAttribute(
+                equipment_id=item.pk, key=str(key),
+                value_text=value_text, value_number=value_number,
+            ))
+        if len(rows) >= BATCH_SIZE:
+            EquipmentAttribute.objects.bulk_create(rows)
+            rows = []
+    EquipmentAttribute.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0007_equipment_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EquipmentAttribute",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=255)),
+                ("value_text", models.TextField(blank=True)),
+                ("value_number", models.FloatField(blank=True, null=True)),
+                (
+                    "equipment",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="attribute_values",
+                        to="catalog.equipment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Характеристика оборудования",
+                "verbose_name_plural": "Характеристики оборудования",
+                "unique_together": {("equipment", "key")},
+                "indexes": [
+                    models.Index(fields=["key", "value_text"], name="catalog_attr_key_text_idx"),
+                    models.Index(fields=["key", "value_number"], name="catalog_attr_key_number_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_attributes, migrations.RunPython.noop),
+    ]
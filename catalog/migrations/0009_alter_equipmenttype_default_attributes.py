@@ -0,0 +1,56 @@
+import re
+
+from django.db import migrations, models
+
+NUMBER_RE = re.compile(r"^\s*([-+]?\d+(?:[.,]\d+)?)")
+
+
+def number_keys(default_attributes):
+    if not isinstance(default_attributes, list):
+        return set()
+    return {
+        str(entry["name"]) for entry in default_attributes
+        if isinstance(entry, dict) and entry.get("name") and entry.get("type") == "number"
+    }
+
+
+def backfill_numbers(apps, schema_editor):
+    # Значения числовых характеристик вида "55 кВт" или "75,0" получают value_number
+    EquipmentType = apps.get_model("catalog", "EquipmentType")
+    EquipmentAttribute = apps.get_model("catalog", "EquipmentAttribute")
+    for type_id, default_attributes in EquipmentType.objects.values_list(
+        "pk", "default_attributes"
+    ):
+        keys = number_keys(default_attributes)
+        if not keys:
+            continue
+        rows = EquipmentAttribute.objects.filter(
+            equipment__equipment_type_id=type_id, key__in=keys, value_number__isnull=True
+        )
+        for row in rows.iterator(chunk_size=1000):
+            match = NUMBER_RE.match(row.value_text)
+            if match:
+                row.value_number = float(match.group(1).replace(",", "."))
+                row.save(update_fields=["value_number"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0008_equipmentattribute"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="equipmenttype",
+            name="default_attributes",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text=(
+                    "Список рекомендуемых характеристик для этого типа: имена или "
+                    '{"name": ..., "type": "string|number|enum", "unit": ..., "choices": [...]}'
+                ),
+            ),
+        ),
+        migrations.RunPython(backfill_numbers, migrations.RunPython.noop),
+    ]
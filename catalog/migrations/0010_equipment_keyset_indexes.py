@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0009_alter_equipmenttype_default_attributes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(fields=["name", "id"], name="catalog_eq_name_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="equipment",
+            index=models.Index(fields=["updated_at", "id"], name="catalog_eq_updated_id_idx"),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    # Копия catalog.tree.rebuild_closure на момент миграции
+    EquipmentType = apps.get_model("catalog", "EquipmentType")
+    EquipmentTypeClosure = apps.get_model("catalog", "EquipmentTypeClosure")
+    parents = dict(EquipmentType.objects.values_list("pk", "parent_id"))
+    rows = []
+    for node_id in parents:
+        ancestor_id, depth, seen = node_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(
+                EquipmentTypeClosure(ancestor_id=ancestor_id, descendant_id=node_id, depth=depth)
+            )
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    EquipmentTypeClosure.objects.all().delete()
+    EquipmentTypeClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0010_equipment_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EquipmentTypeClosure",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="descendant_links",
+                        to="catalog.equipmenttype",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="ancestor_links",
+                        to="catalog.equipmenttype",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Связь в дереве типов",
+                "verbose_name_plural": "Дерево типов",
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def content_hash(**fields):
+    # Копия catalog.models.content_hash на момент миграции
+    raw = json.dumps(fields, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def fill_content_hash(apps, schema_editor):
+    Equipment = apps.get_model("catalog", "Equipment")
+    batch = []
+    for item in Equipment.objects.order_by("pk").iterator(chunk_size=1000):
+        item.content_hash = content_hash(
+            name=item.name,
+            equipment_type_id=item.equipment_type_id,
+            site_id=item.site_id,
+            workshop_id=item.workshop_id,
+            description=item.description,
+            attributes=item.attributes,
+        )
+        batch.append(item)
+        if len(batch) >= 1000:
+            Equipment.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    if batch:
+        Equipment.objects.bulk_update(batch, ["content_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0011_equipmenttypeclosure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipment",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Хэш содержимого для пропуска неизменённых строк при импорте",
+                max_length=64,
+            ),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
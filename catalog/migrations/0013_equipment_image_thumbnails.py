@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_equipment_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="equipment",
+            name="image_thumbnails",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                help_text="Ширины готовых миниатюр изображения",
+            ),
+        ),
+    ]
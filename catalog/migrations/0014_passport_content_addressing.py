@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0013_equipment_image_thumbnails"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="passport",
+            name="sha256",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="passport",
+            name="size",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="PassportUpload",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("filename", models.CharField(max_length=255)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                ("size", models.BigIntegerField()),
+                ("received", models.BigIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "equipment",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="passport_uploads",
+                        to="catalog.equipment",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="passport_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Загрузка паспорта",
+                "verbose_name_plural": "Загрузки паспортов",
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+import re
+
+from django.db import migrations, models
+
+from ._stemming import stem
+
+# Схема индекса на момент этой миграции; живой catalog.search не импортируется
+SEARCH_TABLE = "catalog_equipment_search"
+BATCH_SIZE = 1000
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def stem_text(text):
+    return " ".join(stem(token) for token in tokenize(text))
+
+
+def create_table(cursor, vendor):
+    if vendor == "sqlite":
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, inventory_number, type_name, description, passports, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == "postgresql":
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "equipment_id bigint PRIMARY KEY "
+            "REFERENCES catalog_equipment (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+
+
+def index_rows(cursor, vendor, rows):
+    # Тексты паспортов извлекаются после миграции (extract_passport_texts),
+    # таблица PassportText пока пуста — столбец passports заполнит переиндексация
+    if vendor == "sqlite":
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} "
+            "(rowid, name, inventory_number, type_name, description, passports) "
+            "VALUES (%s, %s, %s, %s, %s, '')",
+            [
+                (pk, stem_text(name), " ".join(tokenize(inv)), stem_text(type_name),
+                 stem_text(description))
+                for pk, name, inv, type_name, description in rows
+            ],
+        )
+    elif vendor == "postgresql":
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (equipment_id, document) VALUES (%s, "
+            "setweight(to_tsvector('russian', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('russian', %s), 'B') || "
+            "setweight(to_tsvector('russian', %s), 'C')) "
+            "ON CONFLICT (equipment_id) DO UPDATE SET document = EXCLUDED.document",
+            [
+                (pk, name or "", inv or "", type_name or "", description or "")
+                for pk, name, inv, type_name, description in rows
+            ],
+        )
+
+
+def rebuild_search_index(apps, schema_editor):
+    # В документ индекса добавился столбец passports: таблица создаётся заново
+    Equipment = apps.get_model("catalog", "Equipment")
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        return
+    rows = Equipment.objects.order_by("pk").values_list(
+        "pk", "name", "inventory_number", "equipment_type__name", "description"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        create_table(cursor, vendor)
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                index_rows(cursor, vendor, batch)
+                batch = []
+        if batch:
+            index_rows(cursor, vendor, batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0014_passport_content_addressing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PassportText",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("content", models.BinaryField()),
+                ("length", models.PositiveIntegerField(default=0)),
+                ("extracted_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Текст паспорта",
+                "verbose_name_plural": "Тексты паспортов",
+            },
+        ),
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# В items позиция записана строкой "Название (инв. номер)"
+LEGACY_ITEM_RE = re.compile(r"^(?P<name>.*\S)\s*\((?P<inventory_number>[^()]+)\)$", re.S)
+
+
+def split_legacy_item(text):
+    match = LEGACY_ITEM_RE.match(text.strip())
+    if match is None:
+        return text.strip(), ""
+    return match.group("name"), match.group("inventory_number").strip()
+
+
+def backfill_order_lines(apps, schema_editor):
+    OrderRequest = apps.get_model("catalog", "OrderRequest")
+    OrderLine = apps.get_model("catalog", "OrderLine")
+    Equipment = apps.get_model("catalog", "Equipment")
+    known = set(Equipment.objects.values_list("pk", flat=True))
+    batch = []
+    for order in OrderRequest.objects.order_by("pk").iterator(chunk_size=1000):
+        for item in order.items or []:
+            equipment_id = item.get("equipment_id")
+            name, inventory_number = split_legacy_item(str(item.get("equipment", "")))
+            batch.append(
+                OrderLine(
+                    order_id=order.pk,
+                    equipment_id=equipment_id if equipment_id in known else None,
+                    name=name[:255],
+                    inventory_number=inventory_number[:100],
+                    quantity=item.get("quantity") or 1,
+                )
+            )
+        if len(batch) >= 1000:
+            OrderLine.objects.bulk_create(batch)
+            batch = []
+    OrderLine.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0015_passporttext"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderrequest",
+            name="idempotency_key",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name="orderrequest",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("idempotency_key", ""), _negated=True),
+                fields=("user", "idempotency_key"),
+                name="catalog_order_idempotency_uniq",
+            ),
+        ),
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255)),
+                ("inventory_number", models.CharField(max_length=100)),
+                ("quantity", models.PositiveIntegerField(default=1)),
+                (
+                    "equipment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=models.SET_NULL,
+                        related_name="order_lines",
+                        to="catalog.equipment",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=models.CASCADE,
+                        related_name="lines",
+                        to="catalog.orderrequest",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция заявки",
+                "verbose_name_plural": "Позиции заявок",
+                "ordering": ["pk"],
+                "indexes": [
+                    models.Index(fields=["equipment", "order"], name="catalog_orderline_eq_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_order_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,141 @@
+import logging
+import re
+import zlib
+
+from django.db import DatabaseError, migrations, transaction
+
+from ._stemming import stem
+
+logger = logging.getLogger(__name__)
+
+# Схема индекса на момент этой миграции; живой catalog.search не импортируется
+SEARCH_TABLE = "catalog_equipment_search"
+TRIGRAM_INDEX = "catalog_equipment_name_trgm"
+BATCH_SIZE = 1000
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def stem_text(text):
+    return " ".join(stem(token) for token in tokenize(text))
+
+
+def create_table(cursor, vendor):
+    if vendor == "sqlite":
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, inventory_number, type_name, description, passports, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+    elif vendor == "postgresql":
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "equipment_id bigint PRIMARY KEY "
+            "REFERENCES catalog_equipment (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+        # CREATE EXTENSION требует прав; без них подсказки работают без опечаток
+        try:
+            with transaction.atomic(using=cursor.db.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+                    "ON catalog_equipment USING GIN (name gin_trgm_ops)"
+                )
+        except DatabaseError:
+            logger.warning("pg_trgm недоступно, подсказки без поиска по сходству")
+
+
+def passport_terms(apps, ids):
+    """Слова из текстов паспортов по id оборудования, без повторов."""
+    pairs = list(
+        apps.get_model("catalog", "Passport").objects
+        .filter(equipment_id__in=ids).exclude(sha256="")
+        .values_list("equipment_id", "sha256")
+    )
+    if not pairs:
+        return {}
+    texts = dict(
+        apps.get_model("catalog", "PassportText").objects
+        .filter(sha256__in={digest for _, digest in pairs})
+        .values_list("sha256", "content")
+    )
+    terms = {}
+    for equipment_id, digest in pairs:
+        if texts.get(digest):
+            text = zlib.decompress(bytes(texts[digest])).decode("utf-8")
+            terms.setdefault(equipment_id, {}).update(dict.fromkeys(tokenize(text)))
+    return {equipment_id: " ".join(words) for equipment_id, words in terms.items()}
+
+
+def index_rows(cursor, vendor, rows):
+    if vendor == "sqlite":
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} "
+            "(rowid, name, inventory_number, type_name, description, passports) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (pk, stem_text(name), " ".join(tokenize(inv)), stem_text(type_name),
+                 stem_text(description), stem_text(passports))
+                for pk, name, inv, type_name, description, passports in rows
+            ],
+        )
+    elif vendor == "postgresql":
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (equipment_id, document) VALUES (%s, "
+            "setweight(to_tsvector('russian', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('russian', %s), 'B') || "
+            "setweight(to_tsvector('russian', %s), 'C') || "
+            "setweight(to_tsvector('russian', %s), 'D')) "
+            "ON CONFLICT (equipment_id) DO UPDATE SET document = EXCLUDED.document",
+            [
+                (pk, name or "", inv or "", type_name or "", description or "", passports)
+                for pk, name, inv, type_name, description, passports in rows
+            ],
+        )
+
+
+def rebuild_search_index(apps, schema_editor):
+    # FTS5 получает префиксные индексы, PostgreSQL — триграммный индекс названий:
+    # таблица индекса создаётся заново
+    Equipment = apps.get_model("catalog", "Equipment")
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        return
+    rows = Equipment.objects.order_by("pk").values_list(
+        "pk", "name", "inventory_number", "equipment_type__name", "description"
+    )
+
+    def flush(cursor, batch):
+        terms = passport_terms(apps, [row[0] for row in batch])
+        index_rows(cursor, vendor, [(*row, terms.get(row[0], "")) for row in batch])
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        create_table(cursor, vendor)
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                flush(cursor, batch)
+                batch = []
+        if batch:
+            flush(cursor, batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0016_orderline"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
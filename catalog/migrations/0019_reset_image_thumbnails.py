@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reset_thumbnails(apps, schema_editor):
+    # Имена миниатюр теперь включают расширение оригинала: прежние файлы не
+    # найдутся, шаблоны показывают исходное фото до generate_thumbnails
+    Equipment = apps.get_model("catalog", "Equipment")
+    Equipment.objects.exclude(image_thumbnails=[]).update(image_thumbnails=[])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0018_requestprofile"),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_thumbnails, migrations.RunPython.noop),
+    ]
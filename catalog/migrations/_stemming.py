@@ -0,0 +1,101 @@
+"""Копия ``catalog.stemming`` для миграций поискового индекса (0007, 0015, 0017).
+
+Миграции не импортируют живые модули приложения: этот файл не меняется вместе
+с ``catalog.stemming``. Если стеммер поменяется, индекс перестраивается
+командой ``rebuild_search_index``. Имя с подчёркиванием — загрузчик миграций
+такие модули пропускает.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND = re.compile(r"((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$")
+_REFLEXIVE = re.compile(r"(с[яь])$")
+_ADJECTIVE = re.compile(
+    r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$"
+)
+_PARTICIPLE = re.compile(r"((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))$")
+_VERB = re.compile(
+    r"((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)"
+    r"|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют"
+    r"|ит|ыт|ены|ить|ыть|ишь|ую|ю))$"
+)
+_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях"
+    r"|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_DERIVATIONAL = re.compile(r"(ость|ост)$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+_CYRILLIC = re.compile(r"^[а-я]+$")
+
+
+def _regions(word: str) -> tuple[int, int]:
+    """Вернуть начало областей RV и R2 (индексы в слове)."""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(pattern: re.Pattern, word: str) -> tuple[str, bool]:
+    match = pattern.search(word)
+    if not match:
+        return word, False
+    return word[: match.start()], True
+
+
+@lru_cache(maxsize=50_000)
+def stem(word: str) -> str:
+    """Вернуть основу слова; не кириллические токены возвращаются как есть."""
+    word = word.lower().replace("ё", "е")
+    if not _CYRILLIC.match(word):
+        return word
+    rv_start, r2_start = _regions(word)
+    head, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    rv, found = _strip(_PERFECTIVE_GERUND, rv)
+    if not found:
+        rv, _ = _strip(_REFLEXIVE, rv)
+        rv, found = _strip(_ADJECTIVE, rv)
+        if found:
+            rv, _ = _strip(_PARTICIPLE, rv)
+        else:
+            rv, found = _strip(_VERB, rv)
+            if not found:
+                rv, _ = _strip(_NOUN, rv)
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс только в R2
+    r2_offset = max(r2_start - rv_start, 0)
+    match = _DERIVATIONAL.search(rv)
+    if match and match.start() >= r2_offset:
+        rv = rv[: match.start()]
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        rv, found = _strip(_SUPERLATIVE, rv)
+        if found and rv.endswith("нн"):
+            rv = rv[:-1]
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return head + rv
@@ -1,8 +1,21 @@
+import hashlib
+import json
+from typing import Any
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from . import reference
+from .attributes import parse_schema, safe_schema, validate_attributes
+
+
+def content_hash(**fields: Any) -> str:
+    """SHA-256 от канонического JSON полей оборудования."""
+    raw = json.dumps(fields, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
 
 class Site(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -47,7 +60,10 @@ class EquipmentType(models.Model):
     default_attributes = models.JSONField(
         default=list,
         blank=True,
-        help_text=_("Список рекомендуемых характеристик для этого типа"),
+        help_text=_(
+            "Список рекомендуемых характеристик для этого типа: имена или "
+            '{"name": ..., "type": "string|number|enum", "unit": ..., "choices": [...]}'
+        ),
     )
 
     class Meta:
@@ -58,6 +74,45 @@ class EquipmentType(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def attribute_schema(self) -> dict[str, dict[str, Any]]:
+        return safe_schema(self.default_attributes)
+
+    def clean(self) -> None:
+        try:
+            parse_schema(self.default_attributes)
+        except ValidationError as exc:
+            raise ValidationError({"default_attributes": exc.messages})
+        if self.pk and self.parent_id and (
+            self.parent_id == self.pk
+            or EquipmentTypeClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id
+            ).exists()
+        ):
+            raise ValidationError(
+                {"parent": _("Нельзя сделать тип потомком самого себя")}
+            )
+
+
+class EquipmentTypeClosure(models.Model):
+    """Замыкание дерева типов: пара (предок, потомок) на каждый путь, включая (x, x)."""
+
+    ancestor = models.ForeignKey(
+        EquipmentType, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        EquipmentType, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        verbose_name = _("Связь в дереве типов")
+        verbose_name_plural = _("Дерево типов")
+
+    def __str__(self) -> str:
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
 
 class Equipment(models.Model):
     name = models.CharField(max_length=255)
@@ -73,6 +128,12 @@ class Equipment(models.Model):
     )
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="equipment/", null=True, blank=True)
+    image_thumbnails = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        help_text=_("Ширины готовых миниатюр изображения"),
+    )
     attributes = models.JSONField(default=dict, blank=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -83,22 +144,79 @@ class Equipment(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text=_("Хэш содержимого для пропуска неизменённых строк при импорте"),
+    )
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            # Ключи курсорной пагинации: поле сортировки + id
+            models.Index(fields=["name", "id"], name="catalog_eq_name_id_idx"),
+            models.Index(fields=["updated_at", "id"], name="catalog_eq_updated_id_idx"),
+        ]
         verbose_name = _("Оборудование")
         verbose_name_plural = _("Оборудование")
 
     def __str__(self) -> str:
         return f"{self.name} ({self.inventory_number})"
 
+    def save(self, *args, **kwargs) -> None:
+        self.content_hash = self.compute_content_hash()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content_hash" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "content_hash"]
+        super().save(*args, **kwargs)
+
+    def compute_content_hash(self) -> str:
+        return content_hash(
+            name=self.name,
+            equipment_type_id=self.equipment_type_id,
+            site_id=self.site_id,
+            workshop_id=self.workshop_id,
+            description=self.description,
+            attributes=self.attributes,
+        )
+
     def clean(self) -> None:
-        if self.workshop and self.site and self.workshop.site_id != self.site_id:
-            raise ValidationError(
-                {"workshop": _("Цех должен принадлежать выбранной площадке")}
-            )
+        # Цех и схема типа берутся из снимка справочников; БД — только при промахе
+        if self.workshop_id and self.site_id:
+            workshop = reference.get("workshops", self.workshop_id) or self.workshop
+            if workshop.site_id != self.site_id:
+                raise ValidationError(
+                    {"workshop": _("Цех должен принадлежать выбранной площадке")}
+                )
         if self.attributes is not None and not isinstance(self.attributes, dict):
             raise ValidationError({"attributes": _("Характеристики должны быть словарём")})
+        if self.attributes and self.equipment_type_id:
+            eq_type = reference.get("types", self.equipment_type_id) or self.equipment_type
+            validate_attributes(self.attributes, eq_type.attribute_schema)
+
+
+class EquipmentAttribute(models.Model):
+    """Нормализованная копия ``Equipment.attributes`` для индексируемой фильтрации."""
+
+    equipment = models.ForeignKey(
+        Equipment, on_delete=models.CASCADE, related_name="attribute_values"
+    )
+    key = models.CharField(max_length=255)
+    value_text = models.TextField(blank=True)
+    value_number = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("equipment", "key")
+        indexes = [
+            models.Index(fields=["key", "value_text"], name="catalog_attr_key_text_idx"),
+            models.Index(fields=["key", "value_number"], name="catalog_attr_key_number_idx"),
+        ]
+        verbose_name = _("Характеристика оборудования")
+        verbose_name_plural = _("Характеристики оборудования")
+
+    def __str__(self) -> str:
+        return f"{self.key}={self.value_text}"
 
 
 class Passport(models.Model):
@@ -107,6 +225,8 @@ class Passport(models.Model):
     )
     description = models.CharField(max_length=255, blank=True)
     file = models.FileField(upload_to="passports/")
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    size = models.BigIntegerField(null=True, blank=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -117,6 +237,63 @@ class Passport(models.Model):
     def __str__(self) -> str:
         return self.description or f"Паспорт {self.pk}"
 
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        # Новый файл кладём по адресу содержимого: одинаковые файлы хранятся один раз
+        if self.file and not self.file._committed:
+            from .uploads import hash_stream, store_content
+
+            self.file.open("rb")
+            self.sha256, self.size = hash_stream(self.file)
+            self.file.name = store_content(
+                self.file, self.file.name, self.sha256, self.file.storage
+            )
+            self.file._committed = True
+        super().save(*args, **kwargs)
+
+
+class PassportText(models.Model):
+    """Текст, извлечённый из файла паспорта (сжат zlib), по SHA-256 файла."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    content = models.BinaryField()
+    length = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Текст паспорта")
+        verbose_name_plural = _("Тексты паспортов")
+
+    def __str__(self) -> str:
+        return self.sha256
+
+
+class PassportUpload(models.Model):
+    """Незавершённая загрузка паспорта по частям."""
+
+    equipment = models.ForeignKey(
+        Equipment, on_delete=models.CASCADE, related_name="passport_uploads"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="passport_uploads"
+    )
+    filename = models.CharField(max_length=255)
+    description = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Загрузка паспорта")
+        verbose_name_plural = _("Загрузки паспортов")
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def is_complete(self) -> bool:
+        return self.received >= self.size
+
 
 class CartItem(models.Model):
     user = models.ForeignKey(
@@ -151,12 +328,75 @@ class OrderRequest(models.Model):
     phone = models.CharField(max_length=50, blank=True)
     comment = models.TextField(blank=True)
     items = models.JSONField(default=list, blank=True)
+    idempotency_key = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
         verbose_name = _("Заявка")
         verbose_name_plural = _("Заявки")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"],
+                condition=~models.Q(idempotency_key=""),
+                name="catalog_order_idempotency_uniq",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"Заявка #{self.pk} от {self.name}"
+
+
+class OrderLine(models.Model):
+    """Позиция заявки; снимок названия и номера на момент оформления."""
+
+    order = models.ForeignKey(OrderRequest, on_delete=models.CASCADE, related_name="lines")
+    equipment = models.ForeignKey(
+        Equipment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="order_lines",
+    )
+    name = models.CharField(max_length=255)
+    inventory_number = models.CharField(max_length=100)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ["pk"]
+        verbose_name = _("Позиция заявки")
+        verbose_name_plural = _("Позиции заявок")
+        indexes = [
+            models.Index(fields=["equipment", "order"], name="catalog_orderline_eq_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} x{self.quantity}"
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый по флагу сотрудника (``?_profile=1``)."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="request_profiles",
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    profiler = models.CharField(max_length=20)
+    file = models.FileField(upload_to="profiles/")
+    summary = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at", "-pk"]
+        verbose_name = _("Профиль запроса")
+        verbose_name_plural = _("Профили запросов")
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.path}"
@@ -0,0 +1,88 @@
+"""Оформление заявки из корзины.
+
+Всё происходит в одной транзакции: строки корзины блокируются
+(``SELECT ... FOR UPDATE``), заявка и её позиции (``OrderLine``,
+``bulk_create``) пишутся, корзина очищается. Ключ идемпотентности
+(скрытое поле формы или заголовок ``Idempotency-Key`` в API) защищает от
+двойной отправки: повтор с тем же ключом возвращает уже созданную заявку.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from django.db import IntegrityError, transaction
+
+from .cart import invalidate_cart_count
+from .models import CartItem, OrderLine, OrderRequest
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def _existing(user, idempotency_key: str) -> OrderRequest | None:
+    if not idempotency_key:
+        return None
+    return OrderRequest.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def place_order(user, order: OrderRequest | dict[str, Any],
+                idempotency_key: str = "") -> tuple[OrderRequest, bool]:
+    """Оформить корзину ``user``; вернуть (заявка, создана ли сейчас).
+
+    ``order`` — несохранённая заявка (из формы) или словарь её полей.
+    """
+    if isinstance(order, dict):
+        order = OrderRequest(**order)
+    idempotency_key = (idempotency_key or "")[:64]
+    try:
+        with transaction.atomic():
+            # Блокировка корзины: параллельный повтор ждёт здесь и потом видит
+            # либо пустую корзину, либо уже созданную заявку с тем же ключом
+            items = list(
+                CartItem.objects.select_for_update(of=("self",))
+                .filter(user=user)
+                .select_related("equipment", "equipment__equipment_type",
+                                "equipment__site", "equipment__workshop__site")
+                .order_by("-added_at")
+            )
+            existing = _existing(user, idempotency_key)
+            if existing is not None:
+                return existing, False
+            if not items:
+                raise EmptyCart
+
+            order.user = user
+            order.idempotency_key = idempotency_key
+            order.items = [
+                {
+                    "equipment_id": item.equipment_id,
+                    "equipment": f"{item.equipment.name} ({item.equipment.inventory_number})",
+                    "type": item.equipment.equipment_type.name,
+                    "site": item.equipment.site.name,
+                    "workshop": str(item.equipment.workshop),
+                    "quantity": item.quantity,
+                }
+                for item in items
+            ]
+            order.save()
+            OrderLine.objects.bulk_create(
+                OrderLine(
+                    order=order,
+                    equipment_id=item.equipment_id,
+                    name=item.equipment.name,
+                    inventory_number=item.equipment.inventory_number,
+                    quantity=item.quantity,
+                )
+                for item in items
+            )
+            CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+            transaction.on_commit(lambda: invalidate_cart_count(user.pk))
+    except IntegrityError:
+        # Гонка на уникальном ключе: заявку уже создал параллельный запрос
+        existing = _existing(user, idempotency_key)
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
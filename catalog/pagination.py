@@ -0,0 +1,272 @@
+"""Пагинация каталога без OFFSET и обязательного COUNT(*).
+
+Режим курсора (keyset) сортирует по одному из ``ordering_fields`` плюс ``id``
+для однозначности и продолжает выборку условием ``(поле, id) > (значение, id)``
+вместо OFFSET. В постраничном режиме подсчёт можно заказать точным
+(``count=exact``), оценочным (``count=estimate``) или отключить (``count=none``).
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from django.db import connections, models
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+def encode_cursor(ordering: str, obj: Any, reverse: bool = False) -> str:
+    field = ordering.lstrip("-")
+    value = getattr(obj, field)
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    payload = {"o": ordering, "v": value, "pk": obj.pk, "r": reverse}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, model) -> dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Курсор приходит от клиента: поле и значение проверяются до фильтра
+        if not isinstance(payload["o"], str) or not isinstance(payload["v"], (str, int, float)):
+            raise ValueError(cursor)
+        field = model._meta.get_field(payload["o"].lstrip("-"))
+        if isinstance(field, models.DateTimeField):
+            payload["v"] = parse_datetime(payload["v"])
+            if payload["v"] is None:
+                raise ValueError(cursor)
+        payload["pk"] = int(payload["pk"])
+        payload["r"] = bool(payload.get("r"))
+    except (AttributeError, TypeError, ValueError, KeyError, LookupError) as exc:
+        raise InvalidCursor(cursor) from exc
+    return payload
+
+
+def paginate_keyset(queryset: QuerySet, ordering: str, cursor: str | None,
+                    page_size: int) -> KeysetPage:
+    """Одна страница по курсору; ``ordering`` — имя поля, возможно с ``-``."""
+    field = ordering.lstrip("-")
+    position = decode_cursor(cursor, queryset.model) if cursor else None
+    if position and position["o"] != ordering:
+        raise InvalidCursor(cursor)
+    backwards = bool(position and position["r"])
+    descending = ordering.startswith("-") != backwards
+
+    if descending:
+        queryset = queryset.order_by(f"-{field}", "-pk")
+    else:
+        queryset = queryset.order_by(field, "pk")
+    if position:
+        value, pk = position["v"], position["pk"]
+        # Первое условие задаёт диапазон по индексу (field, id), второе отсекает равные
+        bound, strict, pk_strict = ("lte", "lt", "lt") if descending else ("gte", "gt", "gt")
+        queryset = queryset.filter(
+            Q(**{f"{field}__{bound}": value}),
+            Q(**{f"{field}__{strict}": value}) | Q(**{f"pk__{pk_strict}": pk}),
+        )
+
+    rows = list(queryset[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = position is not None, has_more
+    else:
+        has_next, has_previous = has_more, position is not None
+    return KeysetPage(
+        object_list=rows,
+        next_cursor=encode_cursor(ordering, rows[-1]) if has_next and rows else None,
+        previous_cursor=(
+            encode_cursor(ordering, rows[0], reverse=True) if has_previous and rows else None
+        ),
+    )
+
+
+def estimate_count(queryset: QuerySet, cap: int) -> tuple[int, bool]:
+    """Вернуть (количество, оценка ли это).
+
+    На PostgreSQL берётся оценка планировщика, на прочих СУБД — подсчёт,
+    ограниченный ``cap`` строками.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+    count = queryset[:cap].count()
+    return count, count >= cap
+
+
+class EquipmentPagination(BasePagination):
+    """Постраничная пагинация с настраиваемым подсчётом и режим курсора.
+
+    ``?pagination=cursor`` (или наличие ``cursor``) включает keyset-режим;
+    сортировка берётся из ``ordering``, если поле есть в ``ordering_fields``.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    page_query_param = "page"
+    cursor_query_param = "cursor"
+    mode_query_param = "pagination"
+    count_query_param = "count"
+    count_modes = ("exact", "estimate", "none")
+    default_ordering = "name"
+    estimate_cap = 10_000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        if self.is_cursor_mode(request):
+            return self.paginate_cursor(queryset, request, view)
+        return self.paginate_pages(queryset, request)
+
+    def is_cursor_mode(self, request) -> bool:
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == "cursor"
+        )
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, view) -> str:
+        param = api_settings.ORDERING_PARAM
+        ordering = (request.query_params.get(param) or "").split(",")[0].strip()
+        allowed = getattr(view, "ordering_fields", None) or []
+        if ordering and ordering.lstrip("-") in allowed:
+            return ordering
+        return self.default_ordering
+
+    def paginate_cursor(self, queryset, request, view):
+        self.mode = "cursor"
+        cursor = request.query_params.get(self.cursor_query_param) or None
+        try:
+            self.page = paginate_keyset(
+                queryset, self.get_ordering(request, view), cursor, self.page_size_value
+            )
+        except InvalidCursor:
+            raise NotFound("Неверный курсор.")
+        return self.page.object_list
+
+    def paginate_pages(self, queryset, request):
+        self.mode = "pages"
+        count_mode = request.query_params.get(self.count_query_param, "exact")
+        if count_mode not in self.count_modes:
+            count_mode = "exact"
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound("Неверная страница.")
+        if self.number < 1:
+            raise NotFound("Неверная страница.")
+
+        self.count, self.count_estimated = None, False
+        if count_mode == "exact":
+            self.count = queryset.count()
+        elif count_mode == "estimate":
+            self.count, self.count_estimated = estimate_count(queryset, self.estimate_cap)
+        self.count_mode = count_mode
+
+        offset = (self.number - 1) * self.page_size_value
+        rows = list(queryset[offset: offset + self.page_size_value + 1])
+        if self.number > 1 and not rows:
+            raise NotFound("Неверная страница.")
+        self.has_next = len(rows) > self.page_size_value
+        return rows[: self.page_size_value]
+
+    def get_next_link(self):
+        url = self.request.build_absolute_uri()
+        if self.mode == "cursor":
+            if not self.page.next_cursor:
+                return None
+            return replace_query_param(url, self.cursor_query_param, self.page.next_cursor)
+        if not self.has_next:
+            return None
+        return replace_query_param(url, self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        url = self.request.build_absolute_uri()
+        if self.mode == "cursor":
+            if not self.page.previous_cursor:
+                return None
+            return replace_query_param(url, self.cursor_query_param, self.page.previous_cursor)
+        if self.number <= 1:
+            return None
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.mode == "pages" and self.count_mode != "none":
+            payload["count"] = self.count
+            if self.count_mode == "estimate":
+                payload["count_estimated"] = self.count_estimated
+        payload["next"] = self.get_next_link()
+        payload["previous"] = self.get_previous_link()
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "nullable": True},
+                "count_estimated": {"type": "boolean"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class OrderLinePagination(EquipmentPagination):
+    """Позиции заявок по оборудованию: только постранично, в порядке вьюхи.
+
+    Курсор и ``ordering`` описаны полями ``Equipment``, к ``OrderLine`` они не
+    применимы, поэтому ``pagination=cursor`` здесь игнорируется.
+    """
+
+    def is_cursor_mode(self, request) -> bool:
+        return False
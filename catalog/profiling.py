@@ -0,0 +1,223 @@
+"""Профилирование отдельного запроса по просьбе сотрудника.
+
+Запрос с ``?_profile=1`` или заголовком ``X-Profile: 1`` от сотрудника
+(``is_staff``) выполняется под профилировщиком: ``pyinstrument``
+(сэмплирующий, HTML с деревом и flame-графом), если он установлен, иначе
+``cProfile`` (файл ``.prof`` для ``snakeviz``/``pstats``). Результат
+сохраняется в ``MEDIA_ROOT/profiles/`` и записью ``RequestProfile`` —
+её видно в админке со ссылкой на файл. Хранятся последние
+``CATALOG_PROFILE_RETENTION`` профилей, старые удаляются вместе с файлами.
+
+Запросы без флага проходят без профилировщика; права проверяются, только
+если флаг есть. Сотрудник определяется по сессии, а если её нет — теми же
+классами аутентификации DRF, что и API (Basic): ``RequestProfilerMiddleware``
+стоит раньше DRF, и иначе клиенты API профиль снять не смогли бы.
+
+У потокового ответа (``StreamingHttpResponse``, ``FileResponse``) тело
+формируется уже после возврата из вьюхи, поэтому профилировщик
+останавливается и профиль сохраняется, когда тело отдано или ответ закрыт;
+заголовков ``X-Profile-*`` у такого ответа нет — профиль ищется в админке.
+Асинхронный поток профилируется только до возврата из вьюхи.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import marshal
+import pstats
+import time
+import uuid
+from io import StringIO
+from typing import Callable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import HttpRequest, HttpResponseBase
+
+QUERY_PARAM = "_profile"
+HEADER = "X-Profile"
+SUMMARY_LINES = 40
+
+
+def requested(request: HttpRequest):
+    """Сотрудник, попросивший профиль этого запроса, или ``None``."""
+    flag = request.GET.get(QUERY_PARAM) or request.headers.get(HEADER)
+    if not flag or flag.lower() in ("0", "false", "off"):
+        return None
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        user = api_user(request)
+    return user if user is not None and user.is_staff else None
+
+
+def api_user(request: HttpRequest):
+    """Пользователь по аутентификации DRF (``DEFAULT_AUTHENTICATION_CLASSES``)."""
+    from rest_framework.exceptions import APIException
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+
+    # request.user не меняется: DRF сам аутентифицирует запрос во вьюхе
+    drf_request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(drf_request)
+        except APIException:
+            return None
+        if result is not None:
+            return result[0]
+    return None
+
+
+class CProfileProfiler:
+    name = "cprofile"
+    extension = "prof"
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def output(self) -> bytes:
+        # Формат pstats.Stats.dump_stats: читается snakeviz и pstats
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    def summary(self) -> str:
+        stream = StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        return stream.getvalue()
+
+
+class PyinstrumentProfiler:
+    name = "pyinstrument"
+    extension = "html"
+
+    def __init__(self) -> None:
+        from pyinstrument import Profiler
+
+        self.profile = Profiler(interval=0.001, async_mode="disabled")
+
+    def start(self) -> None:
+        self.profile.start()
+
+    def stop(self) -> None:
+        self.profile.stop()
+
+    def output(self) -> bytes:
+        return self.profile.output_html().encode("utf-8")
+
+    def summary(self) -> str:
+        return self.profile.output_text(unicode=True, color=False)
+
+
+def make_profiler():
+    """Профилировщик по ``CATALOG_PROFILER``: ``auto``, ``pyinstrument`` или ``cprofile``."""
+    choice = getattr(settings, "CATALOG_PROFILER", "auto")
+    if choice in ("auto", "pyinstrument"):
+        try:
+            return PyinstrumentProfiler()
+        except ImportError:
+            if choice == "pyinstrument":
+                raise
+    return CProfileProfiler()
+
+
+def profile_request(request: HttpRequest,
+                    get_response: Callable[[HttpRequest], HttpResponseBase], user):
+    """Выполнить запрос под профилировщиком; вернуть (ответ, профиль или ``None``).
+
+    Для синхронного потокового ответа профиль сохраняется позже, после тела,
+    и вместо него возвращается ``None``.
+    """
+    profiler = make_profiler()
+    started = time.perf_counter()
+    try:
+        profiler.start()
+    except ValueError:
+        # Уже работает другой профилировщик (sys.setprofile занят) — отвечаем без профиля
+        return get_response(request), None
+    try:
+        response = get_response(request)
+    except BaseException:
+        profiler.stop()
+        raise
+    if response.streaming and not getattr(response, "is_async", False):
+        profile_stream(request, response, profiler, started, user)
+        return response, None
+    profiler.stop()
+    elapsed = (time.perf_counter() - started) * 1000
+    return response, store(request, response, profiler, elapsed, user)
+
+
+class ProfiledStream:
+    """Тело потокового ответа: профиль закрывается после последнего куска или в ``close()``.
+
+    ``close()`` вызывает WSGI-сервер, а Django регистрирует его при присваивании
+    ``streaming_content``, — так профиль сохраняется, даже если тело не читали
+    (обрыв соединения, HEAD).
+    """
+
+    def __init__(self, content, finish: Callable[[], None]) -> None:
+        self.content = content
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self.finished:
+            self.finished = True
+            self.finish()
+
+
+def profile_stream(request: HttpRequest, response, profiler, started: float, user) -> None:
+    """Остановить профилировщик и сохранить профиль, когда тело отдано или ответ закрыт."""
+
+    def finish() -> None:
+        profiler.stop()
+        store(request, response, profiler, (time.perf_counter() - started) * 1000, user)
+
+    response.streaming_content = ProfiledStream(response.streaming_content, finish)
+
+
+def store(request: HttpRequest, response: HttpResponseBase, profiler, elapsed_ms: float,
+          user):
+    from .models import RequestProfile
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    profile = RequestProfile(
+        user=user,
+        method=request.method,
+        path=request.get_full_path()[:500],
+        status=response.status_code,
+        duration_ms=round(elapsed_ms, 2),
+        profiler=profiler.name,
+        summary=profiler.summary(),
+    )
+    # Имя со случайной частью: медиа может раздаваться без проверки прав
+    profile.file.save(f"{stamp}-{uuid.uuid4().hex}.{profiler.extension}",
+                      ContentFile(profiler.output()), save=False)
+    profile.save()
+    prune()
+    return profile
+
+
+def prune(keep: int | None = None) -> int:
+    """Удалить профили старше последних ``keep``; вернуть число удалённых."""
+    from .models import RequestProfile
+
+    keep = getattr(settings, "CATALOG_PROFILE_RETENTION", 50) if keep is None else keep
+    stale = list(RequestProfile.objects.order_by("-created_at", "-pk")[keep:])
+    for profile in stale:
+        # Файл удаляет сигнал post_delete
+        profile.delete()
+    return len(stale)
@@ -0,0 +1,193 @@
+"""Снимок справочников в памяти процесса: площадки, цеха, типы оборудования.
+
+Справочники маленькие и меняются редко, а нужны почти каждому запросу:
+названия в списке, выбор типа в форме поиска, проверка «цех принадлежит
+площадке» при записи оборудования. Снимок читается тремя запросами и
+хранится в процессе в компактных объектах со ``__slots__``; он действителен,
+пока не изменилась версия ``versions.REFERENCE`` (её увеличивают сигналы
+сохранения и удаления справочников). Проверка версии — одно чтение из кэша.
+
+С кэшем в памяти процесса (LocMem) версию, увеличенную в другом процессе,
+не видно, поэтому снимок ещё и перечитывается не реже чем раз в
+``CATALOG_REFERENCE_TTL`` секунд, а ``get`` при промахе ищет запись в БД:
+новая площадка или цех принимаются сразу, а не после истечения срока.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from django.conf import settings
+
+from . import versions
+from .attributes import TYPE_NUMBER, safe_schema
+
+
+class SiteRef:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: int, name: str) -> None:
+        self.id = id
+        self.name = name
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class WorkshopRef:
+    __slots__ = ("id", "site_id", "name")
+
+    def __init__(self, id: int, site_id: int, name: str) -> None:
+        self.id = id
+        self.site_id = site_id
+        self.name = name
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+
+class TypeRef:
+    __slots__ = ("id", "parent_id", "name", "default_attributes", "_schema")
+
+    def __init__(self, id: int, parent_id: int | None, name: str, default_attributes: Any) -> None:
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.default_attributes = default_attributes
+        self._schema = None
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+    @property
+    def attribute_schema(self) -> dict[str, dict[str, Any]]:
+        if self._schema is None:
+            self._schema = safe_schema(self.default_attributes)
+        return self._schema
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Snapshot:
+    __slots__ = ("version", "loaded_at", "sites", "workshops", "types", "children",
+                 "_number_keys")
+
+    def __init__(self, version: int, sites: list[SiteRef], workshops: list[WorkshopRef],
+                 types: list[TypeRef]) -> None:
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # Словари сохраняют порядок выборки — по названию, как ``Meta.ordering``
+        self.sites = {site.id: site for site in sites}
+        self.workshops = {workshop.id: workshop for workshop in workshops}
+        self.types = {eq_type.id: eq_type for eq_type in types}
+        self.children: dict[int | None, list[int]] = {}
+        for eq_type in types:
+            self.children.setdefault(eq_type.parent_id, []).append(eq_type.id)
+        self._number_keys: frozenset[str] | None = None
+
+    def is_fresh(self, version: int) -> bool:
+        return self.version == version and time.monotonic() - self.loaded_at < ttl()
+
+    def workshop_label(self, workshop_id: int) -> str:
+        """Как ``str(Workshop)``: «Площадка: Цех»."""
+        workshop = self.workshops[workshop_id]
+        return f"{self.sites[workshop.site_id].name}: {workshop.name}"
+
+    def descendants(self, type_id: int) -> list[int]:
+        """Тип и все его подтипы."""
+        result, stack = [], [type_id]
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(self.children.get(current, ()))
+        return result
+
+    def number_keys(self) -> frozenset[str]:
+        """Характеристики, числовые в схеме хотя бы одного типа."""
+        if self._number_keys is None:
+            self._number_keys = frozenset(
+                name
+                for eq_type in self.types.values()
+                for name, spec in eq_type.attribute_schema.items()
+                if spec["type"] == TYPE_NUMBER
+            )
+        return self._number_keys
+
+    def type_choices(self) -> list[tuple[int, str]]:
+        return [(eq_type.id, eq_type.name) for eq_type in self.types.values()]
+
+
+_snapshot: Snapshot | None = None
+_lock = threading.Lock()
+
+# Коллекция снимка -> (модель, столбцы, класс записи)
+COLLECTIONS = {
+    "sites": ("Site", ("pk", "name"), SiteRef),
+    "workshops": ("Workshop", ("pk", "site_id", "name"), WorkshopRef),
+    "types": ("EquipmentType", ("pk", "parent_id", "name", "default_attributes"), TypeRef),
+}
+
+
+def ttl() -> float:
+    return getattr(settings, "CATALOG_REFERENCE_TTL", 60)
+
+
+def _rows(collection: str, **filters: Any) -> list:
+    from django.apps import apps
+
+    model_name, columns, ref_class = COLLECTIONS[collection]
+    queryset = apps.get_model("catalog", model_name).objects.filter(**filters)
+    return [ref_class(*row) for row in queryset.order_by("name").values_list(*columns)]
+
+
+def load(version: int) -> Snapshot:
+    return Snapshot(version, _rows("sites"), _rows("workshops"), _rows("types"))
+
+
+def snapshot() -> Snapshot:
+    """Актуальный снимок; перечитывается при смене версии справочников и по сроку."""
+    global _snapshot
+    version = versions.get_version(versions.REFERENCE)
+    current = _snapshot
+    if current is not None and current.is_fresh(version):
+        return current
+    with _lock:
+        if _snapshot is None or not _snapshot.is_fresh(version):
+            _snapshot = load(version)
+        return _snapshot
+
+
+def get(collection: str, pk: int) -> SiteRef | WorkshopRef | TypeRef | None:
+    """Запись справочника по id: из снимка, при промахе — одним запросом из БД.
+
+    Запись, которая есть в БД, но не в снимке, значит, что снимок процесса
+    устарел: он сбрасывается и перечитается при следующем обращении.
+    """
+    ref = getattr(snapshot(), collection).get(pk)
+    if ref is not None:
+        return ref
+    rows = _rows(collection, pk=pk)
+    if not rows:
+        return None
+    reset()
+    return rows[0]
+
+
+def number_keys() -> frozenset[str]:
+    """Ключи характеристик, числовые по схеме хотя бы одного типа."""
+    return snapshot().number_keys()
+
+
+def reset() -> None:
+    global _snapshot
+    with _lock:
+        _snapshot = None
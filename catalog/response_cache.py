@@ -0,0 +1,86 @@
+"""Кэш ответов каталога для анонимных посетителей.
+
+Ключ строится из нормализованных параметров запроса (пустые значения
+отброшены, порядок не важен). Запись хранит номер поколения каталога
+(``versions.CATALOG``, растёт при любом изменении оборудования и
+справочников) и срок свежести. Устаревшая запись остаётся в кэше ещё
+``CATALOG_RESPONSE_CACHE_STALE`` секунд: пока один процесс пересчитывает
+ключ под блокировкой (``cache.add``), остальные отдают её, а если старой
+записи нет — ждут результат, но не дольше ``CATALOG_RESPONSE_CACHE_WAIT``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Callable
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from . import versions
+
+POLL_INTERVAL = 0.05
+
+
+def timeout() -> int:
+    return getattr(settings, "CATALOG_RESPONSE_CACHE_TIMEOUT", 30)
+
+
+def is_cacheable(request: HttpRequest) -> bool:
+    return (
+        timeout() > 0
+        and request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+    )
+
+
+def normalized_query(params) -> str:
+    pairs = sorted(
+        (key, value) for key in params for value in params.getlist(key) if value.strip()
+    )
+    return urlencode(pairs)
+
+
+def request_key(namespace: str, request: HttpRequest, *parts: Any) -> str:
+    raw = "|".join([normalized_query(request.GET), *(str(part) for part in parts)])
+    return f"catalog:response:{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def get_or_build(key: str, build: Callable[[], Any],
+                 cacheable: Callable[[Any], bool] = lambda value: True,
+                 ttl: int | None = None) -> Any:
+    """Значение из кэша или результат ``build()``; одновременно строит один процесс.
+
+    ``ttl`` — срок свежести вместо ``CATALOG_RESPONSE_CACHE_TIMEOUT``.
+    """
+    fresh = timeout() if ttl is None else ttl
+    generation = versions.get_version(versions.CATALOG)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == generation and entry[1] > time.time():
+        return entry[2]
+
+    lock_key = f"{key}:lock"
+    wait = getattr(settings, "CATALOG_RESPONSE_CACHE_WAIT", 2.0)
+    if not cache.add(lock_key, 1, max(1, int(wait * 5))):
+        if entry is not None:
+            return entry[2]
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generation:
+                return entry[2]
+        # Не дождались — считаем сами, но без записи поверх чужого результата
+        return build()
+
+    try:
+        value = build()
+        if cacheable(value):
+            stale = getattr(settings, "CATALOG_RESPONSE_CACHE_STALE", 300)
+            cache.set(key, (generation, time.time() + fresh, value), fresh + stale)
+        return value
+    finally:
+        cache.delete(lock_key)
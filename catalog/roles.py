@@ -0,0 +1,51 @@
+"""Проверка роли продавца с кэшированием.
+
+Результат запоминается на объекте пользователя (``request.user`` один на
+запрос) и, если задан ``CATALOG_ROLE_CACHE_TIMEOUT``, в кэше между запросами.
+Кэш сбрасывается сигналами при изменении групп пользователя.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+SELLER_GROUP = "seller"
+_ATTR = "_catalog_is_seller"
+
+
+def _cache_key(user_id: int) -> str:
+    return f"catalog:roles:seller:{user_id}"
+
+
+def _cache_timeout() -> int:
+    return getattr(settings, "CATALOG_ROLE_CACHE_TIMEOUT", 60)
+
+
+def is_seller(user) -> bool:
+    if not user.is_authenticated:
+        return False
+    cached = getattr(user, _ATTR, None)
+    if cached is not None:
+        return cached
+    timeout = _cache_timeout()
+    if timeout:
+        cached = cache.get(_cache_key(user.pk))
+    if cached is None:
+        cached = user.groups.filter(name=SELLER_GROUP).exists()
+        if timeout:
+            cache.set(_cache_key(user.pk), cached, timeout)
+    setattr(user, _ATTR, cached)
+    return cached
+
+
+def can_add_equipment(user) -> bool:
+    if not user.is_authenticated:
+        return False
+    return user.is_superuser or user.is_staff or is_seller(user)
+
+
+def invalidate(user_ids: Iterable[int]) -> None:
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
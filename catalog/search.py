@@ -0,0 +1,386 @@
+"""Полнотекстовый поиск по оборудованию.
+
+Индекс хранится в отдельной таблице ``catalog_equipment_search`` и
+поддерживается сигналами при сохранении/удалении ``Equipment``; в документ
+входят и слова из текстов паспортов (``catalog.extraction``). Реализация
+выбирается по СУБД: FTS5 на SQLite (основы слов считает ``catalog.stemming``),
+tsvector + GIN с конфигурацией ``russian`` на PostgreSQL. Для прочих СУБД
+остаётся прежний поиск через ``icontains``.
+
+Для подсказок (``catalog.suggest``) FTS5 хранит префиксные индексы коротких
+префиксов, а на PostgreSQL по названию строится триграммный GIN-индекс
+(``pg_trgm``), если расширение удаётся включить.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from typing import Callable, Iterable, Iterator, Sequence
+
+from django.db import DatabaseError, transaction
+from django.db import connection as default_connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .extraction import decompress
+from .stemming import stem
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "catalog_equipment_search"
+TRIGRAM_INDEX = "catalog_equipment_name_trgm"
+DEFAULT_BATCH_SIZE = 1000
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# (id, name, inventory_number, type_name, description, passports)
+DocumentRow = tuple[int, str, str, str, str, str]
+
+
+def tokenize(text: str | None) -> list[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def stem_text(text: str | None) -> str:
+    return " ".join(stem(token) for token in tokenize(text))
+
+
+class BaseSearchBackend:
+    vendor = ""
+
+    def create_table(self, cursor) -> None:
+        raise NotImplementedError
+
+    def drop_table(self, cursor) -> None:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def index(self, cursor, rows: Sequence[DocumentRow]) -> None:
+        raise NotImplementedError
+
+    def remove(self, cursor, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE {self.id_column} IN ({placeholders})",
+            list(ids),
+        )
+
+    def clear(self, cursor) -> None:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        raise NotImplementedError
+
+    def name_prefix(self, queryset: QuerySet, query: str) -> QuerySet:
+        """Оборудование, в названии которого есть слова, начинающиеся с ``query``."""
+        raise NotImplementedError
+
+    def similar(self, queryset: QuerySet, query: str) -> QuerySet:
+        """Похожие по написанию названия (опечатки); без поддержки СУБД — пусто."""
+        return queryset.none()
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    vendor = "sqlite"
+    id_column = "rowid"
+    # Веса столбцов для bm25: name, inventory_number, type_name, description, passports
+    weights = (10.0, 8.0, 4.0, 1.0, 0.5)
+
+    def create_table(self, cursor) -> None:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, inventory_number, type_name, description, passports, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+
+    def index(self, cursor, rows: Sequence[DocumentRow]) -> None:
+        if not rows:
+            return
+        self.remove(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} "
+            "(rowid, name, inventory_number, type_name, description, passports) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (pk, stem_text(name), " ".join(tokenize(inv)), stem_text(type_name),
+                 stem_text(description), stem_text(passports))
+                for pk, name, inv, type_name, description, passports in rows
+            ],
+        )
+
+    def build_query(self, query: str) -> str:
+        # Каждая основа ищется как префикс: "насосн" найдёт "насосная", "насосной"...
+        return " ".join(f'"{stem(token)}"*' for token in tokenize(query))
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        return self._match(queryset, self.build_query(query))
+
+    def name_prefix(self, queryset: QuerySet, query: str) -> QuerySet:
+        match = self.build_query(query)
+        return self._match(queryset, f"name : ({match})" if match else "")
+
+    def _match(self, queryset: QuerySet, match: str) -> QuerySet:
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        weights = ", ".join(str(w) for w in self.weights)
+        # Ранги считаются одним проходом MATCH во вложенной выборке: ``LIMIT -1``
+        # не даёт SQLite развернуть её в коррелированный подзапрос, и она
+        # материализуется один раз. MATCH на каждую строку заново разворачивал бы
+        # префиксы и на тысячах совпадений работал минутами
+        rank = RawSQL(
+            f"SELECT ranked.score FROM (SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) "
+            f"AS score FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s LIMIT -1) AS ranked "
+            f"WHERE ranked.id = {table}.id",
+            (match,),
+        )
+        matched = RawSQL(
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", (match,)
+        )
+        # bm25 тем лучше, чем меньше значение
+        return (
+            queryset.filter(pk__in=matched)
+            .annotate(search_rank=rank)
+            .order_by("search_rank", "pk")
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    vendor = "postgresql"
+    id_column = "equipment_id"
+    config = "russian"
+    # Есть ли pg_trgm; проверяется при первой подсказке
+    _trigram: bool | None = None
+
+    def create_table(self, cursor) -> None:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "equipment_id bigint PRIMARY KEY "
+            "REFERENCES catalog_equipment (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+        self.create_trigram_index(cursor)
+
+    def create_trigram_index(self, cursor) -> None:
+        # CREATE EXTENSION требует прав; без них подсказки работают без опечаток
+        try:
+            with transaction.atomic(using=cursor.db.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+                    "ON catalog_equipment USING GIN (name gin_trgm_ops)"
+                )
+        except DatabaseError:
+            logger.warning("pg_trgm недоступно, подсказки без поиска по сходству")
+
+    def index(self, cursor, rows: Sequence[DocumentRow]) -> None:
+        if not rows:
+            return
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (equipment_id, document) VALUES (%s, "
+            f"setweight(to_tsvector('{self.config}', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'B') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'C') || "
+            f"setweight(to_tsvector('{self.config}', %s), 'D')) "
+            "ON CONFLICT (equipment_id) DO UPDATE SET document = EXCLUDED.document",
+            [
+                (pk, name or "", inv or "", type_name or "", description or "", passports)
+                for pk, name, inv, type_name, description, passports in rows
+            ],
+        )
+
+    def build_query(self, query: str) -> str:
+        return " & ".join(f"{token}:*" for token in tokenize(query))
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        return self._match(queryset, self.build_query(query))
+
+    def name_prefix(self, queryset: QuerySet, query: str) -> QuerySet:
+        # Вес A — название и инвентарный номер
+        return self._match(queryset, " & ".join(f"{token}:*A" for token in tokenize(query)))
+
+    def has_trigram(self) -> bool:
+        if self._trigram is None:
+            with default_connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                self._trigram = cursor.fetchone() is not None
+        return self._trigram
+
+    def similar(self, queryset: QuerySet, query: str) -> QuerySet:
+        if not self.has_trigram():
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        # Оператор % идёт по триграммному индексу, порог — pg_trgm.similarity_threshold
+        matched = RawSQL(f"SELECT id FROM {table} WHERE name %% %s", (query,))
+        return (
+            queryset.filter(pk__in=matched)
+            .annotate(similarity=RawSQL(f"similarity({table}.name, %s)", (query,)))
+            .order_by("-similarity", "pk")
+        )
+
+    def _match(self, queryset: QuerySet, tsquery: str) -> QuerySet:
+        if not tsquery:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('{self.config}', %s)) "
+            f"FROM {SEARCH_TABLE} WHERE equipment_id = {table}.id",
+            (tsquery,),
+        )
+        matched = RawSQL(
+            f"SELECT equipment_id FROM {SEARCH_TABLE} "
+            f"WHERE document @@ to_tsquery('{self.config}', %s)",
+            (tsquery,),
+        )
+        return (
+            queryset.filter(pk__in=matched)
+            .annotate(search_rank=rank)
+            .order_by("-search_rank", "pk")
+        )
+
+
+class FallbackSearchBackend(BaseSearchBackend):
+    """Без отдельного индекса: прежний поиск по подстроке."""
+
+    def create_table(self, cursor) -> None:
+        pass
+
+    def drop_table(self, cursor) -> None:
+        pass
+
+    def index(self, cursor, rows: Sequence[DocumentRow]) -> None:
+        pass
+
+    def remove(self, cursor, ids: Sequence[int]) -> None:
+        pass
+
+    def clear(self, cursor) -> None:
+        pass
+
+    def name_prefix(self, queryset: QuerySet, query: str) -> QuerySet:
+        return queryset.filter(name__istartswith=query)
+
+    def filter(self, queryset: QuerySet, query: str) -> QuerySet:
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(description__icontains=query)
+            | Q(inventory_number__icontains=query)
+            | Q(equipment_type__name__icontains=query)
+        )
+
+
+_BACKENDS = {
+    SQLiteSearchBackend.vendor: SQLiteSearchBackend(),
+    PostgresSearchBackend.vendor: PostgresSearchBackend(),
+}
+
+
+def get_backend(connection=None) -> BaseSearchBackend:
+    connection = connection or default_connection
+    return _BACKENDS.get(connection.vendor, FallbackSearchBackend())
+
+
+def passport_terms(equipment_model, ids: Sequence[int]) -> dict[int, str]:
+    """Слова из текстов паспортов по id оборудования, без повторов."""
+    apps = equipment_model._meta.apps
+    try:
+        # В ранних миграциях текстов паспортов ещё нет
+        passport_text_model = apps.get_model("catalog", "PassportText")
+    except LookupError:
+        return {}
+    pairs = list(
+        apps.get_model("catalog", "Passport").objects
+        .filter(equipment_id__in=ids).exclude(sha256="")
+        .values_list("equipment_id", "sha256")
+    )
+    if not pairs:
+        return {}
+    texts = dict(
+        passport_text_model.objects.filter(sha256__in={digest for _, digest in pairs})
+        .values_list("sha256", "content")
+    )
+    terms: dict[int, dict[str, None]] = {}
+    for equipment_id, digest in pairs:
+        if digest in texts:
+            # Для поиска важен факт слова, а не частота: индекс не раздувается
+            terms.setdefault(equipment_id, {}).update(
+                dict.fromkeys(tokenize(decompress(texts[digest])))
+            )
+    return {equipment_id: " ".join(words) for equipment_id, words in terms.items()}
+
+
+def document_rows(equipment_model, ids: Iterable[int] | None = None) -> Iterator[DocumentRow]:
+    queryset = equipment_model.objects.order_by("pk")
+    if ids is not None:
+        queryset = queryset.filter(pk__in=list(ids))
+    rows = queryset.values_list(
+        "pk", "name", "inventory_number", "equipment_type__name", "description"
+    ).iterator(chunk_size=DEFAULT_BATCH_SIZE)
+    for batch in _batched(rows, DEFAULT_BATCH_SIZE):
+        terms = passport_terms(equipment_model, [row[0] for row in batch])
+        for row in batch:
+            yield (*row, terms.get(row[0], ""))
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def index_equipment(ids: Iterable[int]) -> None:
+    """Переиндексировать указанное оборудование."""
+    from .models import Equipment
+
+    ids = list(ids)
+    if not ids:
+        return
+    backend = get_backend()
+    with default_connection.cursor() as cursor:
+        for batch in _batched(ids, DEFAULT_BATCH_SIZE):
+            backend.index(cursor, list(document_rows(Equipment, batch)))
+
+
+def remove_equipment(ids: Iterable[int]) -> None:
+    ids = list(ids)
+    with default_connection.cursor() as cursor:
+        get_backend().remove(cursor, ids)
+
+
+def rebuild_index(equipment_model=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                  connection=None, progress: Callable[[int], None] | None = None) -> int:
+    """Перестроить индекс с нуля пачками по ``batch_size``; вернуть число строк."""
+    if equipment_model is None:
+        from .models import Equipment as equipment_model
+    connection = connection or default_connection
+    backend = get_backend(connection)
+    total = 0
+    with connection.cursor() as cursor:
+        backend.create_table(cursor)
+        backend.clear(cursor)
+        for batch in _batched(document_rows(equipment_model), batch_size):
+            backend.index(cursor, batch)
+            total += len(batch)
+            if progress:
+                progress(total)
+    return total
+
+
+def search_equipment(queryset: QuerySet, query: str) -> QuerySet:
+    """Отфильтровать queryset по поисковому запросу, упорядочив по релевантности."""
+    query = (query or "").strip()
+    if not query:
+        return queryset
+    return get_backend().filter(queryset, query)
@@ -0,0 +1,281 @@
+"""Синтетический каталог для замеров производительности.
+
+Генерирует площадки, цеха, дерево типов с рекомендуемыми характеристиками,
+оборудование с правдоподобными ``attributes``, паспорта и корзины
+пользователей. Данные детерминированы зерном ``seed``; оборудование, паспорта
+и корзины пишутся ``bulk_create`` пачками, индексы характеристик и поиска
+обновляются по пачке, как в ``catalog.importer``. Повторный запуск
+дописывает новые записи после уже созданных.
+
+Пароль покупателей не зашит в код: если ``password`` не задан, он
+генерируется при каждом запуске, ставится всем покупателям (и созданным
+раньше), и ``seed_catalog`` его печатает.
+"""
+
+from __future__ import annotations
+
+import random
+import secrets
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Callable
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import attributes, search, versions
+from .models import CartItem, Equipment, EquipmentType, Passport, Site, Workshop
+from .uploads import hash_stream, store_content
+
+INVENTORY_PREFIX = "SEED-"
+USER_PREFIX = "seed_user_"
+
+CATEGORIES = {
+    "Насосы": [
+        {"name": "power", "type": "number", "unit": "кВт"},
+        {"name": "flow", "type": "number", "unit": "м³/ч"},
+        {"name": "material", "type": "enum", "choices": ["сталь", "чугун", "бронза"]},
+        "brand",
+    ],
+    "Компрессоры": [
+        {"name": "power", "type": "number", "unit": "кВт"},
+        {"name": "pressure", "type": "number", "unit": "бар"},
+        "brand",
+    ],
+    "Электродвигатели": [
+        {"name": "power", "type": "number", "unit": "кВт"},
+        {"name": "rpm", "type": "number"},
+        {"name": "voltage", "type": "enum", "choices": ["220", "380", "660", "6000"]},
+        "brand",
+    ],
+    "Арматура": [
+        {"name": "diameter", "type": "number", "unit": "мм"},
+        {"name": "pressure", "type": "number", "unit": "бар"},
+        {"name": "material", "type": "enum", "choices": ["сталь", "чугун", "латунь"]},
+    ],
+    "Теплообменники": [
+        {"name": "area", "type": "number", "unit": "м²"},
+        {"name": "material", "type": "enum", "choices": ["сталь", "медь", "титан"]},
+        "brand",
+    ],
+    "Вентиляторы": [
+        {"name": "power", "type": "number", "unit": "кВт"},
+        {"name": "flow", "type": "number", "unit": "м³/ч"},
+        "brand",
+    ],
+}
+QUALIFIERS = [
+    "центробежные", "вихревые", "погружные", "дозировочные", "винтовые", "поршневые",
+    "взрывозащищённые", "высоковольтные", "шаровые", "запорные", "пластинчатые", "осевые",
+]
+BRANDS = ["Grundfos", "Wilo", "KSB", "Siemens", "ABB", "Atlas Copco", "Danfoss", "Alfa Laval",
+          "ЛивГидромаш", "ВЭМЗ", "Элком", "Ридан"]
+SITE_NAMES = ["Северная", "Южная", "Восточная", "Западная", "Центральная", "Заречная",
+              "Промзона", "Порт", "Нефтебаза", "ТЭЦ"]
+WORKSHOP_NAMES = ["Насосная", "Компрессорная", "Котельная", "Механический", "Сборочный",
+                  "Ремонтный", "Энергоцех", "Очистные", "Склад", "Литейный"]
+NUMBER_RANGES = {
+    "power": (0.37, 630), "flow": (1, 2500), "pressure": (1, 250), "rpm": (750, 3000),
+    "diameter": (15, 1200), "area": (1, 900),
+}
+
+
+@dataclass
+class SeedStats:
+    sites: int = 0
+    workshops: int = 0
+    types: int = 0
+    equipment: int = 0
+    passports: int = 0
+    users: int = 0
+    cart_items: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+@dataclass
+class CatalogSeeder:
+    sites: int = 5
+    workshops_per_site: int = 4
+    type_depth: int = 3
+    type_branching: int = 3
+    equipment: int = 10_000
+    passport_ratio: float = 0.3
+    passport_files: int = 20
+    users: int = 20
+    cart_items: int = 10
+    batch_size: int = 2000
+    index: bool = True
+    seed: int = 42
+    # Пароль покупателей: им логинится сценарий оформления в бенчмарке по HTTP
+    password: str = ""
+    progress: Callable[[SeedStats], None] | None = None
+    stats: SeedStats = field(default_factory=SeedStats)
+
+    def __post_init__(self) -> None:
+        self.random = random.Random(self.seed)
+        # Не из ``self.random``: пароль не должен выводиться из зерна
+        self.password = self.password or secrets.token_urlsafe(12)
+
+    def run(self) -> SeedStats:
+        workshops = self.create_sites()
+        types = self.create_types()
+        equipment_ids = self.create_equipment(workshops, types)
+        self.create_passports(equipment_ids)
+        self.create_carts(equipment_ids)
+        versions.bump_version(versions.REFERENCE, versions.CATALOG)
+        return self.stats
+
+    def create_sites(self) -> list[tuple[int, int]]:
+        """Создать площадки и цеха; вернуть пары (site_id, workshop_id)."""
+        existing = Site.objects.count()
+        sites = Site.objects.bulk_create(
+            Site(name=f"{SITE_NAMES[index % len(SITE_NAMES)]} площадка {index + 1}",
+                 address=f"ул. Заводская, {index + 1}")
+            for index in range(existing, existing + self.sites)
+        )
+        if not sites or sites[0].pk is None:
+            sites = list(Site.objects.order_by("-pk")[: self.sites])
+        workshops = Workshop.objects.bulk_create(
+            Workshop(site=site, name=f"{WORKSHOP_NAMES[index % len(WORKSHOP_NAMES)]} {index + 1}")
+            for site in sites
+            for index in range(self.workshops_per_site)
+        )
+        self.stats.sites, self.stats.workshops = len(sites), len(workshops)
+        return list(
+            Workshop.objects.filter(site__in=sites).values_list("site_id", "pk")
+        )
+
+    def create_types(self) -> list[tuple[int, dict[str, dict[str, Any]]]]:
+        """Дерево типов; вернуть (id, схема) листьев, к ним относится оборудование.
+
+        Типы сохраняются по одному: таблицу замыкания дерева ведут сигналы.
+        """
+        leaves = []
+
+        def grow(parent: EquipmentType | None, name: str, schema: list, depth: int) -> None:
+            node = EquipmentType.objects.create(
+                name=name, parent=parent, default_attributes=schema
+            )
+            self.stats.types += 1
+            if depth >= self.type_depth:
+                leaves.append((node.pk, attributes.safe_schema(schema)))
+                return
+            for qualifier in self.random.sample(QUALIFIERS, self.type_branching):
+                grow(node, f"{name} {qualifier}", schema, depth + 1)
+
+        with transaction.atomic():
+            for category, schema in CATEGORIES.items():
+                grow(None, category, schema, 1)
+        return leaves
+
+    def attributes_for(self, schema: dict[str, dict[str, Any]]) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        for name, spec in schema.items():
+            # Как в жизни: часть характеристик не заполнена
+            if self.random.random() < 0.15:
+                continue
+            if spec["type"] == attributes.TYPE_NUMBER:
+                low, high = NUMBER_RANGES.get(name, (1, 100))
+                values[name] = round(self.random.uniform(low, high), 1)
+            elif spec["type"] == attributes.TYPE_ENUM:
+                values[name] = self.random.choice(spec["choices"])
+            else:
+                values[name] = self.random.choice(BRANDS)
+        return values
+
+    def create_equipment(self, workshops: list[tuple[int, int]],
+                         types: list[tuple[int, dict[str, dict[str, Any]]]]) -> list[int]:
+        start = Equipment.objects.filter(inventory_number__startswith=INVENTORY_PREFIX).count()
+        names = dict(EquipmentType.objects.filter(pk__in=[pk for pk, _ in types])
+                     .values_list("pk", "name"))
+        ids: list[int] = []
+        for offset in range(0, self.equipment, self.batch_size):
+            batch = []
+            end = min(offset + self.batch_size, self.equipment)
+            for number in range(start + offset, start + end):
+                type_id, schema = self.random.choice(types)
+                site_id, workshop_id = self.random.choice(workshops)
+                item = Equipment(
+                    name=f"{names[type_id]} {self.random.choice(BRANDS)} {number}",
+                    inventory_number=f"{INVENTORY_PREFIX}{number:08d}",
+                    equipment_type_id=type_id,
+                    site_id=site_id,
+                    workshop_id=workshop_id,
+                    description=f"Введено в эксплуатацию в {self.random.randint(1975, 2024)} году.",
+                    attributes=self.attributes_for(schema),
+                )
+                item.content_hash = item.compute_content_hash()
+                batch.append(item)
+            with transaction.atomic():
+                Equipment.objects.bulk_create(batch)
+                if batch and batch[0].pk is None:
+                    # СУБД без RETURNING: id дочитываются по номерам
+                    numbers = [item.inventory_number for item in batch]
+                    pks = dict(Equipment.objects.filter(inventory_number__in=numbers)
+                               .values_list("inventory_number", "pk"))
+                    for item in batch:
+                        item.pk = pks[item.inventory_number]
+                # bulk_create не шлёт сигналы: индексы обновляем явно
+                attributes.sync_attributes(batch)
+                if self.index:
+                    search.index_equipment(item.pk for item in batch)
+            ids.extend(item.pk for item in batch)
+            self.stats.equipment += len(batch)
+            if self.progress:
+                self.progress(self.stats)
+        return ids
+
+    def create_passports(self, equipment_ids: list[int]) -> None:
+        """Паспорта ссылаются на небольшой набор файлов: так и бывает с типовыми инструкциями."""
+        if not equipment_ids or not self.passport_ratio or not self.passport_files:
+            return
+        files = []
+        for index in range(self.passport_files):
+            content = f"Паспорт изделия. Серия {index}. {' '.join(self.random.sample(BRANDS, 3))}."
+            stream = BytesIO((content * 20).encode())
+            digest, size = hash_stream(stream)
+            files.append((store_content(stream, f"seed-{index}.txt", digest), digest, size))
+        chosen = [pk for pk in equipment_ids if self.random.random() < self.passport_ratio]
+        for offset in range(0, len(chosen), self.batch_size):
+            rows = []
+            for equipment_id in chosen[offset:offset + self.batch_size]:
+                name, digest, size = self.random.choice(files)
+                rows.append(Passport(equipment_id=equipment_id, file=name, sha256=digest,
+                                     size=size, description="Паспорт"))
+            Passport.objects.bulk_create(rows)
+            self.stats.passports += len(rows)
+
+    def create_carts(self, equipment_ids: list[int]) -> None:
+        if not equipment_ids or not self.users:
+            return
+        user_model = get_user_model()
+        start = user_model.objects.filter(username__startswith=USER_PREFIX).count()
+        # Хеш пароля считается один раз: он намеренно медленный
+        password = make_password(self.password)
+        user_model.objects.bulk_create(
+            user_model(username=f"{USER_PREFIX}{index}", password=password)
+            for index in range(start, start + self.users)
+        )
+        # Печатается один пароль для всех seed_user_N: покупатели прошлых запусков получают его же
+        user_model.objects.filter(username__startswith=USER_PREFIX).update(password=password)
+        users = user_model.objects.filter(username__startswith=USER_PREFIX).values_list(
+            "pk", flat=True
+        )
+        now = timezone.now()
+        rows = [
+            CartItem(user_id=user_id, equipment_id=equipment_id,
+                     quantity=self.random.randint(1, 5), added_at=now)
+            for user_id in users
+            for equipment_id in self.random.sample(
+                equipment_ids, min(self.cart_items, len(equipment_ids))
+            )
+        ]
+        CartItem.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+        self.stats.users, self.stats.cart_items = self.users, len(rows)
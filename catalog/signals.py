@@ -0,0 +1,223 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import attributes, extraction, images, roles, search, slow_queries, tree, versions
+from .cart import invalidate_cart_count
+from .models import (
+    CartItem,
+    Equipment,
+    EquipmentType,
+    Passport,
+    PassportText,
+    RequestProfile,
+    Site,
+    Workshop,
+)
+
+
+@receiver(pre_save, sender=Equipment)
+def reset_replaced_image_thumbnails(sender, instance: Equipment, raw: bool = False,
+                                    update_fields=None, **kwargs) -> None:
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    old_image = sender.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+    if (old_image or "") != (instance.image.name or ""):
+        instance.image_thumbnails = []
+
+
+@receiver(post_save, sender=Equipment)
+def schedule_equipment_thumbnails(sender, instance: Equipment, raw: bool = False,
+                                  **kwargs) -> None:
+    if raw or not instance.image or instance.image_thumbnails:
+        return
+    images.schedule_thumbnails(instance.pk, instance.image.name)
+
+
+@receiver(post_save, sender=Equipment)
+def index_saved_equipment(sender, instance: Equipment, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    search.index_equipment([instance.pk])
+
+
+@receiver(post_save, sender=Equipment)
+def sync_saved_equipment_attributes(sender, instance: Equipment, raw: bool = False,
+                                    update_fields=None, **kwargs) -> None:
+    if raw or (update_fields is not None and "attributes" not in update_fields):
+        return
+    attributes.sync_attributes([instance])
+
+
+@receiver(post_delete, sender=Equipment)
+def unindex_deleted_equipment(sender, instance: Equipment, **kwargs) -> None:
+    search.remove_equipment([instance.pk])
+
+
+@receiver(post_save, sender=Passport)
+def extract_saved_passport_text(sender, instance: Passport, raw: bool = False,
+                                **kwargs) -> None:
+    if raw or not instance.file:
+        return
+    if instance.sha256 and PassportText.objects.filter(sha256=instance.sha256).exists():
+        # Такой файл уже разобран — достаточно переиндексировать оборудование
+        search.index_equipment([instance.equipment_id])
+    else:
+        extraction.schedule_extraction(instance.pk)
+
+
+@receiver(post_delete, sender=Passport)
+def unindex_deleted_passport(sender, instance: Passport, **kwargs) -> None:
+    search.index_equipment([instance.equipment_id])
+
+
+@receiver(post_save, sender=Passport)
+@receiver(post_delete, sender=Passport)
+def touch_passport_equipment(sender, instance: Passport, raw: bool = False, **kwargs) -> None:
+    # Паспорта видны в карточке: их изменение меняет и ETag оборудования
+    if not raw:
+        Equipment.objects.filter(pk=instance.equipment_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=EquipmentType)
+@receiver(post_delete, sender=EquipmentType)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_save, sender=Workshop)
+@receiver(post_delete, sender=Workshop)
+def bump_reference_version(sender, raw: bool = False, **kwargs) -> None:
+    if not raw:
+        versions.bump_version(versions.REFERENCE)
+        # Снимок справочников, перечитанный до коммита, видел старые данные —
+        # после коммита версия меняется ещё раз
+        transaction.on_commit(lambda: versions.bump_version(versions.REFERENCE))
+
+
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_save, sender=Passport)
+@receiver(post_delete, sender=Passport)
+@receiver(post_save, sender=EquipmentType)
+@receiver(post_delete, sender=EquipmentType)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_save, sender=Workshop)
+@receiver(post_delete, sender=Workshop)
+def bump_catalog_generation(sender, raw: bool = False, **kwargs) -> None:
+    if not raw:
+        versions.bump_version(versions.CATALOG)
+        # ETag и кэш ответа, посчитанные до коммита, видели старые строки
+        transaction.on_commit(lambda: versions.bump_version(versions.CATALOG))
+
+
+@receiver(post_save, sender=EquipmentType)
+def reindex_type_equipment(sender, instance: EquipmentType, created: bool,
+                           raw: bool = False, **kwargs) -> None:
+    # Название типа входит в поисковый документ, а схема характеристик
+    # определяет, какие значения приводятся к числам; остальные поля на
+    # оборудование не влияют
+    if created or raw:
+        return
+    old_name, old_schema = getattr(instance, "_old_name_and_schema", (None, None))
+    if instance.name != old_name:
+        search.index_equipment(instance.equipment.values_list("pk", flat=True))
+    if instance.default_attributes != old_schema:
+        attributes.rebuild_attributes(instance.equipment.all())
+
+
+@receiver(pre_save, sender=EquipmentType)
+def remember_old_type(sender, instance: EquipmentType, raw: bool = False, **kwargs) -> None:
+    if raw or instance.pk is None:
+        instance._closure_old_parent_id = None
+        instance._old_name_and_schema = (None, None)
+        return
+    parent_id, name, schema = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("parent_id", "name", "default_attributes").first()
+    ) or (None, None, None)
+    instance._closure_old_parent_id = parent_id
+    instance._old_name_and_schema = (name, schema)
+
+
+@receiver(post_save, sender=EquipmentType)
+def update_type_closure(sender, instance: EquipmentType, created: bool,
+                        raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    if created:
+        tree.insert_node(instance.pk, instance.parent_id)
+    elif instance.parent_id != getattr(instance, "_closure_old_parent_id", instance.parent_id):
+        tree.move_node(instance.pk, instance.parent_id)
+
+
+@receiver(pre_delete, sender=EquipmentType)
+def detach_type_children(sender, instance: EquipmentType, **kwargs) -> None:
+    tree.detach_children(instance.pk)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action: str, reverse: bool,
+                                          pk_set=None, **kwargs) -> None:
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        roles.invalidate([instance.pk])
+    elif action == "pre_clear":
+        roles.invalidate(instance.user_set.values_list("pk", flat=True))
+    else:
+        roles.invalidate(pk_set or [])
+
+
+@receiver(post_save, sender=get_user_model())
+def reset_roles_for_new_user(sender, instance, created: bool, **kwargs) -> None:
+    # id могут переиспользоваться (например, после отката транзакции)
+    if created:
+        roles.invalidate([instance.pk])
+        invalidate_cart_count(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, instance: Group, **kwargs) -> None:
+    roles.invalidate(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=CartItem)
+def reset_cart_count_on_add(sender, instance: CartItem, created: bool, **kwargs) -> None:
+    # Смена количества не меняет число позиций
+    if created:
+        invalidate_cart_count(instance.user_id)
+
+
+@receiver(post_delete, sender=CartItem)
+def reset_cart_count_on_delete(sender, instance: CartItem, **kwargs) -> None:
+    invalidate_cart_count(instance.user_id)
+
+
+@receiver(connection_created)
+def collect_slow_queries(sender, connection, **kwargs) -> None:
+    slow_queries.install(connection)
+
+
+@receiver(request_finished)
+def flush_slow_queries(sender, **kwargs) -> None:
+    slow_queries.after_request()
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_file(sender, instance: RequestProfile, **kwargs) -> None:
+    if instance.file:
+        instance.file.delete(save=False)
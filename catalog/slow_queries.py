@@ -0,0 +1,197 @@
+"""Сводка SQL по формам запросов и планы медленных запросов.
+
+При ``CATALOG_SLOW_QUERY_LOG`` сборщик подключается к каждому новому
+соединению (``execute_wrapper``) и копит в памяти процесса по форме SQL
+(``instrumentation.fingerprint``): число выполнений, суммарное и
+максимальное время. Для запроса дольше ``CATALOG_SLOW_QUERY_THRESHOLD_MS``
+запоминаются текст и параметры; ``EXPLAIN`` по ним выполняется после ответа
+(``request_finished``) в точке сохранения, один раз на форму.
+
+Раз в ``CATALOG_SLOW_QUERY_FLUSH_INTERVAL`` секунд накопленное сливается в
+общую запись кэша под блокировкой (``cache.add``) — так сводку видят отчёт
+для персонала и ``manage.py slow_queries``; с общим кэшем (Redis, memcached) —
+по всем процессам. Хранятся ``CATALOG_SLOW_QUERY_MAX_FINGERPRINTS`` самых
+дорогих форм.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+
+from .instrumentation import fingerprint
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "catalog:slow-queries"
+ORDERINGS = ("total_ms", "max_ms", "mean_ms", "count")
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+def enabled() -> bool:
+    return getattr(settings, "CATALOG_SLOW_QUERY_LOG", False)
+
+
+def threshold_ms() -> float:
+    return getattr(settings, "CATALOG_SLOW_QUERY_THRESHOLD_MS", 100)
+
+
+def digest(shape: str) -> str:
+    return hashlib.sha1(shape.encode()).hexdigest()
+
+
+def format_plan(vendor: str, rows: list[tuple]) -> str:
+    """Текст плана; строки ``EXPLAIN QUERY PLAN`` SQLite выстраиваются деревом."""
+    if vendor == "sqlite" and rows and len(rows[0]) == 4:
+        depth: dict[int, int] = {}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + str(detail))
+        return "\n".join(lines)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+class Collector:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending: dict[str, dict[str, Any]] = {}
+        # digest -> (alias, sql, params, время запроса): ждут EXPLAIN
+        self._slow: dict[str, tuple[str, str, Any, float]] = {}
+        self._explained: set[str] = set()
+        self._last_flush = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self._local, "paused", False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, (time.perf_counter() - started) * 1000,
+                        context["connection"].alias, None if many else params)
+
+    def record(self, sql: str, elapsed_ms: float, alias: str = "default",
+               params: Any = None) -> None:
+        shape = fingerprint(sql)
+        key = digest(shape)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {
+                    "fingerprint": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            if (elapsed_ms >= threshold_ms() and key not in self._explained
+                    and _EXPLAINABLE_RE.match(sql)
+                    and elapsed_ms > self._slow.get(key, (None, None, None, -1.0))[3]):
+                self._slow[key] = (alias, sql, params, elapsed_ms)
+
+    def explain_pending(self) -> None:
+        """Снять планы запомненных медленных запросов в текущем потоке."""
+        with self._lock:
+            slow, self._slow = self._slow, {}
+        for key, (alias, sql, params, elapsed_ms) in slow.items():
+            connection = connections[alias]
+            if connection.needs_rollback:
+                # Транзакция уже сломана — снимем план после её отката
+                with self._lock:
+                    self._slow.setdefault(key, (alias, sql, params, elapsed_ms))
+                continue
+            self._local.paused = True
+            try:
+                # Точка сохранения: ошибка EXPLAIN не ломает транзакцию вокруг
+                with transaction.atomic(using=alias), connection.cursor() as cursor:
+                    cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                    plan = format_plan(connection.vendor, cursor.fetchall())
+            except DatabaseError:
+                logger.debug("EXPLAIN не выполнен", exc_info=True)
+                continue
+            finally:
+                self._local.paused = False
+            with self._lock:
+                self._explained.add(key)
+                entry = self._pending.setdefault(key, {
+                    "fingerprint": fingerprint(sql), "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                })
+                entry.update(plan=plan, plan_ms=round(elapsed_ms, 2))
+
+    def flush(self, force: bool = False) -> bool:
+        """Слить накопленное в кэш; ``False`` — рано или кэш занят другим процессом."""
+        interval = getattr(settings, "CATALOG_SLOW_QUERY_FLUSH_INTERVAL", 60)
+        if not force and time.monotonic() - self._last_flush < interval:
+            return False
+        lock_key = f"{CACHE_KEY}:lock"
+        if not cache.add(lock_key, 1, 10):
+            return False
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            if not pending:
+                return True
+            stored = cache.get(CACHE_KEY) or {}
+            for key, entry in pending.items():
+                merged = stored.get(key)
+                if merged is None:
+                    stored[key] = dict(entry, last_seen=time.time())
+                    continue
+                merged["count"] += entry["count"]
+                merged["total_ms"] += entry["total_ms"]
+                merged["max_ms"] = max(merged["max_ms"], entry["max_ms"])
+                merged["last_seen"] = time.time()
+                if "plan" in entry:
+                    merged.update(plan=entry["plan"], plan_ms=entry["plan_ms"])
+            limit = getattr(settings, "CATALOG_SLOW_QUERY_MAX_FINGERPRINTS", 500)
+            if len(stored) > limit:
+                kept = sorted(stored, key=lambda key: stored[key]["total_ms"], reverse=True)
+                stored = {key: stored[key] for key in kept[:limit]}
+            cache.set(CACHE_KEY, stored, None)
+            return True
+        finally:
+            cache.delete(lock_key)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._slow.clear()
+            self._explained.clear()
+        cache.delete(CACHE_KEY)
+
+
+collector = Collector()
+
+
+def install(connection) -> None:
+    if enabled() and collector not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collector)
+
+
+def after_request() -> None:
+    if enabled():
+        collector.explain_pending()
+        collector.flush()
+
+
+def report(order: str = "total_ms", limit: int = 20) -> list[dict[str, Any]]:
+    """Самые дорогие формы SQL из кэша, по убыванию ``order``."""
+    if order not in ORDERINGS:
+        raise ValueError(f"Сортировка: одно из {', '.join(ORDERINGS)}")
+    rows = []
+    for key, entry in (cache.get(CACHE_KEY) or {}).items():
+        row = dict(entry, digest=key)
+        row["mean_ms"] = row["total_ms"] / row["count"] if row["count"] else 0.0
+        rows.append(row)
+    rows.sort(key=lambda row: row[order], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,103 @@
+"""Подсказки для строки поиска: (id, название, инвентарный номер).
+
+Сначала ищется префикс инвентарного номера по индексу столбца, без
+``UPPER()``, который индекс не использует. На SQLite это диапазон по
+уникальному индексу (``>= префикс AND < следующий префикс``): строки там
+сравниваются побайтно, и диапазон совпадает с префиксом. На прочих СУБД
+порядок строк задаёт collation базы, и вне ``C`` диапазон терял бы номера;
+там префикс — ``LIKE 'префикс%'`` (``startswith``), на PostgreSQL он идёт по
+индексу ``varchar_pattern_ops``, который Django строит к уникальному
+``CharField`` (``..._like``). Оставшиеся места заполняют
+совпадения по началу слов названия из поискового индекса (префиксные
+индексы FTS5 / вес ``A`` tsvector), а на PostgreSQL с ``pg_trgm`` — ещё и
+похожие по написанию названия.
+
+Ответ на один и тот же префикс повторяется при каждом нажатии клавиши у
+многих пользователей, поэтому он кэшируется на несколько секунд
+(``CATALOG_SUGGEST_CACHE_TIMEOUT``) с поколением каталога в ключе.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from . import versions
+from .search import get_backend
+
+FIELDS = ("id", "name", "inventory_number")
+MAX_QUERY_LENGTH = 100
+
+
+def limits() -> tuple[int, int]:
+    """(число подсказок по умолчанию, максимум, который можно запросить)."""
+    return (
+        getattr(settings, "CATALOG_SUGGEST_LIMIT", 10),
+        getattr(settings, "CATALOG_SUGGEST_MAX_LIMIT", 50),
+    )
+
+
+def next_prefix(prefix: str) -> str:
+    """Наименьшая строка больше всех строк, начинающихся с ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def inventory_prefix(query: str, vendor: str | None = None) -> Q:
+    vendor = vendor or connection.vendor
+    condition = Q()
+    # Номера обычно в верхнем регистре, а вводят их как придётся
+    for prefix in dict.fromkeys((query, query.upper())):
+        if vendor == "sqlite":
+            condition |= Q(
+                inventory_number__gte=prefix, inventory_number__lt=next_prefix(prefix)
+            )
+        else:
+            condition |= Q(inventory_number__startswith=prefix)
+    return condition
+
+
+def lookup(query: str, limit: int) -> list[dict[str, Any]]:
+    """Подсказки без кэша: не больше трёх запросов, каждый — по индексу."""
+    from .models import Equipment
+
+    base = Equipment.objects.order_by()
+    rows = list(
+        base.filter(inventory_prefix(query))
+        .order_by("inventory_number").values_list(*FIELDS)[:limit]
+    )
+    backend = get_backend()
+    for find in (backend.name_prefix, backend.similar):
+        if len(rows) >= limit:
+            break
+        seen = [row[0] for row in rows]
+        matches = find(base.exclude(pk__in=seen), query).values_list(*FIELDS)
+        rows += list(matches[:limit - len(rows)])
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+def cache_key(query: str, limit: int) -> str:
+    generation = versions.get_version(versions.CATALOG)
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f"catalog:suggest:{generation}:{limit}:{digest}"
+
+
+def suggest(query: str, limit: int | None = None) -> list[dict[str, Any]]:
+    default, maximum = limits()
+    limit = min(max(1, limit or default), maximum)
+    query = " ".join((query or "").split())[:MAX_QUERY_LENGTH]
+    if not query:
+        return []
+    timeout = getattr(settings, "CATALOG_SUGGEST_CACHE_TIMEOUT", 10)
+    if timeout <= 0:
+        return lookup(query, limit)
+    key = cache_key(query, limit)
+    results = cache.get(key)
+    if results is None:
+        results = lookup(query, limit)
+        cache.set(key, results, timeout)
+    return results
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from catalog.fragments import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def equipment_cards(equipment_list):
+    """Карточки списка оборудования с кэшированием каждой карточки."""
+    return mark_safe(render_cards(equipment_list))
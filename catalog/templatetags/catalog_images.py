@@ -0,0 +1,28 @@
+from django import template
+
+from catalog.images import thumbnail_name
+
+register = template.Library()
+
+
+@register.inclusion_tag("partials/equipment_picture.html")
+def equipment_picture(equipment, sizes: str = "100vw", css_class: str = "card-img-top"):
+    """``<picture>`` с WebP/JPEG-миниатюрами; без миниатюр — исходное фото."""
+    image = equipment.image
+    widths = sorted(equipment.image_thumbnails or []) if image else []
+    storage = image.storage if image else None
+
+    def srcset(fmt: str) -> str:
+        return ", ".join(
+            f"{storage.url(thumbnail_name(image.name, width, fmt))} {width}w" for width in widths
+        )
+
+    return {
+        "image": image,
+        "alt": equipment.name,
+        "sizes": sizes,
+        "css_class": css_class,
+        "webp_srcset": srcset("webp") if widths else "",
+        "jpeg_srcset": srcset("jpeg") if widths else "",
+        "src": storage.url(thumbnail_name(image.name, widths[-1], "jpeg")) if widths else "",
+    }
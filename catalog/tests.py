@@ -1,9 +1,69 @@
+import base64
+import csv
+import hashlib
+import json
+import marshal
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.core.exceptions import ValidationError
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.http import HttpResponse
+from PIL import Image
 
-from .models import Equipment, EquipmentType, Site, Workshop
+from . import (
+    attributes,
+    benchmark,
+    cart,
+    extraction,
+    facets,
+    fragments,
+    images,
+    instrumentation,
+    profiling,
+    reference,
+    response_cache,
+    roles,
+    search,
+    slow_queries,
+    suggest,
+    uploads,
+    versions,
+)
+from .context_processors import catalog_context
+from .middleware import RequestTimingMiddleware
+from .models import (
+    CartItem,
+    Equipment,
+    EquipmentAttribute,
+    EquipmentType,
+    EquipmentTypeClosure,
+    OrderLine,
+    OrderRequest,
+    Passport,
+    PassportText,
+    RequestProfile,
+    PassportUpload,
+    Site,
+    Workshop,
+)
+from .pagination import InvalidCursor, decode_cursor
+from .search import search_equipment
 
 
 class EquipmentModelTests(TestCase):
@@ -61,3 +121,1902 @@ class CatalogViewsTests(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Корзина")
+
+
+class EquipmentSearchTests(TestCase):
+    def setUp(self) -> None:
+        self.site = Site.objects.create(name="Основная")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        self.pump_type = EquipmentType.objects.create(name="Насосы")
+        self.lathe_type = EquipmentType.objects.create(name="Станки")
+        self.pump = Equipment.objects.create(
+            name="Насос центробежный",
+            inventory_number="INV-200",
+            equipment_type=self.pump_type,
+            site=self.site,
+            workshop=self.workshop,
+        )
+        self.lathe = Equipment.objects.create(
+            name="Станок токарный",
+            inventory_number="INV-300",
+            equipment_type=self.lathe_type,
+            site=self.site,
+            workshop=self.workshop,
+            description="Для обработки валов насосов",
+        )
+
+    def test_search_uses_stemming_and_relevance(self):
+        result = list(search_equipment(Equipment.objects.all(), "насосы"))
+        self.assertEqual(result, [self.pump, self.lathe])
+
+    def test_search_by_inventory_number_prefix(self):
+        result = list(search_equipment(Equipment.objects.all(), "INV-3"))
+        self.assertEqual(result, [self.lathe])
+
+    def test_index_follows_save_and_delete(self):
+        self.pump.name = "Компрессор"
+        self.pump.save()
+        result = search_equipment(Equipment.objects.all(), "компрессоры")
+        self.assertEqual(list(result), [self.pump])
+        self.pump.delete()
+        self.assertFalse(search_equipment(Equipment.objects.all(), "компрессор").exists())
+
+    def test_type_rename_reindexes_equipment(self):
+        self.lathe_type.name = "Фрезерные"
+        self.lathe_type.save()
+        self.assertEqual(list(search_equipment(Equipment.objects.all(), "фрезерный")), [self.lathe])
+
+    def test_type_save_reindexes_only_on_name_or_schema_change(self):
+        with mock.patch.object(search, "index_equipment") as index, \
+                mock.patch.object(attributes, "rebuild_attributes") as rebuild:
+            self.lathe_type.save()
+            index.assert_not_called()
+            rebuild.assert_not_called()
+
+            self.lathe_type.default_attributes = [{"name": "power", "type": "number"}]
+            self.lathe_type.save()
+            index.assert_not_called()
+            rebuild.assert_called_once()
+
+            self.lathe_type.name = "Фрезерные"
+            self.lathe_type.save()
+            index.assert_called_once()
+            rebuild.assert_called_once()
+
+    def test_list_view_and_api_use_index(self):
+        response = self.client.get(reverse("catalog:equipment_list"), {"query": "токарные"})
+        self.assertContains(response, self.lathe.name)
+        self.assertNotContains(response, self.pump.name)
+        response = self.client.get("/api/equipment/", {"search": "центробежные"})
+        ids = [row["id"] for row in response.json()["results"]]
+        self.assertEqual(ids, [self.pump.pk])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            search.get_backend().clear(cursor)
+        call_command("rebuild_search_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(search_equipment(Equipment.objects.all(), "станок").get(), self.lathe)
+
+
+class EquipmentAttributeIndexTests(TestCase):
+    def setUp(self) -> None:
+        self.site = Site.objects.create(name="Основная")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        self.eq_type = EquipmentType.objects.create(name="Насос")
+        self.pump = Equipment.objects.create(
+            name="Насос 1",
+            inventory_number="INV-1",
+            equipment_type=self.eq_type,
+            site=self.site,
+            workshop=self.workshop,
+            attributes={"power": 55, "brand": "Grundfos"},
+        )
+        self.other = Equipment.objects.create(
+            name="Насос 2",
+            inventory_number="INV-2",
+            equipment_type=self.eq_type,
+            site=self.site,
+            workshop=self.workshop,
+            attributes={"power": 30, "brand": "Grundfos"},
+        )
+
+    def test_rows_follow_attributes(self):
+        rows = dict(self.pump.attribute_values.values_list("key", "value_number"))
+        self.assertEqual(rows, {"power": 55.0, "brand": None})
+        self.pump.attributes = {"brand": "Wilo"}
+        self.pump.save()
+        self.assertEqual(
+            list(self.pump.attribute_values.values_list("key", "value_text")),
+            [("brand", "Wilo")],
+        )
+
+    def test_multiple_pairs_filter_api_and_list(self):
+        params = (
+            "attribute_key=brand&attribute_value=Grundfos"
+            "&attribute_key=power&attribute_value=55"
+        )
+        response = self.client.get(f"/api/equipment/?{params}")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.pump.pk])
+        response = self.client.get(f"{reverse('catalog:equipment_list')}?{params}")
+        self.assertContains(response, "Насос 1")
+        self.assertNotContains(response, "Насос 2")
+
+    def test_backfill_command(self):
+        EquipmentAttribute.objects.all().delete()
+        call_command("rebuild_attribute_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(EquipmentAttribute.objects.count(), 4)
+
+
+class TypedAttributeTests(TestCase):
+    def setUp(self) -> None:
+        self.site = Site.objects.create(name="Основная")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        self.eq_type = EquipmentType.objects.create(
+            name="Насос",
+            default_attributes=[
+                {"name": "power", "type": "number", "unit": "кВт"},
+                {"name": "material", "type": "enum", "choices": ["сталь", "чугун"]},
+                "brand",
+            ],
+        )
+        self.items = [
+            Equipment.objects.create(
+                name=f"Насос {power}",
+                inventory_number=f"INV-{power}",
+                equipment_type=self.eq_type,
+                site=self.site,
+                workshop=self.workshop,
+                attributes={"power": value},
+            )
+            for power, value in ((30, 30), (55, "55 кВт"), (75, "75,0"))
+        ]
+
+    def test_numbers_are_coerced(self):
+        values = EquipmentAttribute.objects.order_by("value_number").values_list(
+            "value_number", flat=True
+        )
+        self.assertEqual(list(values), [30.0, 55.0, 75.0])
+
+    def test_schema_validation(self):
+        equipment = self.items[0]
+        equipment.attributes = {"power": "много", "material": "дерево"}
+        with self.assertRaises(ValidationError) as ctx:
+            equipment.clean()
+        self.assertEqual(len(ctx.exception.message_dict["attributes"]), 2)
+        bad_type = EquipmentType(name="Плохой", default_attributes=[{"type": "number"}])
+        with self.assertRaises(ValidationError):
+            bad_type.clean()
+
+    def test_range_filters(self):
+        response = self.client.get("/api/equipment/?attr[power__gte]=55")
+        self.assertEqual(
+            {row["id"] for row in response.json()["results"]},
+            {self.items[1].pk, self.items[2].pk},
+        )
+        response = self.client.get("/api/equipment/?attr[power__gt]=30&attr[power__lte]=60")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.items[1].pk])
+        response = self.client.get("/api/equipment/?attr[power__gte]=abc")
+        self.assertEqual(response.status_code, 400)
+
+    def test_exact_number_compares_values(self):
+        # "55 кВт" и "75,0" хранятся текстом как есть, но по схеме это числа
+        cases = (("55", self.items[1]), ("75", self.items[2]), ("55.0", self.items[1]))
+        for raw, expected in cases:
+            response = self.client.get("/api/equipment/", {"attr[power]": raw})
+            self.assertEqual([row["id"] for row in response.json()["results"]], [expected.pk])
+        response = self.client.get(reverse("catalog:equipment_list"), {"attr[power]": "75"})
+        self.assertEqual(list(response.context["object_list"]), [self.items[2]])
+        response = self.client.get("/api/equipment/", {"attr[power]": "много"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_page_range(self):
+        response = self.client.get(
+            reverse("catalog:equipment_list"),
+            {"attribute_key": "power", "attribute_min": "40", "attribute_max": "60"},
+        )
+        self.assertEqual(list(response.context["object_list"]), [self.items[1]])
+
+
+class EquipmentPaginationTests(TestCase):
+    def setUp(self) -> None:
+        site = Site.objects.create(name="Основная")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        # Одинаковые имена проверяют разбиение «ничьих» по id
+        self.items = [
+            Equipment.objects.create(
+                name=f"Насос {index // 2}",
+                inventory_number=f"INV-{index:03d}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            for index in range(7)
+        ]
+
+    def walk(self, url):
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn("count", data)
+            seen.extend(row["id"] for row in data["results"])
+            url = data["next"]
+        return seen
+
+    def test_cursor_walks_whole_catalog(self):
+        seen = self.walk("/api/equipment/?pagination=cursor&page_size=3")
+        self.assertEqual(seen, [item.pk for item in self.items])
+        seen = self.walk("/api/equipment/?pagination=cursor&page_size=2&ordering=-updated_at")
+        self.assertEqual(seen, [item.pk for item in reversed(self.items)])
+
+    def test_cursor_previous_link(self):
+        first = self.client.get("/api/equipment/?pagination=cursor&page_size=3").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertEqual(self.client.get("/api/equipment/?cursor=garbage").status_code, 404)
+
+    def test_crafted_cursor_is_rejected(self):
+        for payload in ({"o": 1, "v": "a", "pk": 1}, {"o": "name", "v": None, "pk": 1},
+                        {"o": "name", "v": ["a"], "pk": 1}, ["name"]):
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor, Equipment)
+            response = self.client.get("/api/equipment/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404, payload)
+
+    def test_count_modes(self):
+        data = self.client.get("/api/equipment/?count=none&page=2&page_size=5").json()
+        self.assertNotIn("count", data)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIsNone(data["next"])
+        data = self.client.get("/api/equipment/?count=estimate").json()
+        self.assertEqual((data["count"], data["count_estimated"]), (7, False))
+        self.assertEqual(self.client.get("/api/equipment/").json()["count"], 7)
+
+    def test_list_page_cursor_mode(self):
+        url = reverse("catalog:equipment_list")
+        response = self.client.get(url, {"pagination": "cursor", "query": "насос"})
+        page = response.context["page_obj"]
+        self.assertEqual(len(page.object_list), 7)
+        self.assertFalse(page.has_next)
+        self.assertIsNone(response.context["paginator"])
+        self.assertIn("pagination=cursor", response.context["page_query"])
+        self.assertNotIn("cursor=", response.context["page_query"].replace("pagination=cursor", ""))
+
+
+class EquipmentTypeTreeTests(TestCase):
+    def setUp(self) -> None:
+        self.site = Site.objects.create(name="Основная")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        self.pumps = EquipmentType.objects.create(name="Насосы")
+        self.centrifugal = EquipmentType.objects.create(name="Центробежные", parent=self.pumps)
+        self.multistage = EquipmentType.objects.create(
+            name="Многоступенчатые", parent=self.centrifugal
+        )
+        self.lathes = EquipmentType.objects.create(name="Станки")
+        for index, eq_type in enumerate((self.pumps, self.multistage, self.lathes)):
+            Equipment.objects.create(
+                name=f"Единица {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=self.site,
+                workshop=self.workshop,
+            )
+
+    def subtree(self, eq_type):
+        return set(
+            EquipmentTypeClosure.objects.filter(ancestor=eq_type).values_list(
+                "descendant_id", flat=True
+            )
+        )
+
+    def test_move_and_delete_keep_closure_consistent(self):
+        self.assertEqual(
+            self.subtree(self.pumps), {self.pumps.pk, self.centrifugal.pk, self.multistage.pk}
+        )
+        self.centrifugal.parent = self.lathes
+        self.centrifugal.save()
+        self.assertEqual(self.subtree(self.pumps), {self.pumps.pk})
+        self.assertEqual(
+            self.subtree(self.lathes),
+            {self.lathes.pk, self.centrifugal.pk, self.multistage.pk},
+        )
+        depth = EquipmentTypeClosure.objects.get(
+            ancestor=self.lathes, descendant=self.multistage
+        ).depth
+        self.assertEqual(depth, 2)
+
+        self.centrifugal.delete()
+        self.assertEqual(self.subtree(self.lathes), {self.lathes.pk})
+        self.assertEqual(
+            list(EquipmentTypeClosure.objects.filter(descendant=self.multistage).values_list(
+                "ancestor_id", flat=True
+            )),
+            [self.multistage.pk],
+        )
+
+    def test_cycle_is_rejected(self):
+        self.pumps.parent = self.multistage
+        with self.assertRaises(ValidationError):
+            self.pumps.clean()
+
+    def test_cycle_is_rejected_by_api(self):
+        user = get_user_model().objects.create_user("editor", password="password123")
+        self.client.force_login(user)
+        response = self.client.patch(
+            f"/api/equipment-types/{self.pumps.pk}/",
+            {"parent": self.multistage.pk},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("parent", response.json())
+        self.pumps.refresh_from_db()
+        self.assertIsNone(self.pumps.parent_id)
+        self.assertEqual(
+            self.subtree(self.pumps), {self.pumps.pk, self.centrifugal.pk, self.multistage.pk}
+        )
+
+    def test_descendants_filter(self):
+        response = self.client.get(
+            "/api/equipment/", {"equipment_type__descendants_of": self.pumps.pk}
+        )
+        self.assertEqual(
+            sorted(row["name"] for row in response.json()["results"]),
+            ["Единица 0", "Единица 1"],
+        )
+        response = self.client.get(
+            reverse("catalog:equipment_list"),
+            {"equipment_type": self.centrifugal.pk, "include_subtypes": "on"},
+        )
+        self.assertEqual([item.name for item in response.context["object_list"]], ["Единица 1"])
+
+    def test_tree_endpoint_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/equipment-types/tree/").json()
+        pumps = next(node for node in data if node["id"] == self.pumps.pk)
+        self.assertEqual((pumps["equipment_count"], pumps["subtree_equipment_count"]), (1, 2))
+        centrifugal = pumps["children"][0]
+        self.assertEqual(centrifugal["children"][0]["id"], self.multistage.pk)
+
+
+class SellerRoleTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = get_user_model().objects.create_user("seller", password="password123")
+        self.group, _ = Group.objects.get_or_create(name="seller")
+
+    def test_role_is_memoized_and_invalidated(self):
+        user = get_user_model().objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertFalse(roles.is_seller(user))
+            self.assertFalse(roles.can_add_equipment(user))
+        fresh = get_user_model().objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(roles.is_seller(fresh))
+
+        self.user.groups.add(self.group)
+        fresh = get_user_model().objects.get(pk=self.user.pk)
+        self.assertTrue(roles.is_seller(fresh))
+        self.group.user_set.remove(self.user)
+        fresh = get_user_model().objects.get(pk=self.user.pk)
+        self.assertFalse(roles.is_seller(fresh))
+
+    def test_single_group_query_per_page(self):
+        self.user.groups.add(self.group)
+        self.client.login(username="seller", password="password123")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("catalog:equipment_list"))
+        self.assertContains(response, "Добавить оборудование")
+        group_queries = [q for q in ctx.captured_queries if "auth_group" in q["sql"]]
+        self.assertLessEqual(len(group_queries), 1)
+
+
+class CartCountTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        site = Site.objects.create(name="Основная")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Станок")
+        self.equipment = Equipment.objects.create(
+            name="Станок 1",
+            inventory_number="INV-100",
+            equipment_type=eq_type,
+            site=site,
+            workshop=workshop,
+        )
+        self.user = get_user_model().objects.create_user("buyer", password="password123")
+        self.client.login(username="buyer", password="password123")
+
+    def test_count_is_cached_and_invalidated(self):
+        self.assertEqual(cart.cart_count(self.user.pk), 0)
+        item = CartItem.objects.create(user=self.user, equipment=self.equipment)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.cart_count(self.user.pk), 1)
+            self.assertEqual(cart.cart_count(self.user.pk), 1)
+        item.delete()
+        self.assertEqual(cart.cart_count(self.user.pk), 0)
+
+    def test_count_not_queried_when_unused(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        with CaptureQueriesContext(connection) as ctx:
+            context = catalog_context(request)
+        self.assertFalse([q for q in ctx.captured_queries if "catalog_cartitem" in q["sql"]])
+        with self.assertNumQueries(1):
+            self.assertEqual(context["cart_count"], 0)
+
+    def test_checkout_resets_badge(self):
+        CartItem.objects.create(user=self.user, equipment=self.equipment)
+        self.assertEqual(cart.cart_count(self.user.pk), 1)
+        self.client.post(
+            reverse("catalog:checkout"),
+            {"name": "Покупатель", "email": "buyer@example.com"},
+        )
+        self.assertEqual(cart.cart_count(self.user.pk), 0)
+
+
+class ImportEquipmentCommandTests(TestCase):
+    def setUp(self) -> None:
+        self.site = Site.objects.create(name="Основная")
+        self.other_site = Site.objects.create(name="Северная")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        Workshop.objects.create(site=self.other_site, name="Цех 2")
+        self.eq_type = EquipmentType.objects.create(
+            name="Насос", default_attributes=[{"name": "power", "type": "number"}]
+        )
+        Equipment.objects.create(
+            name="Старое имя",
+            inventory_number="INV-1",
+            equipment_type=self.eq_type,
+            site=self.site,
+            workshop=self.workshop,
+        )
+
+    def run_import(self, content: str, suffix: str = ".csv") -> str:
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8") as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_equipment", f.name, batch_size=2, stdout=out, stderr=err)
+        return out.getvalue() + err.getvalue()
+
+    def test_csv_upsert_and_rejects(self):
+        output = self.run_import(
+            "inventory_number,name,equipment_type,site,workshop,description,attributes\n"
+            'INV-1,Насос 1,Насос,Основная,Цех 1,,"{""power"": ""55 кВт""}"\n'
+            "INV-2,Насос 2,Насос,Основная,Цех 1,,\n"
+            "INV-3,Насос 3,Насос,Основная,Цех 2,,\n"
+            "INV-4,Насос 4,Компрессор,Основная,Цех 1,,\n"
+        )
+        self.assertIn("создано: 1, обновлено: 1, без изменений: 0, отклонено: 2", output)
+        self.assertIn("Цех должен принадлежать выбранной площадке", output)
+        updated = Equipment.objects.get(inventory_number="INV-1")
+        self.assertEqual(updated.name, "Насос 1")
+        self.assertEqual(updated.attribute_values.get().value_number, 55.0)
+        found = search_equipment(Equipment.objects.all(), "насос 2").get()
+        self.assertEqual(found.inventory_number, "INV-2")
+
+    def test_unchanged_rows_are_skipped(self):
+        content = (
+            '{"inventory_number": "INV-5", "name": "Насос 5", "equipment_type": "Насос", '
+            '"site": "Основная", "workshop": "Цех 1", "attributes": {"power": 10}}\n'
+        )
+        self.run_import(content, suffix=".jsonl")
+        output = self.run_import(content, suffix=".jsonl")
+        self.assertIn("создано: 0, обновлено: 0, без изменений: 1", output)
+        item = Equipment.objects.get(inventory_number="INV-5")
+        self.assertEqual(item.content_hash, item.compute_content_hash())
+
+
+class EquipmentExportTests(TestCase):
+    def setUp(self) -> None:
+        site = Site.objects.create(name="Основная")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        for index in range(3):
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+                attributes={"power": index * 10},
+            )
+
+    def test_csv_export_is_flat_and_filtered(self):
+        response = self.client.get(
+            "/api/equipment/export/", {"attr[power__gte]": "10", "ordering": "name"}
+        )
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode("utf-8-sig")
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([row["inventory_number"] for row in rows], ["INV-1", "INV-2"])
+        self.assertEqual(rows[0]["workshop"], "Цех 1")
+        self.assertEqual(json.loads(rows[1]["attributes"]), {"power": 20})
+        self.assertNotIn("passports", rows[0])
+
+    def test_ndjson_export(self):
+        response = self.client.get("/api/equipment/export/", {"export_format": "ndjson"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["equipment_type"], "Насос")
+        self.assertEqual(
+            self.client.get("/api/equipment/export/", {"export_format": "xml"}).status_code, 400
+        )
+
+
+class EquipmentThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, CATALOG_THUMBNAIL_WIDTHS=[320, 640, 1024]
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        site = Site.objects.create(name="Площадка")
+        self.equipment = Equipment.objects.create(
+            name="Насос",
+            inventory_number="INV-1",
+            equipment_type=EquipmentType.objects.create(name="Насос"),
+            site=site,
+            workshop=Workshop.objects.create(site=site, name="Цех"),
+        )
+
+    def upload(self, width=800, height=600):
+        buffer = BytesIO()
+        Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+        return SimpleUploadedFile("pump.png", buffer.getvalue(), content_type="image/png")
+
+    def test_thumbnails_are_built_after_commit(self):
+        self.equipment.image = self.upload()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.equipment.save()
+        # Задача и повторный сдвиг поколения каталога после коммита
+        self.assertEqual(len(callbacks), 2)
+
+        name = self.equipment.image.name
+        widths = images.process_equipment_image(self.equipment.pk, name)
+        self.assertEqual(widths, [320, 640])
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.image_thumbnails, [320, 640])
+        thumb = images.thumbnail_name(name, 320, "webp")
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, thumb)))
+        with Image.open(os.path.join(self.media_root, thumb)) as picture:
+            self.assertEqual(picture.size, (320, 240))
+
+        response = self.client.get(
+            reverse("catalog:equipment_detail", args=[self.equipment.pk])
+        )
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "_640.jpg 640w")
+
+    def test_thumbnail_names_keep_source_extension(self):
+        self.assertEqual(
+            images.thumbnail_name("equipment/pump.jpg", 320, "webp"),
+            "equipment/thumbs/pump_jpg_320.webp",
+        )
+        self.assertNotEqual(
+            images.thumbnail_name("equipment/pump.jpg", 320, "jpeg"),
+            images.thumbnail_name("equipment/pump.png", 320, "jpeg"),
+        )
+
+    def test_replacing_image_resets_thumbnails(self):
+        self.equipment.image = self.upload()
+        self.equipment.save()
+        images.process_equipment_image(self.equipment.pk, self.equipment.image.name)
+        self.equipment.refresh_from_db()
+
+        self.equipment.image = self.upload(width=400, height=400)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.equipment.save()
+        self.assertEqual(self.equipment.image_thumbnails, [])
+        # Задача и повторный сдвиг поколения каталога после коммита
+        self.assertEqual(len(callbacks), 2)
+
+    def test_backfill_command(self):
+        self.equipment.image = self.upload(width=200, height=100)
+        self.equipment.save()
+        out = StringIO()
+        call_command("generate_thumbnails", "--workers", "1", stdout=out)
+        self.assertIn("Миниатюры построены: 1", out.getvalue())
+        self.equipment.refresh_from_db()
+        # Оригинал уже меньше минимальной ширины — миниатюра одна, без увеличения
+        self.assertEqual(self.equipment.image_thumbnails, [320])
+
+
+class PassportUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CATALOG_UPLOAD_TEMP_DIR=os.path.join(self.media_root, "uploads"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(username="u", password="pass12345")
+        self.client.force_login(self.user)
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.first, self.second = [
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            for index in (1, 2)
+        ]
+        self.content = os.urandom(5000)
+
+    def start(self, equipment):
+        response = self.client.post(
+            "/api/passport-uploads/",
+            {"equipment": equipment.pk, "filename": "Manual.PDF", "size": len(self.content)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def send(self, upload_id, offset, data):
+        return self.client.put(
+            f"/api/passport-uploads/{upload_id}/chunk/",
+            data,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def test_chunked_upload_resumes_and_deduplicates(self):
+        digest = hashlib.sha256(self.content).hexdigest()
+        upload_id = self.start(self.first)
+        self.assertEqual(self.send(upload_id, 0, self.content[:2000]).json()["received"], 2000)
+
+        # Повтор части со старого смещения отклоняется с текущим смещением
+        response = self.send(upload_id, 0, self.content[:2000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "2000")
+        resume_at = self.client.get(f"/api/passport-uploads/{upload_id}/").json()["received"]
+        self.send(upload_id, resume_at, self.content[resume_at:])
+
+        # Извлечение текста проверяется отдельно; тут — только уборка временного файла
+        with mock.patch.object(extraction, "schedule_extraction"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/passport-uploads/{upload_id}/complete/", {"sha256": digest}
+            )
+        self.assertEqual(response.status_code, 201)
+        passport = Passport.objects.get(pk=response.json()["id"])
+        self.assertEqual(passport.sha256, digest)
+        self.assertEqual(passport.file.name, uploads.content_name(digest, "manual.pdf"))
+        with passport.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertFalse(PassportUpload.objects.exists())
+        self.assertFalse(os.path.exists(uploads.temp_path(upload_id)))
+
+        # Тот же файл для другого оборудования ссылается на уже сохранённый
+        upload_id = self.start(self.second)
+        self.send(upload_id, 0, self.content)
+        self.client.post(f"/api/passport-uploads/{upload_id}/complete/")
+        names = set(Passport.objects.values_list("file", flat=True))
+        self.assertEqual(names, {passport.file.name})
+        stored_dir = os.path.join(self.media_root, os.path.dirname(passport.file.name))
+        self.assertEqual(len(os.listdir(stored_dir)), 1)
+
+    def test_incomplete_and_corrupted_uploads_are_rejected(self):
+        upload_id = self.start(self.first)
+        self.send(upload_id, 0, self.content[:100])
+        response = self.client.post(f"/api/passport-uploads/{upload_id}/complete/")
+        self.assertEqual(response.status_code, 409)
+
+        self.send(upload_id, 100, self.content[100:])
+        response = self.client.post(
+            f"/api/passport-uploads/{upload_id}/complete/", {"sha256": "0" * 64}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PassportUpload.objects.get(pk=upload_id).received, 0)
+        self.assertFalse(Passport.objects.exists())
+
+        other = get_user_model().objects.create_user(username="other", password="pass12345")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"/api/passport-uploads/{upload_id}/").status_code, 404)
+
+    def test_part_being_written_is_not_written_twice(self):
+        upload_id = self.start(self.first)
+        with uploads.open_part(upload_id) as target:
+            self.assertIsNotNone(target)
+            response = self.send(upload_id, 0, self.content[:100])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(PassportUpload.objects.get(pk=upload_id).received, 0)
+        self.assertEqual(self.send(upload_id, 0, self.content[:100]).json()["received"], 100)
+
+    def test_form_upload_is_content_addressed(self):
+        upload = SimpleUploadedFile("scan.pdf", self.content, content_type="application/pdf")
+        passport = Passport.objects.create(equipment=self.first, file=upload)
+        self.assertEqual(passport.size, len(self.content))
+        self.assertTrue(passport.file.name.startswith(uploads.CONTENT_PREFIX))
+
+
+class PassportTextSearchTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.first, self.second = [
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            for index in (1, 2)
+        ]
+
+    def pdf(self, text):
+        stream = zlib.compress(f"BT /F1 12 Tf ({text}) Tj ET".encode("latin-1"))
+        return (
+            b"%%PDF-1.4\n4 0 obj << /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+            + stream
+            + b"\nendstream\nendobj\n%%EOF\n"
+        )
+
+    def found(self, query):
+        return list(search_equipment(Equipment.objects.all(), query))
+
+    def test_passport_text_is_extracted_after_commit_and_searchable(self):
+        upload = SimpleUploadedFile("manual.pdf", self.pdf("Impeller PN-4471X, seal kit"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            passport = Passport.objects.create(equipment=self.first, file=upload)
+        # Задача и повторный сдвиг поколения каталога после коммита
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(self.found("4471x"), [])
+
+        text = extraction.process_passport(passport)
+        self.assertIn("PN-4471X", text)
+        self.assertEqual(self.found("4471x"), [self.first])
+        stored = PassportText.objects.get(sha256=passport.sha256)
+        self.assertEqual(extraction.decompress(stored.content), text)
+
+        # Тот же файл у другого оборудования: текст уже есть, индекс обновляется сразу
+        same = SimpleUploadedFile("copy.pdf", self.pdf("Impeller PN-4471X, seal kit"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Passport.objects.create(equipment=self.second, file=same)
+        # Только повторный сдвиг поколения каталога: разбор не запускается
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.found("4471x"), [self.first, self.second])
+
+        passport.delete()
+        self.assertEqual(self.found("4471x"), [self.second])
+
+    def test_extraction_command(self):
+        upload = SimpleUploadedFile("notes.txt", "Подшипник SKF-6205 заменён".encode())
+        Passport.objects.create(equipment=self.first, file=upload)
+        out = StringIO()
+        call_command("extract_passport_texts", "--workers", "1", stdout=out)
+        self.assertIn("Обработано паспортов: 1", out.getvalue())
+        self.assertEqual(self.found("skf 6205"), [self.first])
+        self.assertEqual(self.found("подшипники"), [self.first])
+
+
+class EquipmentSparseFieldsTests(TestCase):
+    def setUp(self):
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        for index in range(3):
+            equipment = Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            Passport.objects.create(equipment=equipment, file=f"passports/{index}.txt")
+        self.equipment = equipment
+        # Снимок справочников процесс читает один раз, а не на каждый запрос
+        reference.snapshot()
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/equipment/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"], [query["sql"] for query in queries]
+
+    def test_list_is_flat_by_default(self):
+        rows, queries = self.get({"count": "none"})
+        self.assertEqual(rows[0]["equipment_type"], self.equipment.equipment_type_id)
+        self.assertEqual(rows[0]["site_name"], "Площадка")
+        self.assertNotIn("passports", rows[0])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("catalog_passport", queries[0])
+        # Названия связей — из снимка справочников, без JOIN
+        self.assertNotIn("JOIN", queries[0])
+
+    def test_fields_prune_columns_and_joins(self):
+        rows, queries = self.get({"count": "none", "fields": "id,name"})
+        self.assertEqual(set(rows[0]), {"id", "name"})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("JOIN", queries[0])
+        self.assertNotIn("description", queries[0])
+
+    def test_expand_nests_relations(self):
+        rows, queries = self.get(
+            {"count": "none", "fields": "id,site_name", "expand": "workshop,passports"}
+        )
+        self.assertEqual(set(rows[0]), {"id", "site_name", "workshop", "passports"})
+        self.assertEqual(rows[0]["workshop"]["name"], "Цех")
+        self.assertEqual(len(rows[0]["passports"]), 1)
+        self.assertEqual(len(queries), 2)
+
+    def test_unknown_fields_and_detail_fields(self):
+        response = self.client.get("/api/equipment/", {"expand": "created_by"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            f"/api/equipment/{self.equipment.pk}/", {"fields": "id,equipment_type"}
+        )
+        self.assertEqual(set(response.json()), {"id", "equipment_type"})
+        self.assertEqual(response.json()["equipment_type"]["name"], "Насос")
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=self.site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.equipment = Equipment.objects.create(
+            name="Насос 1",
+            inventory_number="INV-1",
+            equipment_type=eq_type,
+            site=self.site,
+            workshop=workshop,
+        )
+        self.detail_url = reverse("catalog:equipment_detail", args=[self.equipment.pk])
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, headers={"If-None-Match": response["ETag"]})
+
+    def test_detail_page_returns_304_until_changed(self):
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("public", first["Cache-Control"])
+        self.assertIn("no-cache", first["Cache-Control"])
+        self.assertIn("Cookie", first["Vary"])
+        self.assertIn("Last-Modified", first)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.revalidate(self.detail_url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(len(queries), 1)
+
+        # Переименование площадки меняет версию справочников
+        self.site.name = "Площадка 2"
+        self.site.save()
+        self.assertEqual(self.revalidate(self.detail_url, first).status_code, 200)
+
+        second = self.client.get(self.detail_url)
+        Passport.objects.create(equipment=self.equipment, file="passports/a.txt")
+        self.assertEqual(self.revalidate(self.detail_url, second).status_code, 200)
+
+    def test_detail_page_is_private_for_users(self):
+        user = get_user_model().objects.create_user(username="u", password="pass12345")
+        self.client.force_login(user)
+        first = self.client.get(self.detail_url)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertEqual(self.revalidate(self.detail_url, first).status_code, 304)
+
+        CartItem.objects.create(user=user, equipment=self.equipment)
+        # Значок корзины в навигации изменился — страница тоже
+        self.assertEqual(self.revalidate(self.detail_url, first).status_code, 200)
+
+    def test_api_list_and_retrieve(self):
+        first = self.client.get("/api/equipment/", {"count": "none"})
+        self.assertIn("Accept", first["Vary"])
+        with CaptureQueriesContext(connection) as queries:
+            second = self.revalidate("/api/equipment/", first, count="none")
+        self.assertEqual(second.status_code, 304)
+        # Валидаторы анонимного списка берутся из кэша ответов
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.revalidate("/api/equipment/", first).status_code, 200)
+
+        Equipment.objects.create(
+            name="Насос 2",
+            inventory_number="INV-2",
+            equipment_type=self.equipment.equipment_type,
+            site=self.site,
+            workshop=self.equipment.workshop,
+        )
+        self.assertEqual(self.revalidate("/api/equipment/", first, count="none").status_code, 200)
+
+        url = f"/api/equipment/{self.equipment.pk}/"
+        detail = self.client.get(url)
+        self.assertEqual(self.revalidate(url, detail).status_code, 304)
+        self.equipment.save()
+        self.assertEqual(self.revalidate(url, detail).status_code, 200)
+
+    def test_api_detail_non_numeric_id_is_not_found(self):
+        self.assertEqual(self.client.get("/api/equipment/abc/").status_code, 404)
+        self.assertEqual(self.client.get("/api/equipment/10000000/").status_code, 404)
+
+    def test_api_list_validators_skip_aggregate(self):
+        user = get_user_model().objects.create_user(username="u", password="pass12345")
+        self.client.force_login(user)
+        first = self.client.get("/api/equipment/", {"count": "none", "site": self.site.pk})
+        self.assertNotIn("Last-Modified", first)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.revalidate(
+                "/api/equipment/", first, site=self.site.pk, count="none"
+            )
+        self.assertEqual(second.status_code, 304)
+        # Порядок параметров не важен, агрегата по выборке нет
+        self.assertFalse([query for query in queries if "MAX(" in query["sql"]])
+
+        self.equipment.description = "Новое описание"
+        self.equipment.save()
+        self.assertEqual(
+            self.revalidate("/api/equipment/", first, count="none", site=self.site.pk).status_code,
+            200,
+        )
+
+    @override_settings(CATALOG_LIST_ETAG_TTL=60)
+    def test_api_list_etag_expires_with_ttl_bucket(self):
+        # Поколение, увеличенное в другом процессе, здесь не видно: ETag меняет только интервал
+        with mock.patch("catalog.conditional.time.time", return_value=6000.0):
+            first = self.client.get("/api/equipment/")
+            self.assertEqual(self.revalidate("/api/equipment/", first).status_code, 304)
+        with mock.patch("catalog.conditional.time.time", return_value=6060.0):
+            self.assertEqual(self.revalidate("/api/equipment/", first).status_code, 200)
+
+    def test_catalog_generation_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.equipment.save()
+        generation = versions.get_version(versions.CATALOG)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(versions.get_version(versions.CATALOG), generation)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        site = Site.objects.create(name="Площадка")
+        self.workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.equipment = Equipment.objects.create(
+            name="Насос 1",
+            inventory_number="INV-1",
+            equipment_type=eq_type,
+            site=site,
+            workshop=self.workshop,
+        )
+
+    def test_anonymous_list_is_cached_until_catalog_changes(self):
+        url = reverse("catalog:equipment_list")
+        self.assertContains(self.client.get(url, {"query": "", "site": "Площадка"}), "Насос 1")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url + "?site=Площадка&workshop=")
+        self.assertContains(response, "Насос 1")
+        self.assertEqual(len(queries), 0)
+
+        self.equipment.name = "Насос 2"
+        self.equipment.save()
+        self.assertContains(self.client.get(url, {"site": "Площадка"}), "Насос 2")
+
+        # Переименование цеха тоже меняет поколение каталога
+        self.workshop.name = "Цех 7"
+        self.workshop.save()
+        self.assertContains(self.client.get(url, {"site": "Площадка"}), "Цех 7")
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.get("/api/equipment/")
+        user = get_user_model().objects.create_user(username="u", password="pass12345")
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/equipment/")
+        self.assertTrue(any("catalog_equipment" in query["sql"] for query in queries))
+
+    def test_single_flight(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        key = "catalog:response:test:key"
+        self.assertEqual(response_cache.get_or_build(key, build), 1)
+        self.assertEqual(response_cache.get_or_build(key, build), 1)
+
+        # Поколение сменилось, а ключ уже пересчитывает другой процесс: отдаётся старое
+        self.equipment.save()
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(response_cache.get_or_build(key, build), 1)
+        self.assertEqual(len(calls), 1)
+        cache.delete(f"{key}:lock")
+        self.assertEqual(response_cache.get_or_build(key, build), 2)
+
+
+class EquipmentCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=self.site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.items = [
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=self.site,
+                workshop=workshop,
+            )
+            for index in range(3)
+        ]
+        # Вошедшим пользователям страница не кэшируется целиком — проверяем карточки
+        user = get_user_model().objects.create_user(username="u", password="pass12345")
+        self.client.force_login(user)
+
+    def render(self):
+        fragments.reset_stats()
+        response = self.client.get(reverse("catalog:equipment_list"))
+        self.assertEqual(response.status_code, 200)
+        return response, fragments.stats()
+
+    def test_only_changed_cards_are_rerendered(self):
+        self.assertEqual(self.render()[1], {"hits": 0, "misses": 3})
+        self.assertEqual(self.render()[1], {"hits": 3, "misses": 0})
+
+        self.items[1].name = "Насос обновлённый"
+        self.items[1].save()
+        response, counters = self.render()
+        self.assertEqual(counters, {"hits": 2, "misses": 1})
+        self.assertContains(response, "Насос обновлённый")
+
+        self.site.name = "Площадка 2"
+        self.site.save()
+        response, counters = self.render()
+        self.assertEqual(counters, {"hits": 0, "misses": 3})
+        self.assertContains(response, "Площадка 2 / Площадка 2: Цех", count=3)
+
+    def test_stats_command(self):
+        self.render()
+        out = StringIO()
+        call_command("fragment_cache_stats", "--reset", stdout=out)
+        self.assertIn("промахов 3", out.getvalue())
+        self.assertEqual(fragments.stats(), {"hits": 0, "misses": 0})
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="buyer", password="pass12345")
+        self.client.force_login(self.user)
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.items = [
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            for index in range(2)
+        ]
+        for equipment in self.items:
+            CartItem.objects.create(user=self.user, equipment=equipment, quantity=2)
+
+    def test_double_submit_creates_one_order(self):
+        key = self.client.get(reverse("catalog:checkout")).context[
+            "checkout_form"
+        ].initial["idempotency_key"]
+        data = {"name": "Покупатель", "email": "buyer@example.com", "idempotency_key": key}
+        self.client.post(reverse("catalog:checkout"), data)
+        response = self.client.post(reverse("catalog:checkout"), data, follow=True)
+        self.assertContains(response, "Эта заявка уже отправлена.")
+
+        order = OrderRequest.objects.get()
+        self.assertEqual(order.idempotency_key, key)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        lines = OrderLine.objects.filter(equipment=self.items[0])
+        self.assertEqual(list(lines.values_list("order", "quantity")), [(order.pk, 2)])
+        self.assertEqual(order.items[1]["equipment"], "Насос 0 (INV-0)")
+        self.assertEqual(order.items[1]["workshop"], "Площадка: Цех")
+
+    def test_api_checkout_is_idempotent(self):
+        headers = {"Idempotency-Key": "k-1"}
+        data = {"name": "Покупатель", "email": "buyer@example.com"}
+        first = self.client.post("/api/cart/checkout/", data, headers=headers)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(len(first.json()["lines"]), 2)
+        second = self.client.post("/api/cart/checkout/", data, headers=headers)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        # Без ключа пустая корзина — ошибка, а не пустая заявка
+        self.assertEqual(self.client.post("/api/cart/checkout/", data).status_code, 400)
+
+        staff = get_user_model().objects.create_user(
+            username="staff", password="pass12345", is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get(f"/api/equipment/{self.items[0].pk}/orders/")
+        self.assertEqual(response.json()["results"][0]["order"], first.json()["id"])
+        # Параметры курсора списка оборудования к позициям заявок не относятся
+        for params in ({"pagination": "cursor"},
+                       {"pagination": "cursor", "ordering": "updated_at"}):
+            response = self.client.get(f"/api/equipment/{self.items[0].pk}/orders/", params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["results"][0]["order"], first.json()["id"])
+        self.client.force_login(self.user)
+        response = self.client.get(f"/api/equipment/{self.items[0].pk}/orders/")
+        self.assertEqual(response.status_code, 403)
+
+
+class CartUpsertTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="buyer", password="pass12345")
+        self.client.force_login(self.user)
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.items = [
+            Equipment.objects.create(
+                name=f"Насос {index}",
+                inventory_number=f"INV-{index}",
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+            for index in range(3)
+        ]
+
+    def test_add_increments_in_one_statement(self):
+        equipment = self.items[0]
+        self.assertTrue(cart.add_item(self.user.pk, equipment.pk, 2))
+        self.assertEqual(cart.cart_count(self.user.pk), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(cart.add_item(self.user.pk, equipment.pk, 3))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(CartItem.objects.get(user=self.user, equipment=equipment).quantity, 5)
+        self.assertFalse(cart.add_item(self.user.pk, 10**6))
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+    def test_view_returns_404_for_missing_equipment(self):
+        url = reverse("catalog:add_to_cart", args=[self.items[1].pk])
+        self.client.post(url, {"quantity": "2"})
+        self.client.post(url, {"quantity": "1"})
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 3)
+        response = self.client.post(reverse("catalog:add_to_cart", args=[10**6]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_fold_changes_keeps_order(self):
+        changes = cart.fold_changes([
+            ("set", 1, 4), ("add", 1, 1),
+            ("remove", 2, 0), ("add", 2, 3),
+            ("add", 3, 1), ("set", 3, 0),
+        ])
+        self.assertEqual(changes, {1: ("set", 5), 2: ("set", 3), 3: ("remove", 0)})
+
+    def test_batch_api(self):
+        first, second, third = self.items
+        CartItem.objects.create(user=self.user, equipment=first, quantity=2)
+        CartItem.objects.create(user=self.user, equipment=third, quantity=1)
+        cart.cart_count(self.user.pk)
+        payload = {"items": [
+            {"equipment": first.pk, "quantity": 3},
+            {"op": "set", "equipment": second.pk, "quantity": 7},
+            {"op": "remove", "equipment": third.pk},
+        ]}
+        response = self.client.post("/api/cart/batch/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["applied"], {"add": 1, "set": 1, "remove": 1})
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list("equipment", "quantity")),
+            {first.pk: 5, second.pk: 7},
+        )
+        self.assertEqual(len(response.json()["items"]), 2)
+        self.assertEqual(cart.cart_count(self.user.pk), 2)
+
+    def test_batch_is_all_or_nothing(self):
+        payload = {"items": [
+            {"equipment": self.items[0].pk},
+            {"equipment": 10**6, "quantity": 2},
+        ]}
+        response = self.client.post("/api/cart/batch/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        site = Site.objects.create(name="Север")
+        other_site = Site.objects.create(name="Юг")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        other_workshop = Workshop.objects.create(site=other_site, name="Цех 2")
+        self.pump = EquipmentType.objects.create(name="Насос")
+        motor = EquipmentType.objects.create(name="Двигатель")
+        rows = [
+            (self.pump, site, workshop, "Grundfos"),
+            (self.pump, site, workshop, "Wilo"),
+            (self.pump, other_site, other_workshop, "Grundfos"),
+            (motor, other_site, other_workshop, "Siemens"),
+        ]
+        for index, (eq_type, eq_site, eq_workshop, brand) in enumerate(rows):
+            Equipment.objects.create(
+                name=f"Позиция {index}",
+                inventory_number=f"F-{index}",
+                equipment_type=eq_type,
+                site=eq_site,
+                workshop=eq_workshop,
+                attributes={"brand": brand},
+            )
+
+    def test_counts_follow_filters_in_fixed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/equipment/facets/", {"equipment_type": self.pump.pk, "page": 2}
+            )
+        self.assertEqual(response.status_code, 200)
+        # Проверка id типа в django-filter и четыре GROUP BY
+        self.assertEqual(len(queries), 5)
+        data = response.json()
+        self.assertEqual(
+            [(row["name"], row["count"]) for row in data["site"]], [("Север", 2), ("Юг", 1)]
+        )
+        self.assertEqual(data["workshop"][0]["site"], "Север")
+        self.assertEqual(data["equipment_type"], [
+            {"id": self.pump.pk, "name": "Насос", "count": 3},
+        ])
+        self.assertEqual(data["attributes"], [{"key": "brand", "values": [
+            {"value": "Grundfos", "count": 2}, {"value": "Wilo", "count": 1},
+        ]}])
+
+    def test_cached_until_catalog_changes(self):
+        self.client.get("/api/equipment/facets/")
+        with CaptureQueriesContext(connection) as queries:
+            # Параметры страницы в ключ кэша не входят
+            response = self.client.get("/api/equipment/facets/", {"ordering": "name"})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(sum(row["count"] for row in response.json()["site"]), 4)
+
+        Equipment.objects.filter(name="Позиция 3").get().delete()
+        response = self.client.get("/api/equipment/facets/")
+        self.assertEqual(sum(row["count"] for row in response.json()["site"]), 3)
+
+    def test_attribute_values_are_limited(self):
+        override = override_settings(CATALOG_FACET_ATTRIBUTE_VALUES=1)
+        override.enable()
+        self.addCleanup(override.disable)
+        values = facets.facet_counts(Equipment.objects.all())["attributes"][0]["values"]
+        self.assertEqual(values, [{"value": "Grundfos", "count": 2}])
+
+    def test_list_view_shows_counts(self):
+        response = self.client.get(reverse("catalog:equipment_list"), {"site": "Север"})
+        site_facets = response.context["facets"]["site"]
+        self.assertEqual([(row["name"], row["count"]) for row in site_facets], [("Север", 2)])
+        self.assertIn("site=%D0%A1%D0%B5%D0%B2%D0%B5%D1%80", site_facets[0]["query"])
+        self.assertContains(response, "Grundfos")
+
+    def test_workshop_link_selects_one_site(self):
+        south = Site.objects.get(name="Юг")
+        namesake = Workshop.objects.create(site=south, name="Цех 1")
+        Equipment.objects.create(
+            name="Позиция 4", inventory_number="F-4", equipment_type=self.pump,
+            site=south, workshop=namesake,
+        )
+        url = reverse("catalog:equipment_list")
+        rows = self.client.get(url).context["facets"]["workshop"]
+        north_row = next(row for row in rows if row["site"] == "Север")
+        response = self.client.get(f"{url}?{north_row['query']}")
+        self.assertEqual(
+            sorted(item.name for item in response.context["object_list"]),
+            ["Позиция 0", "Позиция 1"],
+        )
+
+    def test_html_and_api_do_not_share_cache(self):
+        site = Site.objects.get(name="Север")
+        data = self.client.get("/api/equipment/facets/", {"site": site.pk}).json()
+        self.assertEqual(sum(row["count"] for row in data["site"]), 2)
+        # На странице site — часть названия: площадки с id в названии нет
+        response = self.client.get(reverse("catalog:equipment_list"), {"site": site.pk})
+        self.assertEqual(response.context["facets"]["site"], [])
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        site = Site.objects.create(name="Площадка")
+        workshop = Workshop.objects.create(site=site, name="Цех")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        rows = [
+            ("Насос центробежный", "PN-100"),
+            ("Насос вихревой", "PN-101"),
+            ("Задвижка", "ZD-200"),
+            ("Центрифуга", "CF-300"),
+        ]
+        for name, inventory_number in rows:
+            Equipment.objects.create(
+                name=name,
+                inventory_number=inventory_number,
+                equipment_type=eq_type,
+                site=site,
+                workshop=workshop,
+            )
+
+    def test_inventory_prefix_first(self):
+        response = self.client.get("/api/equipment/suggest/", {"q": "pn-10"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["inventory_number"] for row in response.json()], ["PN-100", "PN-101"]
+        )
+        self.assertEqual(set(response.json()[0]), {"id", "name", "inventory_number"})
+
+    def test_name_prefix_fills_remaining_places(self):
+        results = suggest.suggest("центр", limit=5)
+        self.assertEqual({row["name"] for row in results}, {"Насос центробежный", "Центрифуга"})
+        self.assertEqual(suggest.suggest("PN", limit=1)[0]["inventory_number"], "PN-100")
+        self.assertEqual(suggest.suggest("   "), [])
+
+    def test_inventory_prefix_ignores_collation_outside_sqlite(self):
+        # Диапазон верен только при побайтном сравнении строк (SQLite, C-локаль)
+        self.assertEqual(
+            suggest.inventory_prefix("pn", vendor="postgresql"),
+            Q(inventory_number__startswith="pn") | Q(inventory_number__startswith="PN"),
+        )
+        self.assertIn(
+            ("inventory_number__lt", "PO"), suggest.inventory_prefix("PN", vendor="sqlite").children
+        )
+
+    def test_micro_cache_follows_catalog_generation(self):
+        suggest.suggest("ZD")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(suggest.suggest("ZD")), 1)
+        self.assertEqual(len(queries), 0)
+        Equipment.objects.filter(inventory_number="ZD-200").get().delete()
+        self.assertEqual(suggest.suggest("ZD"), [])
+
+    def test_rejects_bad_limit(self):
+        response = self.client.get("/api/equipment/suggest/", {"q": "PN", "limit": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReferenceSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference.reset()
+        self.site = Site.objects.create(name="Север")
+        self.other_site = Site.objects.create(name="Юг")
+        self.workshop = Workshop.objects.create(site=self.site, name="Цех 1")
+        self.pump = EquipmentType.objects.create(
+            name="Насос", default_attributes=[{"name": "power", "type": "number"}]
+        )
+        self.subtype = EquipmentType.objects.create(name="Насос вихревой", parent=self.pump)
+        self.user = get_user_model().objects.create_user(
+            "staff", password="pass12345", is_staff=True
+        )
+        self.client.force_login(self.user)
+
+    def reference_queries(self, queries) -> list[str]:
+        tables = ('FROM "catalog_site"', 'FROM "catalog_workshop"', 'FROM "catalog_equipmenttype"')
+        return [q["sql"] for q in queries if any(table in q["sql"] for table in tables)]
+
+    def test_snapshot_reloads_on_version_change(self):
+        snapshot = reference.snapshot()
+        self.assertEqual(snapshot.workshop_label(self.workshop.pk), "Север: Цех 1")
+        self.assertEqual(set(snapshot.descendants(self.pump.pk)), {self.pump.pk, self.subtype.pk})
+        with self.assertNumQueries(0):
+            self.assertIs(reference.snapshot(), snapshot)
+
+        self.site.name = "Восток"
+        self.site.save()
+        self.assertEqual(reference.snapshot().sites[self.site.pk].name, "Восток")
+        # После очистки кэша версия начинается заново, но не совпадает со старой
+        cache.clear()
+        self.assertIsNot(reference.snapshot(), snapshot)
+
+    def test_api_write_validates_against_snapshot(self):
+        reference.snapshot()
+        data = {
+            "name": "Насос 1",
+            "inventory_number": "R-1",
+            "equipment_type_id": self.pump.pk,
+            "site_id": self.other_site.pk,
+            "workshop_id": self.workshop.pk,
+            "attributes": {"power": "много"},
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/equipment/", data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("workshop", response.json())
+        self.assertEqual(self.reference_queries(queries), [])
+
+        data.update(site_id=self.site.pk, attributes={"power": "55"})
+        response = self.client.post("/api/equipment/", data, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["site"]["name"], "Север")
+
+        data.update(inventory_number="R-2", workshop_id=10**6)
+        response = self.client.post("/api/equipment/", data, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("workshop_id", response.json())
+
+    def test_record_missing_from_snapshot_is_read_from_db(self):
+        # Запись из другого процесса: версия в кэше этого процесса не менялась
+        snapshot = reference.snapshot()
+        [site] = Site.objects.bulk_create([Site(name="Запад")])
+        with self.assertNumQueries(1):
+            self.assertEqual(reference.get("sites", site.pk).name, "Запад")
+        self.assertIsNot(reference.snapshot(), snapshot)
+        self.assertIn(site.pk, reference.snapshot().sites)
+        with self.assertNumQueries(1):
+            self.assertIsNone(reference.get("sites", 10**6))
+
+        [workshop] = Workshop.objects.bulk_create([Workshop(site=self.site, name="Цех 2")])
+        response = self.client.post("/api/equipment/", {
+            "name": "Насос 2", "inventory_number": "R-3", "equipment_type_id": self.pump.pk,
+            "site_id": self.site.pk, "workshop_id": workshop.pk,
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["workshop"]["name"], "Цех 2")
+
+    def test_snapshot_expires_after_ttl(self):
+        snapshot = reference.snapshot()
+        with override_settings(CATALOG_REFERENCE_TTL=0):
+            self.assertIsNot(reference.snapshot(), snapshot)
+        with override_settings(CATALOG_REFERENCE_TTL=60):
+            current = reference.snapshot()
+            with self.assertNumQueries(0):
+                self.assertIs(reference.snapshot(), current)
+
+    def test_search_form_uses_snapshot(self):
+        Equipment.objects.create(
+            name="Насос 1", inventory_number="R-1", equipment_type=self.subtype,
+            site=self.site, workshop=self.workshop,
+        )
+        reference.snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("catalog:equipment_list"),
+                {"equipment_type": self.pump.pk, "include_subtypes": "on"},
+            )
+        self.assertContains(response, f'<option value="{self.subtype.pk}">Насос вихревой</option>')
+        self.assertEqual(len(response.context["object_list"]), 1)
+        # Ни выборки всех типов для <select>, ни подзапроса по дереву типов
+        self.assertEqual(self.reference_queries(queries), [])
+        self.assertNotIn("catalog_equipmenttypeclosure", str(queries.captured_queries))
+
+
+class SeedBenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference.reset()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def seed(self, **options):
+        defaults = dict(sites=1, workshops=2, type_depth=2, type_branching=2, equipment=30,
+                        passport_ratio=0.5, users=2, cart_items=3, batch_size=8)
+        defaults.update(options)
+        stdout = StringIO()
+        call_command("seed_catalog", stdout=stdout, **defaults)
+        return stdout.getvalue()
+
+    def test_seed_fills_catalog_and_index(self):
+        self.seed()
+        self.assertEqual(Equipment.objects.count(), 30)
+        self.assertEqual(Workshop.objects.count(), 2)
+        self.assertTrue(Passport.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 6)
+        equipment = Equipment.objects.order_by("pk").first()
+        self.assertTrue(equipment.inventory_number.startswith("SEED-"))
+        self.assertTrue(equipment.attributes)
+        found = search_equipment(Equipment.objects.all(), equipment.name.split()[0])
+        self.assertIn(equipment, found)
+
+        # Повторный запуск дописывает записи с новыми инвентарными номерами
+        self.seed(passport_ratio=0, users=0)
+        self.assertEqual(Equipment.objects.count(), 60)
+        self.assertEqual(Equipment.objects.filter(inventory_number__startswith="SEED-").count(), 60)
+
+    def test_seed_password_is_generated_and_printed(self):
+        output = self.seed(equipment=5, passport_ratio=0)
+        password = output.rsplit(": ", 1)[-1].strip()
+        user = get_user_model().objects.get(username="seed_user_0")
+        self.assertTrue(user.check_password(password))
+        self.assertFalse(user.check_password("seed-password"))
+
+        # Повторный запуск меняет пароль и у покупателей прошлого запуска
+        self.seed(equipment=1, passport_ratio=0, users=1, password="given-pass")
+        for username in ("seed_user_0", "seed_user_2"):
+            user = get_user_model().objects.get(username=username)
+            self.assertTrue(user.check_password("given-pass"))
+        # По HTTP без пароля сценарий с входом не запускается
+        names = {scenario.name for scenario in
+                 benchmark.BenchmarkRunner(base_url="http://testserver").scenarios()}
+        self.assertNotIn("checkout", names)
+        names = {scenario.name for scenario in benchmark.BenchmarkRunner(
+            base_url="http://testserver", password="given-pass").scenarios()}
+        self.assertIn("checkout", names)
+
+    def test_benchmark_reports_percentiles_and_queries(self):
+        self.seed(equipment=10)
+        runner = benchmark.BenchmarkRunner(requests=3, concurrency=1)
+        report = runner.run()
+        results = {row.name: row for row in report.scenarios}
+        self.assertEqual(
+            set(results),
+            {"list", "detail", "search", "api_list", "api_detail", "suggest", "facets", "checkout"},
+        )
+        for row in report.scenarios:
+            self.assertEqual(row.errors, 0, row.name)
+            self.assertLessEqual(row.p50_ms, row.p95_ms)
+            self.assertLessEqual(row.p95_ms, row.p99_ms)
+        self.assertGreater(results["detail"].mean_queries, 0)
+
+        path = benchmark.save_report(report, Path(self.media_root) / "benchmarks")
+        self.assertEqual(benchmark.load_report(path)["detail"]["requests"], 3)
+
+    def test_benchmark_threads_log_in_as_different_users(self):
+        self.seed(equipment=5, passport_ratio=0, users=3)
+        runner = benchmark.BenchmarkRunner(requests=1, concurrency=3)
+        checkout = next(scenario for scenario in runner.scenarios()
+                        if scenario.name == "checkout")
+        with mock.patch.object(benchmark.ClientTransport, "login") as login:
+            threads = [threading.Thread(target=runner.transport, args=[checkout])
+                       for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        usernames = {call.args[0] for call in login.call_args_list}
+        self.assertEqual(usernames, {"seed_user_0", "seed_user_1", "seed_user_2"})
+
+    def test_percentile_nearest_rank(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(benchmark.percentile(values, 50), 50.0)
+        self.assertEqual(benchmark.percentile(values, 99), 99.0)
+        self.assertEqual(benchmark.percentile([], 95), 0.0)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference.reset()
+        site = Site.objects.create(name="Север")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.equipment = [
+            Equipment.objects.create(
+                name=f"Насос {index}", inventory_number=f"N-{index}",
+                equipment_type=eq_type, site=site, workshop=workshop,
+                attributes={"power": index},
+            )
+            for index in range(25)
+        ]
+        self.user = get_user_model().objects.create_user("buyer", password="pass12345")
+        for equipment in self.equipment[:5]:
+            CartItem.objects.create(user=self.user, equipment=equipment)
+
+    def test_fingerprint_folds_literals_and_in_lists(self):
+        self.assertEqual(
+            instrumentation.fingerprint(
+                'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s, %s,  %s) AND "a"."x" = 15'
+            ),
+            instrumentation.fingerprint(
+                'SELECT "a"."id" FROM "a" WHERE "a"."id" IN (%s) AND "a"."x" = 7'
+            ),
+        )
+        self.assertEqual(instrumentation.fingerprint("SELECT 'x''y', col1"), "SELECT %s, col1")
+
+    @override_settings(CATALOG_INSTRUMENTATION=True)
+    def test_server_timing_header_and_log(self):
+        staff = get_user_model().objects.create_user("staff", password="pass12345", is_staff=True)
+        self.client.force_login(staff)
+        with self.assertLogs("catalog.middleware", "INFO") as logs:
+            response = self.client.get(reverse("catalog:equipment_list"))
+        timing = response["Server-Timing"]
+        for metric in ("total;dur=", "db;dur=", "view;dur=", "render;dur="):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        record = logs.records[0]
+        self.assertEqual(record.timing["path"], reverse("catalog:equipment_list"))
+        self.assertGreater(record.timing["queries"], 0)
+        self.assertGreater(record.timing["phase_queries"]["view"], 0)
+
+        with self.assertLogs("catalog.middleware", "INFO"):
+            response = self.client.get("/api/equipment/")
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+
+    @override_settings(CATALOG_INSTRUMENTATION=True)
+    def test_server_timing_only_for_staff_or_debug(self):
+        self.client.force_login(self.user)
+        with self.assertLogs("catalog.middleware", "INFO") as logs:
+            response = self.client.get("/api/equipment/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertGreater(logs.records[0].timing["queries"], 0)
+
+        with override_settings(DEBUG=True), self.assertLogs("catalog.middleware", "INFO"):
+            response = self.client.get("/api/equipment/")
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestTimingMiddleware(lambda request: None)
+        response = self.client.get(reverse("catalog:equipment_list"))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(CATALOG_INSTRUMENTATION=True, CATALOG_INSTRUMENTATION_NPLUSONE=5)
+    def test_flags_repeated_queries(self):
+        def view(request):
+            names = [Equipment.objects.get(pk=item.pk).name for item in self.equipment[:6]]
+            return HttpResponse(", ".join(names))
+
+        middleware = RequestTimingMiddleware(view)
+        with self.assertLogs("catalog.middleware", "WARNING") as logs:
+            middleware(RequestFactory().get("/n-plus-one/"))
+        self.assertEqual(logs.records[0].timing["nplusone"][0]["count"], 6)
+        self.assertIn("nplusone=1", logs.output[0])
+
+    def test_query_budget_fails_on_excess_and_repeats(self):
+        with self.assertRaisesMessage(AssertionError, "при бюджете 1"):
+            with instrumentation.query_budget(1, repeats=None):
+                list(Site.objects.all())
+                list(Workshop.objects.all())
+        with self.assertRaisesMessage(AssertionError, "N+1"):
+            with instrumentation.query_budget(10):
+                for item in self.equipment[:3]:
+                    Equipment.objects.get(pk=item.pk)
+
+    def test_view_query_budgets(self):
+        """Бюджеты SQL на основные страницы: рост — повод посмотреть, что изменилось."""
+        reference.snapshot()
+        pk = self.equipment[0].pk
+        anonymous = {
+            reverse("catalog:equipment_list"): 9,
+            reverse("catalog:equipment_list") + "?query=Насос": 9,
+            reverse("catalog:equipment_detail", args=[pk]): 4,
+            "/api/equipment/": 6,
+            f"/api/equipment/{pk}/": 3,
+            "/api/equipment/facets/": 4,
+            "/api/equipment/suggest/?q=N-1": 1,
+        }
+        for url, budget in anonymous.items():
+            cache.clear()
+            with self.subTest(url=url), instrumentation.query_budget(budget):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_login(self.user)
+        reference.snapshot()
+        signed_in = {
+            reverse("catalog:equipment_list"): 10,
+            # Тип, площадка и цех позиций — в том же запросе, не по запросу на строку
+            reverse("catalog:cart"): 3,
+            "/api/cart/": 4,
+        }
+        for url, budget in signed_in.items():
+            with self.subTest(url=url), instrumentation.query_budget(budget):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(CATALOG_SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.collector = slow_queries.Collector()
+        site = Site.objects.create(name="Север")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        self.equipment = [
+            Equipment.objects.create(
+                name=f"Насос {index}", inventory_number=f"S-{index}",
+                equipment_type=eq_type, site=site, workshop=workshop,
+            )
+            for index in range(3)
+        ]
+
+    def collect(self):
+        with connection.execute_wrapper(self.collector):
+            for item in self.equipment:
+                Equipment.objects.filter(pk=item.pk).first()
+            list(Site.objects.all())
+        self.collector.explain_pending()
+        self.assertTrue(self.collector.flush(force=True))
+
+    def test_aggregates_by_fingerprint_with_plan(self):
+        self.collect()
+        rows = slow_queries.report("count")
+        top = rows[0]
+        self.assertEqual(top["count"], 3)
+        self.assertIn('FROM "catalog_equipment"', top["fingerprint"])
+        self.assertGreaterEqual(top["max_ms"], top["mean_ms"])
+        self.assertIn("catalog_equipment", top["plan"])
+        self.assertEqual(len(rows), 2)
+
+        # Второй процесс со своим сборщиком дописывает к той же сводке
+        other = slow_queries.Collector()
+        with connection.execute_wrapper(other):
+            Equipment.objects.filter(pk=self.equipment[0].pk).first()
+        other.flush(force=True)
+        self.assertEqual(slow_queries.report("count")[0]["count"], 4)
+        with self.assertRaises(ValueError):
+            slow_queries.report("rows")
+
+    def test_explain_failure_keeps_transaction(self):
+        self.collector.record("SELECT * FROM missing_table WHERE id = %s", 500.0, params=(1,))
+        self.collector.explain_pending()
+        self.collector.flush(force=True)
+        row = slow_queries.report()[0]
+        self.assertNotIn("plan", row)
+        self.assertEqual(Equipment.objects.count(), 3)
+
+    def test_installed_only_when_enabled(self):
+        slow_queries.install(connection)
+        self.assertNotIn(slow_queries.collector, connection.execute_wrappers)
+        with override_settings(CATALOG_SLOW_QUERY_LOG=True):
+            slow_queries.install(connection)
+            slow_queries.install(connection)
+        self.addCleanup(connection.execute_wrappers.remove, slow_queries.collector)
+        self.assertEqual(connection.execute_wrappers.count(slow_queries.collector), 1)
+
+    def test_staff_report_and_command(self):
+        self.collect()
+        url = reverse("catalog:slow_queries")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        user_model = get_user_model()
+        self.client.force_login(user_model.objects.create_user("buyer", password="pass12345"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(user_model.objects.create_user(
+            "staff", password="pass12345", is_staff=True
+        ))
+        response = self.client.get(url, {"order": "max_ms"})
+        self.assertContains(response, "catalog_equipment")
+        self.assertContains(response, "EXPLAIN")
+
+        out = StringIO()
+        call_command("slow_queries", "--plans", "--limit", "1", stdout=out)
+        self.assertIn("3 ×", out.getvalue())
+        self.assertIn("catalog_equipment", out.getvalue())
+        out = StringIO()
+        call_command("slow_queries", "--json", stdout=out)
+        self.assertEqual(len(json.loads(out.getvalue())), 2)
+        call_command("slow_queries", "--reset", stdout=StringIO())
+        self.assertEqual(slow_queries.report(), [])
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, CATALOG_PROFILER="cprofile"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        site = Site.objects.create(name="Север")
+        workshop = Workshop.objects.create(site=site, name="Цех 1")
+        eq_type = EquipmentType.objects.create(name="Насос")
+        Equipment.objects.create(
+            name="Насос 1", inventory_number="P-1", equipment_type=eq_type,
+            site=site, workshop=workshop,
+        )
+        user_model = get_user_model()
+        self.staff = user_model.objects.create_superuser("admin", password="pass12345")
+        self.buyer = user_model.objects.create_user("buyer", password="pass12345")
+
+    def test_staff_flag_stores_profile(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("catalog:equipment_list"), {"_profile": "1"})
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(response["X-Profile-URL"],
+                         reverse("admin:catalog_requestprofile_change", args=[profile.pk]))
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.status, 200)
+        self.assertEqual(profile.profiler, "cprofile")
+        self.assertIn("function calls", profile.summary)
+        self.assertTrue(profile.file.name.startswith("profiles/"))
+        self.assertTrue(os.path.exists(profile.file.path))
+
+        response = self.client.get("/api/equipment/", HTTP_X_PROFILE="1")
+        self.assertIn("X-Profile-Id", response)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_ignored_without_staff_or_flag(self):
+        with mock.patch.object(profiling, "make_profiler") as make_profiler:
+            self.client.get(reverse("catalog:equipment_list"), {"_profile": "1"})
+            self.client.force_login(self.buyer)
+            response = self.client.get(reverse("catalog:equipment_list"), {"_profile": "1"})
+            self.client.force_login(self.staff)
+            self.client.get(reverse("catalog:equipment_list"))
+            self.client.get(reverse("catalog:equipment_list"), {"_profile": "0"})
+        make_profiler.assert_not_called()
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_basic_auth_staff_can_profile_api(self):
+        token = base64.b64encode(b"admin:pass12345").decode()
+        response = self.client.get("/api/equipment/", {"_profile": "1"},
+                                   HTTP_AUTHORIZATION=f"Basic {token}")
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response["X-Profile-Id"])
+        self.assertEqual(profile.user, self.staff)
+
+        token = base64.b64encode(b"buyer:pass12345").decode()
+        response = self.client.get("/api/equipment/", {"_profile": "1"},
+                                   HTTP_AUTHORIZATION=f"Basic {token}")
+        self.assertNotIn("X-Profile-Id", response)
+        token = base64.b64encode(b"admin:wrong").decode()
+        response = self.client.get("/api/equipment/", {"_profile": "1"},
+                                   HTTP_AUTHORIZATION=f"Basic {token}")
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_streaming_body_is_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get("/api/equipment/export/", {"_profile": "1"})
+        self.assertNotIn("X-Profile-Id", response)
+        # Профиль сохраняется, когда тело отдано целиком
+        self.assertFalse(RequestProfile.objects.exists())
+        body = b"".join(response.streaming_content)
+        self.assertIn(b"P-1", body)
+        profile = RequestProfile.objects.get()
+        self.assertIn("export.py", profile.summary)
+
+        # Непрочитанное тело: профиль закрывается вместе с ответом
+        response = self.client.get("/api/equipment/export/", {"_profile": "1"})
+        response.close()
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    @override_settings(CATALOG_PROFILE_RETENTION=2)
+    def test_retention_removes_old_profiles_and_files(self):
+        self.client.force_login(self.staff)
+        ids = [
+            self.client.get(reverse("catalog:equipment_list"), {"_profile": "1"})["X-Profile-Id"]
+            for _ in range(3)
+        ]
+        self.assertEqual(
+            sorted(RequestProfile.objects.values_list("pk", flat=True)), sorted(map(int, ids[1:]))
+        )
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "profiles"))), 2)
+
+    def test_admin_lists_and_downloads_profile(self):
+        self.client.force_login(self.staff)
+        profile_id = self.client.get(
+            reverse("catalog:equipment_list"), {"_profile": "1"}
+        )["X-Profile-Id"]
+        download = reverse("admin:catalog_requestprofile_download", args=[profile_id])
+        response = self.client.get(reverse("admin:catalog_requestprofile_changelist"))
+        self.assertContains(response, download)
+        change = reverse("admin:catalog_requestprofile_change", args=[profile_id])
+        response = self.client.get(change)
+        self.assertContains(response, "function calls")
+
+        response = self.client.get(download)
+        self.assertEqual(response.status_code, 200)
+        stats = marshal.loads(b"".join(response.streaming_content))
+        self.assertTrue(any(name == "get" for _, _, name in stats))
+
+        self.client.force_login(self.buyer)
+        self.assertEqual(self.client.get(download).status_code, 302)
@@ -0,0 +1,122 @@
+"""Поддержка таблицы замыкания для дерева ``EquipmentType``.
+
+Для каждого типа хранятся все его предки (и он сам с ``depth=0``), поэтому
+«всё под Насосами» — это один JOIN по ``EquipmentTypeClosure`` без рекурсии.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from django.db import transaction
+from django.db.models import F, Func, IntegerField, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _closure_model():
+    from .models import EquipmentTypeClosure
+
+    return EquipmentTypeClosure
+
+
+def insert_node(node_id: int, parent_id: int | None) -> None:
+    closure = _closure_model()
+    rows = [closure(ancestor_id=node_id, descendant_id=node_id, depth=0)]
+    if parent_id:
+        rows.extend(
+            closure(ancestor_id=ancestor_id, descendant_id=node_id, depth=depth + 1)
+            for ancestor_id, depth in closure.objects.filter(descendant_id=parent_id)
+            .values_list("ancestor_id", "depth")
+        )
+    closure.objects.bulk_create(rows)
+
+
+def move_node(node_id: int, new_parent_id: int | None) -> None:
+    """Перевесить поддерево ``node_id`` под ``new_parent_id`` (или в корень)."""
+    closure = _closure_model()
+    subtree = dict(
+        closure.objects.filter(ancestor_id=node_id).values_list("descendant_id", "depth")
+    )
+    with transaction.atomic():
+        closure.objects.filter(descendant_id__in=subtree).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+        if new_parent_id:
+            ancestors = closure.objects.filter(descendant_id=new_parent_id).values_list(
+                "ancestor_id", "depth"
+            )
+            closure.objects.bulk_create(
+                closure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + descendant_depth + 1,
+                )
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, descendant_depth in subtree.items()
+            )
+
+
+def detach_children(node_id: int) -> None:
+    """Перед удалением типа: его дочерние поддеревья становятся корнями (как SET_NULL)."""
+    closure = _closure_model()
+    descendants = closure.objects.filter(ancestor_id=node_id, depth__gt=0).values(
+        "descendant_id"
+    )
+    ancestors = closure.objects.filter(descendant_id=node_id).values("ancestor_id")
+    closure.objects.filter(
+        descendant_id__in=descendants, ancestor_id__in=ancestors
+    ).delete()
+
+
+def rebuild_closure(type_model, closure_model) -> int:
+    """Построить таблицу замыкания с нуля по полю ``parent``."""
+    parents = dict(type_model.objects.values_list("pk", "parent_id"))
+    rows = []
+    for node_id in parents:
+        ancestor_id, depth, seen = node_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(
+                closure_model(ancestor_id=ancestor_id, descendant_id=node_id, depth=depth)
+            )
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    closure_model.objects.all().delete()
+    closure_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def descendants_of(type_id: int) -> QuerySet:
+    """Подзапрос id типа и всех его подтипов."""
+    return _closure_model().objects.filter(ancestor_id=type_id).values("descendant_id")
+
+
+def type_tree() -> list[dict[str, Any]]:
+    """Всё дерево типов с количеством оборудования одним запросом."""
+    from .models import Equipment, EquipmentType
+
+    def count_subquery(queryset: QuerySet) -> Coalesce:
+        counted = queryset.order_by().annotate(
+            total=Func(F("pk"), function="COUNT")
+        ).values("total")
+        return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+    nodes = (
+        EquipmentType.objects.order_by("name")
+        .annotate(
+            equipment_count=count_subquery(
+                Equipment.objects.filter(equipment_type_id=OuterRef("pk"))
+            ),
+            subtree_equipment_count=count_subquery(
+                Equipment.objects.filter(
+                    equipment_type__ancestor_links__ancestor_id=OuterRef("pk")
+                )
+            ),
+        )
+        .values("id", "name", "parent_id", "equipment_count", "subtree_equipment_count")
+    )
+    by_id = {node["id"]: {**node, "children": []} for node in nodes}
+    roots = []
+    for node in by_id.values():
+        parent = by_id.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    return roots
@@ -0,0 +1,189 @@
+"""Загрузка паспортов: контентная адресация и докачка по частям.
+
+Файл паспорта хранится по SHA-256 содержимого
+(``passports/sha256/<2 символа>/<хеш>.<расширение>``), поэтому одинаковые
+инструкции лежат на диске один раз, а ссылаются на них несколько ``Passport``.
+
+Большие файлы грузятся сессией ``PassportUpload``: части дописываются во
+временный файл строго по смещению, хеш считается по мере поступления. Если
+процесс сменился между частями, хеш досчитывается одним проходом по файлу.
+Пока часть пишется, файл заблокирован (``open_part``), а строка сессии — нет:
+её блокируют только сверка смещения и итоговое обновление.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import posixpath
+import threading
+from contextlib import contextmanager
+from typing import IO, BinaryIO, Iterator
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: запись сериализуется только внутри процесса
+    fcntl = None
+
+CONTENT_PREFIX = "passports/sha256"
+READ_BLOCK_SIZE = 1024 * 1024
+
+# id сессии -> (сколько байт захешировано, hashlib-объект)
+_hashers: dict[int, tuple[int, "hashlib._Hash"]] = {}
+_hashers_lock = threading.Lock()
+# id сессий, чей файл сейчас пишется (без fcntl)
+_writing: set[int] = set()
+
+
+class OffsetMismatch(Exception):
+    """Часть пришла не с того смещения, на котором остановилась загрузка."""
+
+    def __init__(self, expected: int) -> None:
+        super().__init__(expected)
+        self.expected = expected
+
+
+def hash_stream(stream: IO[bytes]) -> tuple[str, int]:
+    """Вернуть (sha256, размер), читая поток блоками."""
+    digest, size = hashlib.sha256(), 0
+    for block in iter(lambda: stream.read(READ_BLOCK_SIZE), b""):
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+def content_name(digest: str, filename: str) -> str:
+    ext = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(CONTENT_PREFIX, digest[:2], f"{digest}{ext}")
+
+
+def store_content(stream: BinaryIO, filename: str, digest: str, storage=default_storage) -> str:
+    """Положить файл по адресу содержимого; если такой уже есть — вернуть его имя."""
+    from .models import Passport
+
+    existing = (
+        Passport.objects.filter(sha256=digest).exclude(file="")
+        .values_list("file", flat=True).first()
+    )
+    if existing and storage.exists(existing):
+        return existing
+    name = content_name(digest, filename)
+    if storage.exists(name):
+        return name
+    stream.seek(0)
+    return storage.save(name, File(stream, name=posixpath.basename(name)))
+
+
+def temp_dir() -> str:
+    return str(getattr(settings, "CATALOG_UPLOAD_TEMP_DIR",
+                       os.path.join(settings.MEDIA_ROOT, "uploads")))
+
+
+def temp_path(upload_id: int) -> str:
+    return os.path.join(temp_dir(), f"{upload_id}.part")
+
+
+def check_offset(upload, offset: int) -> None:
+    """Сверить ``offset`` с принятым; при расхождении — ``OffsetMismatch``.
+
+    Если временный файл короче ``upload.received`` (потерян или обрезан),
+    ``received`` уменьшается до его размера — докачка продолжится с того, что
+    есть. Сессию не сохраняет.
+    """
+    path = temp_path(upload.pk)
+    on_disk = os.path.getsize(path) if os.path.exists(path) else 0
+    if on_disk < upload.received:
+        upload.received = on_disk
+    if offset != upload.received:
+        raise OffsetMismatch(upload.received)
+
+
+@contextmanager
+def open_part(upload_id: int) -> Iterator[BinaryIO | None]:
+    """Временный файл сессии, открытый на дозапись одним запросом.
+
+    Отдаёт ``None``, если файл сейчас пишет другой запрос. Блокировка —
+    ``flock`` на файле, а не строка в БД: часть может идти долго, а строку
+    держат только короткие транзакции вокруг записи.
+    """
+    path = temp_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as target:
+        if not _lock_part(target, upload_id):
+            yield None
+            return
+        try:
+            yield target
+        finally:
+            if fcntl is None:
+                with _hashers_lock:
+                    _writing.discard(upload_id)
+
+
+def _lock_part(target: BinaryIO, upload_id: int) -> bool:
+    if fcntl is not None:
+        # Снимается при закрытии файла, в том числе если процесс упал
+        try:
+            fcntl.flock(target, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    with _hashers_lock:
+        if upload_id in _writing:
+            return False
+        _writing.add(upload_id)
+        return True
+
+
+def write_chunk(target: BinaryIO, upload, offset: int, stream: IO[bytes]) -> int:
+    """Дописать часть с ``offset`` в открытый ``open_part`` файл; вернуть новое смещение.
+
+    ``upload`` не меняет: новое смещение сохраняет вызывающий.
+    """
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload.pk, (0, hashlib.sha256()))
+    if hashed != offset:
+        hasher = None
+
+    received = offset
+    # Обрезаем хвост недописанной ранее части, если процесс упал посреди записи
+    target.truncate(offset)
+    while received < upload.size:
+        block = stream.read(min(READ_BLOCK_SIZE, upload.size - received))
+        if not block:
+            break
+        target.write(block)
+        received += len(block)
+        if hasher is not None:
+            hasher.update(block)
+    if stream.read(1):
+        target.truncate(offset)
+        raise ValueError("Часть выходит за объявленный размер файла")
+    target.flush()
+
+    if hasher is not None:
+        with _hashers_lock:
+            _hashers[upload.pk] = (received, hasher)
+    return received
+
+
+def finish_digest(upload) -> str:
+    with _hashers_lock:
+        hashed, hasher = _hashers.pop(upload.pk, (0, None))
+    if hasher is not None and hashed == upload.received:
+        return hasher.hexdigest()
+    with open(temp_path(upload.pk), "rb") as source:
+        return hash_stream(source)[0]
+
+
+def discard(upload_id: int) -> None:
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    try:
+        os.remove(temp_path(upload_id))
+    except FileNotFoundError:
+        pass
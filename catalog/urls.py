@@ -58,5 +58,6 @@ urlpatterns = [
         name="remove_from_cart",
     ),
     path("cart/checkout/", views.checkout, name="checkout"),
+    path("staff/slow-queries/", views.slow_query_report, name="slow_queries"),
 ]
 
@@ -0,0 +1,45 @@
+"""Счётчики версий данных каталога в кэше.
+
+Вместо точечной инвалидации ключей изменение данных увеличивает счётчик, а
+номер версии входит в ключи кэша и валидаторы HTTP-ответов: старые записи
+просто перестают читаться. ``REFERENCE`` меняется при правке справочников
+(типы, площадки, цеха), ``CATALOG`` — при любом изменении каталога, включая
+оборудование и паспорта.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.cache import cache
+
+REFERENCE = "reference"
+CATALOG = "catalog"
+
+
+def _cache_key(name: str) -> str:
+    return f"catalog:version:{name}"
+
+
+def _initial_version() -> int:
+    # Не с единицы: после очистки кэша счётчик не должен совпасть с версией,
+    # которую процесс запомнил до неё (снимок справочников в catalog.reference)
+    return time.time_ns() // 1000
+
+
+def get_version(name: str) -> int:
+    version = cache.get(_cache_key(name))
+    if version is None:
+        # Ключ живёт без таймаута; add не перетрёт значение, выставленное параллельно
+        initial = _initial_version()
+        cache.add(_cache_key(name), initial, None)
+        version = cache.get(_cache_key(name), initial)
+    return version
+
+
+def bump_version(*names: str) -> None:
+    for name in names:
+        try:
+            cache.incr(_cache_key(name))
+        except ValueError:
+            cache.add(_cache_key(name), _initial_version(), None)
@@ -1,8 +1,9 @@
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.views.generic import (
@@ -13,6 +14,14 @@ from django.views.generic import (
     UpdateView,
 )
 
+from . import conditional, facets, reference, response_cache, slow_queries
+from .attributes import (
+    attribute_pairs,
+    filter_by_attributes,
+    filter_by_ranges,
+    range_conditions,
+)
+from .cart import add_item, cart_count
 from .forms import (
     EquipmentForm,
     EquipmentSearchForm,
@@ -23,6 +32,10 @@ from .forms import (
     CheckoutForm,
 )
 from .models import CartItem, Equipment, EquipmentType, Passport, Site, Workshop
+from .orders import EmptyCart, place_order
+from .pagination import InvalidCursor, paginate_keyset
+from .roles import can_add_equipment
+from .search import search_equipment
 
 
 class EquipmentListView(ListView):
@@ -30,41 +43,83 @@ class EquipmentListView(ListView):
     paginate_by = 10
     template_name = "catalog/equipment_list.html"
 
+    def get(self, request, *args, **kwargs):
+        if not response_cache.is_cacheable(request) or len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+
+        def build():
+            response = super(EquipmentListView, self).get(request, *args, **kwargs)
+            return response.render()
+
+        return response_cache.get_or_build(
+            response_cache.request_key("equipment-list", request),
+            build,
+            # Ответ с cookie (например, новым CSRF-токеном) — личный
+            cacheable=lambda response: (
+                response.status_code == 200
+                and not response.cookies
+                and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            ),
+        )
+
     def get_queryset(self):
         queryset = (
             super()
             .get_queryset()
-            .select_related("equipment_type", "site", "workshop")
-            .prefetch_related("passports")
+            .select_related("equipment_type", "site", "workshop__site")
         )
         self.search_form = EquipmentSearchForm(self.request.GET or None)
         if self.search_form.is_valid():
             data = self.search_form.cleaned_data
             if data.get("query"):
+                queryset = search_equipment(queryset, data["query"])
+            if data.get("equipment_type") and data.get("include_subtypes"):
                 queryset = queryset.filter(
-                    Q(name__icontains=data["query"])
-                    | Q(description__icontains=data["query"])
-                    | Q(inventory_number__icontains=data["query"])
+                    equipment_type_id__in=reference.snapshot().descendants(data["equipment_type"])
                 )
-            if data.get("equipment_type"):
-                queryset = queryset.filter(equipment_type=data["equipment_type"])
+            elif data.get("equipment_type"):
+                queryset = queryset.filter(equipment_type_id=data["equipment_type"])
             if data.get("site"):
                 queryset = queryset.filter(site__name__icontains=data["site"])
             if data.get("workshop"):
                 queryset = queryset.filter(
                     workshop__name__icontains=data["workshop"]
                 )
-            if data.get("attribute_key") and data.get("attribute_value"):
-                queryset = queryset.filter(
-                    attributes__contains={
-                        data["attribute_key"]: data["attribute_value"]
-                    }
-                )
+            if data.get("workshop_id"):
+                queryset = queryset.filter(workshop_id=data["workshop_id"])
+            queryset = filter_by_attributes(queryset, attribute_pairs(self.request.GET))
+            conditions = self.search_form.range_conditions()
+            try:
+                number_keys = reference.number_keys
+                for key, lookups in range_conditions(self.request.GET, number_keys).items():
+                    conditions.setdefault(key, {}).update(lookups)
+            except ValidationError as exc:
+                self.search_form.add_error(None, exc)
+                return queryset.none()
+            queryset = filter_by_ranges(queryset, conditions)
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get("cursor")
+        if not cursor and self.request.GET.get("pagination") != "cursor":
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = paginate_keyset(queryset, "name", cursor or None, page_size)
+        except InvalidCursor:
+            raise Http404("Неверный курсор.")
+        return None, page, page.object_list, page.has_next or page.has_previous
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["search_form"] = getattr(self, "search_form", EquipmentSearchForm())
+        params = self.request.GET.copy()
+        for param in ("page", "cursor"):
+            params.pop(param, None)
+        context["page_query"] = params.urlencode()
+        context["facets"] = facets.with_queries(
+            facets.cached_facet_counts("html", self.request.GET, self.object_list),
+            self.request.GET,
+        )
         return context
 
 
@@ -72,6 +127,32 @@ class EquipmentDetailView(DetailView):
     model = Equipment
     template_name = "catalog/equipment_detail.html"
 
+    def get(self, request, *args, **kwargs):
+        updated_at = (
+            Equipment.objects.filter(pk=kwargs["pk"]).values_list("updated_at", flat=True).first()
+        )
+        # Пока есть сообщения для показа, страница не может быть «не изменена»
+        if updated_at is None or len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        user = request.user
+        validators = conditional.validators(
+            request,
+            updated_at,
+            user.pk,
+            cart_count(user.pk) if user.is_authenticated else 0,
+            can_add_equipment(user),
+        )
+        response = conditional.not_modified(request, **validators)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        conditional.apply_headers(request, response, **validators)
+        return response
+
+    def get_queryset(self):
+        return super().get_queryset().select_related(
+            "equipment_type", "site", "workshop"
+        ).prefetch_related("passports")
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["passport_form"] = PassportForm()
@@ -114,7 +195,7 @@ class EquipmentCreateView(SellerPermissionMixin, LoginRequiredMixin, CreateView)
         return reverse("catalog:equipment_detail", args=[self.object.pk])
 
     def form_valid(self, form):
-        if not self.request.user.is_superuser and not self.request.user.is_staff and not self.request.user.groups.filter(name="seller").exists():
+        if not can_add_equipment(self.request.user):
             messages.error(self.request, "У вас нет прав на добавление оборудования.")
             return redirect("catalog:equipment_list")
         form.instance.created_by = self.request.user
@@ -207,20 +288,13 @@ def upload_passport(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 def add_to_cart(request: HttpRequest, pk: int) -> HttpResponse:
-    equipment = get_object_or_404(Equipment, pk=pk)
     quantity_str = request.POST.get("quantity", "1")
     try:
         quantity = max(1, int(quantity_str))
     except ValueError:
         quantity = 1
-    item, created = CartItem.objects.get_or_create(
-        user=request.user,
-        equipment=equipment,
-        defaults={"quantity": quantity},
-    )
-    if not created:
-        item.quantity += quantity
-        item.save(update_fields=["quantity"])
+    if not add_item(request.user.pk, pk, quantity):
+        raise Http404("Оборудование не найдено")
     messages.success(request, "Оборудование добавлено в корзину.")
     return redirect("catalog:equipment_detail", pk=pk)
 
@@ -232,7 +306,8 @@ class CartListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return (
             CartItem.objects.filter(user=self.request.user)
-            .select_related("equipment", "equipment__site", "equipment__workshop")
+            .select_related("equipment", "equipment__equipment_type", "equipment__site",
+                            "equipment__workshop__site")
             .order_by("-added_at")
         )
 
@@ -258,36 +333,22 @@ def remove_from_cart(request: HttpRequest, pk: int) -> HttpResponse:
 
 @login_required
 def checkout(request: HttpRequest) -> HttpResponse:
-    items_qs = (
-        CartItem.objects.filter(user=request.user)
-        .select_related("equipment", "equipment__site", "equipment__workshop", "equipment__equipment_type")
-        .order_by("-added_at")
-    )
-    if not items_qs.exists():
-        messages.error(request, "Корзина пуста.")
-        return redirect("catalog:cart")
-
     if request.method == "POST":
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            payload = []
-            for item in items_qs:
-                payload.append(
-                    {
-                        "equipment_id": item.equipment_id,
-                        "equipment": str(item.equipment),
-                        "type": str(item.equipment.equipment_type),
-                        "site": str(item.equipment.site),
-                        "workshop": str(item.equipment.workshop),
-                        "quantity": item.quantity,
-                    }
+            try:
+                _, created = place_order(
+                    request.user,
+                    form.save(commit=False),
+                    form.cleaned_data["idempotency_key"],
                 )
-            order = form.save(commit=False)
-            order.user = request.user
-            order.items = payload
-            order.save()
-            items_qs.delete()
-            messages.success(request, "Заявка отправлена. Мы свяжемся с вами.")
+            except EmptyCart:
+                messages.error(request, "Корзина пуста.")
+                return redirect("catalog:cart")
+            if created:
+                messages.success(request, "Заявка отправлена. Мы свяжемся с вами.")
+            else:
+                messages.info(request, "Эта заявка уже отправлена.")
             return redirect("catalog:equipment_list")
     else:
         initial = {
@@ -296,8 +357,37 @@ def checkout(request: HttpRequest) -> HttpResponse:
         }
         form = CheckoutForm(initial=initial)
 
+    items = list(
+        CartItem.objects.filter(user=request.user)
+        .select_related(
+            "equipment", "equipment__site", "equipment__workshop__site",
+            "equipment__equipment_type",
+        )
+        .order_by("-added_at")
+    )
+    if not items:
+        messages.error(request, "Корзина пуста.")
+        return redirect("catalog:cart")
     return render(
         request,
         "catalog/checkout.html",
-        {"checkout_form": form, "items": items_qs},
+        {"checkout_form": form, "items": items},
+    )
+
+
+@staff_member_required
+def slow_query_report(request: HttpRequest) -> HttpResponse:
+    order = request.GET.get("order", "total_ms")
+    if order not in slow_queries.ORDERINGS:
+        order = "total_ms"
+    return render(
+        request,
+        "catalog/slow_queries.html",
+        {
+            "rows": slow_queries.report(order, limit=100),
+            "order": order,
+            "orderings": slow_queries.ORDERINGS,
+            "enabled": slow_queries.enabled(),
+            "threshold": slow_queries.threshold_ms(),
+        },
     )
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: замер охватывает всю цепочку; выключен, пока не задан CATALOG_INSTRUMENTATION
+    "catalog.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -37,6 +39,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # После аутентификации: профиль по ?_profile=1 снимается только для сотрудников
+    "catalog.middleware.RequestProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -106,6 +110,73 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = "DENY"
 
+# Сколько секунд помнить принадлежность пользователя к группе seller (0 — только в рамках запроса)
+CATALOG_ROLE_CACHE_TIMEOUT = env.int("CATALOG_ROLE_CACHE_TIMEOUT", default=60)
+
+# Снимок справочников в памяти процесса перечитывается не реже чем раз в столько секунд:
+# смену версии в кэше другого процесса (LocMem) он не видит
+CATALOG_REFERENCE_TTL = env.int("CATALOG_REFERENCE_TTL", default=60)
+
+# ETag списка меняется не реже чем раз в столько секунд: поколение каталога, увеличенное
+# в кэше другого процесса (LocMem), этот процесс не видит
+CATALOG_LIST_ETAG_TTL = env.int("CATALOG_LIST_ETAG_TTL", default=60)
+
+# Счётчик корзины сбрасывается сигналами только в кэше своего процесса (LocMem),
+# в остальных он устаревает не дольше чем на этот таймаут
+CATALOG_CART_COUNT_TIMEOUT = env.int("CATALOG_CART_COUNT_TIMEOUT", default=60)
+
+# Сколько строк принимает пакетный API корзины за один запрос
+CATALOG_CART_BATCH_LIMIT = env.int("CATALOG_CART_BATCH_LIMIT", default=1000)
+
+# Ширины миниатюр фото оборудования (px) и число потоков, которые их строят
+CATALOG_THUMBNAIL_WIDTHS = env.list("CATALOG_THUMBNAIL_WIDTHS", cast=int, default=[320, 640, 1024])
+CATALOG_THUMBNAIL_WORKERS = env.int("CATALOG_THUMBNAIL_WORKERS", default=2)
+
+# Загрузка паспортов по частям: предельный размер файла и каталог для недокачанных частей
+CATALOG_PASSPORT_MAX_SIZE = env.int("CATALOG_PASSPORT_MAX_SIZE", default=2 * 1024 ** 3)
+CATALOG_UPLOAD_TEMP_DIR = env.str("CATALOG_UPLOAD_TEMP_DIR", default=str(MEDIA_ROOT / "uploads"))
+
+# Сколько процессов извлекают текст из паспортов для поиска
+CATALOG_EXTRACTION_WORKERS = env.int("CATALOG_EXTRACTION_WORKERS", default=2)
+
+# Кэш страниц каталога для анонимов: свежесть (0 — выключен), сколько ещё отдавать
+# устаревшую копию во время пересчёта и сколько ждать чужого пересчёта, секунды
+CATALOG_RESPONSE_CACHE_TIMEOUT = env.int("CATALOG_RESPONSE_CACHE_TIMEOUT", default=30)
+CATALOG_RESPONSE_CACHE_STALE = env.int("CATALOG_RESPONSE_CACHE_STALE", default=300)
+CATALOG_RESPONSE_CACHE_WAIT = env.float("CATALOG_RESPONSE_CACHE_WAIT", default=2.0)
+
+# Сколько хранить отрисованные карточки оборудования (ключи версионируются, это лишь вытеснение)
+CATALOG_FRAGMENT_CACHE_TIMEOUT = env.int("CATALOG_FRAGMENT_CACHE_TIMEOUT", default=24 * 60 * 60)
+
+# Счётчики фильтров: срок свежести (сбрасываются и поколением каталога) и
+# сколько самых частых значений показывать по каждой характеристике
+CATALOG_FACET_CACHE_TIMEOUT = env.int("CATALOG_FACET_CACHE_TIMEOUT", default=300)
+CATALOG_FACET_ATTRIBUTE_VALUES = env.int("CATALOG_FACET_ATTRIBUTE_VALUES", default=10)
+
+# Подсказки строки поиска: сколько отдавать по умолчанию и максимум, сколько
+# секунд держать ответ на один префикс
+CATALOG_SUGGEST_LIMIT = env.int("CATALOG_SUGGEST_LIMIT", default=10)
+CATALOG_SUGGEST_MAX_LIMIT = env.int("CATALOG_SUGGEST_MAX_LIMIT", default=50)
+CATALOG_SUGGEST_CACHE_TIMEOUT = env.int("CATALOG_SUGGEST_CACHE_TIMEOUT", default=10)
+
+# Замер запросов (SQL, фазы, заголовок Server-Timing, лог catalog.middleware);
+# сколько повторов одной формы SQL за запрос считать N+1
+CATALOG_INSTRUMENTATION = env.bool("CATALOG_INSTRUMENTATION", default=False)
+CATALOG_INSTRUMENTATION_NPLUSONE = env.int("CATALOG_INSTRUMENTATION_NPLUSONE", default=5)
+
+# Сводка SQL по формам запросов и EXPLAIN медленных (manage.py slow_queries,
+# /staff/slow-queries/): порог «медленного» в мс, период слива в кэш, сколько форм хранить
+CATALOG_SLOW_QUERY_LOG = env.bool("CATALOG_SLOW_QUERY_LOG", default=False)
+CATALOG_SLOW_QUERY_THRESHOLD_MS = env.float("CATALOG_SLOW_QUERY_THRESHOLD_MS", default=100.0)
+CATALOG_SLOW_QUERY_FLUSH_INTERVAL = env.int("CATALOG_SLOW_QUERY_FLUSH_INTERVAL", default=60)
+CATALOG_SLOW_QUERY_MAX_FINGERPRINTS = env.int("CATALOG_SLOW_QUERY_MAX_FINGERPRINTS", default=500)
+
+# Профиль запроса сотрудника по ?_profile=1 / X-Profile: 1; профилировщик
+# (auto — pyinstrument, если установлен, иначе cProfile) и сколько профилей хранить
+CATALOG_PROFILER_ENABLED = env.bool("CATALOG_PROFILER_ENABLED", default=True)
+CATALOG_PROFILER = env.str("CATALOG_PROFILER", default="auto")
+CATALOG_PROFILE_RETENTION = env.int("CATALOG_PROFILE_RETENTION", default=50)
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
@@ -142,5 +213,10 @@ LOGGING = {
             "level": "WARNING",
             "propagate": False,
         },
+        "catalog.middleware": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }